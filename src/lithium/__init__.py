@@ -5,7 +5,7 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """lithium reducer"""
 
-from .reducer import Lithium
+from .reducer import Lithium, reduce_bytes
 from .util import LithiumError
 
 __author__ = "Jesse Ruderman, Gary Kwong and Jesse Schwartzentruber"
@@ -0,0 +1,257 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Retention of the intermediate testcases saved during a reduction.
+
+By default, Lithium saves a copy of every testcase it tries to the temporary directory,
+named for the test number and result (eg. `12-interesting.js`). A retention policy
+limits which of these are kept, and an artifact store keeps them compressed and
+de-duplicated by content.
+"""
+
+import collections
+import gzip
+import logging
+import os
+
+LOG = logging.getLogger(__name__)
+
+
+class RetentionPolicy:
+    """Decide which intermediate testcases to keep.
+
+    Modes:
+        all: keep every testcase (default).
+        none: keep no testcases.
+        interesting: keep only interesting testcases.
+        last: keep only the `count` most recent testcases.
+        every: keep every `count`th testcase.
+    """
+
+    MODES = ("all", "none", "interesting", "last", "every")
+
+    def __init__(self, mode="all", count=None):
+        """Initialize a retention policy.
+
+        Args:
+            mode (str): One of `MODES`.
+            count (int): Number of testcases for "last" and "every" modes.
+        """
+        assert mode in self.MODES
+        assert (count is not None) == (mode in {"last", "every"})
+        assert count is None or count > 0
+        self.mode = mode
+        self.count = count
+
+    @classmethod
+    def parse(cls, spec):
+        """Create a retention policy from a string, eg. "interesting" or "last:10".
+
+        Args:
+            spec (str): Retention policy description.
+
+        Returns:
+            RetentionPolicy: The parsed policy.
+
+        Raises:
+            ValueError: `spec` is not a valid policy.
+        """
+        mode, _, count = spec.partition(":")
+        if mode not in cls.MODES:
+            raise ValueError(
+                "unknown retention mode %r (expected one of: %s)"
+                % (mode, ", ".join(cls.MODES))
+            )
+        if mode in {"last", "every"}:
+            try:
+                count = int(count)
+            except ValueError:
+                raise ValueError(
+                    "%s requires a count, eg. %s:10" % (mode, mode)
+                ) from None
+            if count < 1:
+                raise ValueError("%s count must be at least 1" % (mode,))
+            return cls(mode, count)
+        if count:
+            raise ValueError("%s doesn't take a count" % (mode,))
+        return cls(mode)
+
+    def __str__(self):
+        if self.count is None:
+            return self.mode
+        return "%s:%d" % (self.mode, self.count)
+
+    def keep(self, number, interesting):
+        """Check whether a testcase should be saved.
+
+        Args:
+            number (int): Sequence number of the test (starting at 1).
+            interesting (bool): Result of the test.
+
+        Returns:
+            bool: True if the testcase should be saved.
+        """
+        if self.mode == "none":
+            return False
+        if self.mode == "interesting":
+            return interesting
+        if self.mode == "every":
+            return number % self.count == 0
+        return True
+
+
+class ArtifactStore:
+    """Content-addressed store of compressed testcases.
+
+    Each distinct testcase is stored once, gzip compressed, under `objects/` named for
+    its SHA-512 hash. Artifact names are mapped to hashes by an append-only log
+    (`index.log`), with lines of the form `+ <hash> <name>` or `- <hash> <name>`.
+    """
+
+    def __init__(self, path):
+        """Open (or create) an artifact store.
+
+        Args:
+            path (Path): Directory to store artifacts in.
+        """
+        self.path = path
+        self._objects = path / "objects"
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._names = {}
+        self._refs = collections.Counter()
+        index = path / "index.log"
+        if index.is_file():
+            with index.open() as index_fp:
+                for line in index_fp:
+                    operation, digest, name = line.rstrip("\n").split(" ", 2)
+                    if operation == "+":
+                        self._names[name] = digest
+                        self._refs[digest] += 1
+                    else:
+                        del self._names[name]
+                        self._refs[digest] -= 1
+        self._index = index.open("a")
+
+    def _object_path(self, digest):
+        return self._objects / digest[:2] / (digest[2:] + ".gz")
+
+    def put(self, name, testcase):
+        """Store a testcase.
+
+        Args:
+            name (str): Name of the artifact (eg. "12-interesting.js").
+            testcase (Testcase): Testcase to store.
+
+        Returns:
+            str: SHA-512 hex digest of the testcase contents.
+        """
+        if name in self._names:
+            self.remove(name)
+        digest = testcase.hexdigest()
+        obj_path = self._object_path(digest)
+        if not self._refs[digest] and not obj_path.is_file():
+            obj_path.parent.mkdir(exist_ok=True)
+            tmp_path = obj_path.with_suffix(".tmp")
+            with gzip.open(str(tmp_path), "wb") as obj_fp:
+                obj_fp.write(testcase.to_bytes())
+            os.replace(str(tmp_path), str(obj_path))
+        self._names[name] = digest
+        self._refs[digest] += 1
+        self._log("+", digest, name)
+        return digest
+
+    def remove(self, name):
+        """Remove an artifact. The stored testcase is deleted once no artifacts
+        refer to it.
+
+        Args:
+            name (str): Name of the artifact.
+        """
+        digest = self._names.pop(name)
+        self._refs[digest] -= 1
+        self._log("-", digest, name)
+        if not self._refs[digest]:
+            del self._refs[digest]
+            self._object_path(digest).unlink()
+
+    def get(self, name):
+        """Read an artifact.
+
+        Args:
+            name (str): Name of the artifact.
+
+        Returns:
+            bytes: Contents of the stored testcase.
+        """
+        with gzip.open(str(self._object_path(self._names[name])), "rb") as obj_fp:
+            return obj_fp.read()
+
+    def _log(self, operation, digest, name):
+        self._index.write("%s %s %s\n" % (operation, digest, name))
+        self._index.flush()
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def close(self):
+        """Close the artifact index."""
+        self._index.close()
+
+
+class Artifacts:
+    """Save intermediate testcases according to a retention policy."""
+
+    def __init__(self, policy=None, store=None):
+        """Initialize artifact retention.
+
+        Args:
+            policy (RetentionPolicy): Which testcases to keep (default: all).
+            store (ArtifactStore): Store to save testcases in. If None, each testcase
+                                   is written to its own file.
+        """
+        self.policy = policy if policy is not None else RetentionPolicy()
+        self.store = store
+        self._count = 0
+        self._kept = collections.deque()
+
+    def save(self, testcase, path, interesting):
+        """Save a tested testcase, if the retention policy keeps it.
+
+        Args:
+            testcase (Testcase): Testcase which was tested.
+            path (Path): Location to save the testcase to. If a store is used, only
+                         the filename is used as the artifact name.
+            interesting (bool): Result of the test.
+        """
+        self._count += 1
+        if not self.policy.keep(self._count, interesting):
+            return
+        if self.store is not None:
+            self.store.put(path.name, testcase)
+        else:
+            testcase.dump(path)
+        if self.policy.mode == "last":
+            self._kept.append(path)
+            while len(self._kept) > self.policy.count:
+                self._discard(self._kept.popleft())
+
+    def _discard(self, path):
+        if self.store is not None:
+            self.store.remove(path.name)
+        else:
+            try:
+                path.unlink()
+            except OSError as exc:
+                LOG.debug("error removing %s: %s", path, exc)
+
+    def close(self):
+        """Close the artifact store, if any."""
+        if self.store is not None:
+            self.store.close()
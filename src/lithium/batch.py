@@ -0,0 +1,174 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Reduce many testcases in one process, sharing a bounded pool of workers.
+
+Each job is a Lithium command line (as given to `lithium`), eg.:
+
+    --char crashes --timeout 10 ./js crash-1234.js
+
+Jobs are read one per line from a file, or from stdin until it is closed, so jobs can
+be queued while others are being reduced. Blank lines and lines starting with `#` are
+ignored. Several reductions run side by side, and the condition scripts they run
+are limited to `--workers` at once, so the machine is kept busy even though each
+reduction only tests one testcase at a time.
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import shlex
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .interestingness import timed_run
+from .reducer import Lithium
+from .util import summary_header
+
+LOG = logging.getLogger(__name__)
+
+
+class BatchReducer:
+    """Run many reductions at once, with a shared limit on how many condition scripts
+    run at the same time.
+    """
+
+    def __init__(self, workers, active=None):
+        """Initialize a batch.
+
+        Args:
+            workers (int): Number of condition scripts to run at once.
+            active (int): Number of reductions to run at once. Reductions spend some
+                          time between tests, so this should be more than `workers`
+                          (default: twice `workers`).
+        """
+        assert workers > 0
+        self.workers = workers
+        self.active = active if active is not None else 2 * workers
+        assert self.active > 0
+        self._slots = threading.BoundedSemaphore(workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.active)
+        self._numbers = itertools.count(1)
+
+    def submit(self, argv, name=None):
+        """Queue a reduction.
+
+        Args:
+            argv (list(str)): Lithium command line arguments.
+            name (str): Name of the job in log messages (default: "job<n>").
+
+        Returns:
+            Future: Result of the reduction (see `Lithium.main()`).
+        """
+        if name is None:
+            name = "job%d" % (next(self._numbers),)
+        return self._pool.submit(self._reduce, name, list(argv))
+
+    def _reduce(self, name, argv):
+        thread = threading.current_thread()
+        thread_name = thread.name
+        # log messages are labelled with the thread name
+        thread.name = name
+        try:
+            lith = Lithium()
+            lith.worker_slots = self._slots
+            try:
+                return lith.main(argv)
+            except SystemExit as exc:
+                # invalid arguments, argparse has already reported the error
+                LOG.error("invalid job: %s", " ".join(argv))
+                return exc.code
+            except Exception:  # pylint: disable=broad-except
+                LOG.exception("reduction failed")
+                return 1
+        finally:
+            thread.name = thread_name
+
+    def close(self):
+        """Wait for all queued reductions to finish."""
+        self._pool.shutdown(wait=True)
+
+
+def read_jobs(lines):
+    """Parse job command lines.
+
+    Args:
+        lines (iterable(str)): Lines to parse (eg. an open file).
+
+    Yields:
+        list(str): Lithium command line arguments for each job.
+    """
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield shlex.split(line)
+
+
+def main(argv=None):
+    """Lithium batch entrypoint
+
+    Args:
+        argv (list, None): specify command line args
+
+    Returns:
+        int: 0 if all testcases were reduced
+    """
+    parser = argparse.ArgumentParser(
+        description="Reduce many testcases with Lithium, sharing a pool of workers"
+    )
+    parser.add_argument(
+        "jobs",
+        nargs="?",
+        default="-",
+        help="file containing one Lithium command line per line. default: stdin",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of condition scripts to run at once. default: number of CPUs",
+    )
+    parser.add_argument(
+        "--active",
+        type=int,
+        help="number of reductions to run at once. default: twice --workers",
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.active is not None and args.active < 1:
+        parser.error("--active must be at least 1")
+
+    logging.basicConfig(format="%(threadName)s: %(message)s", level=logging.INFO)
+    timed_run.resource_totals(reset=True)
+    batch = BatchReducer(args.workers, args.active)
+    jobs = []
+    try:
+        if args.jobs == "-":
+            for job in read_jobs(sys.stdin):
+                jobs.append((job, batch.submit(job)))
+        else:
+            with open(args.jobs) as jobs_fp:
+                for job in read_jobs(jobs_fp):
+                    jobs.append((job, batch.submit(job)))
+    finally:
+        batch.close()
+
+    summary_header()
+    failed = 0
+    for number, (job, future) in enumerate(jobs, start=1):
+        result = future.result()
+        if result:
+            failed += 1
+        LOG.info(
+            "  job%d: %s (%s)",
+            number,
+            "reduced" if not result else "failed",
+            " ".join(shlex.quote(arg) for arg in job),
+        )
+    LOG.info("  Jobs: %d, failed: %d", len(jobs), failed)
+    Lithium.log_resource_totals()
+    return int(bool(failed))
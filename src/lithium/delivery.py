@@ -0,0 +1,178 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Ways of giving each reduction attempt to the condition script, without rewriting
+the testcase file (see `--deliver`).
+
+A delivery has a `name`, a `deliver(data, slot)` context manager, which makes an
+attempt available while the condition script runs and yields the path to pass to it
+in place of the testcase, and a `close()` method. `slot` identifies the job running
+the condition (see `--jobs`), so attempts tested at the same time don't share a path.
+"""
+
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from .interestingness import timed_run
+from .util import LithiumError
+
+LOG = logging.getLogger(__name__)
+
+
+class StdinDelivery:
+    """Pass each attempt as stdin to the commands run by the condition script (using
+    `timed_run`). The testcase is replaced by `/dev/stdin` in the condition args.
+    """
+
+    name = "stdin"
+
+    @staticmethod
+    @contextlib.contextmanager
+    def deliver(data, _slot):
+        """Make an attempt available to the condition script.
+
+        Args:
+            data (bytes): Contents of the attempt.
+            _slot (int): Job slot running the condition script.
+
+        Yields:
+            str: Path to use in place of the testcase.
+        """
+        with timed_run.input_from(data):
+            yield "/dev/stdin"
+
+    def close(self):
+        """Nothing to clean up."""
+
+
+class MemfdDelivery:
+    """Write each attempt to an anonymous in-memory file (Linux `memfd_create`), one
+    for each job slot. The testcase is replaced by `/proc/<pid>/fd/<fd>`, which can
+    be opened by the target.
+    """
+
+    name = "memfd"
+
+    def __init__(self):
+        """Initialize memfd delivery.
+
+        Raises:
+            LithiumError: memfd isn't supported on this platform.
+        """
+        if not hasattr(os, "memfd_create") or not os.path.isdir("/proc/self/fd"):
+            raise LithiumError("--deliver memfd is not supported on this platform")
+        self._lock = threading.Lock()
+        self._fds = {}
+
+    def _fd(self, slot):
+        with self._lock:
+            if slot not in self._fds:
+                # not inherited, the target opens it through /proc
+                self._fds[slot] = os.memfd_create("lithium-%s" % (slot,))
+            return self._fds[slot]
+
+    @contextlib.contextmanager
+    def deliver(self, data, slot):
+        """Make an attempt available to the condition script.
+
+        Args:
+            data (bytes): Contents of the attempt.
+            slot (int): Job slot running the condition script.
+
+        Yields:
+            str: Path to use in place of the testcase.
+        """
+        memfd = self._fd(slot)
+        os.ftruncate(memfd, 0)
+        written = 0
+        while written < len(data):
+            written += os.pwrite(memfd, data[written:], written)
+        yield "/proc/%d/fd/%d" % (os.getpid(), memfd)
+
+    def close(self):
+        """Close the in-memory files."""
+        with self._lock:
+            memfds = list(self._fds.values())
+            self._fds.clear()
+        for memfd in memfds:
+            os.close(memfd)
+
+
+class TmpfsDelivery:
+    """Write each attempt to a file in a directory for each job slot, on a
+    memory-backed filesystem (`/dev/shm` by default). The file has the same name as
+    the testcase.
+    """
+
+    name = "tmpfs"
+    DEFAULT_DIR = "/dev/shm"
+
+    def __init__(self, filename, directory=None):
+        """Initialize tmpfs delivery.
+
+        Args:
+            filename (str): Testcase filename (only the basename is used).
+            directory (str): Directory to create the job directories in. Defaults to
+                             `DEFAULT_DIR`, or the system temporary directory if
+                             that doesn't exist.
+        """
+        if directory is None:
+            directory = self.DEFAULT_DIR if os.path.isdir(self.DEFAULT_DIR) else None
+        self._root = tempfile.mkdtemp(prefix="lithium-", dir=directory)
+        self._basename = os.path.basename(filename)
+        LOG.debug("Delivering attempts in %s", self._root)
+
+    @contextlib.contextmanager
+    def deliver(self, data, slot):
+        """Make an attempt available to the condition script.
+
+        Args:
+            data (bytes): Contents of the attempt.
+            slot (int): Job slot running the condition script.
+
+        Yields:
+            str: Path to use in place of the testcase.
+        """
+        job_dir = os.path.join(self._root, "job%s" % (slot,))
+        if not os.path.isdir(job_dir):
+            os.mkdir(job_dir)
+        path = os.path.join(job_dir, self._basename)
+        with open(path, "wb") as testcase_fp:
+            testcase_fp.write(data)
+        yield path
+
+    def close(self):
+        """Remove the job directories."""
+        shutil.rmtree(self._root, ignore_errors=True)
+
+
+# Delivery modes, by name. "file" (the default) writes attempts to the testcase file.
+DELIVERY = ("file", StdinDelivery.name, MemfdDelivery.name, TmpfsDelivery.name)
+
+
+def open_delivery(name, filename):
+    """Start delivering attempts.
+
+    Args:
+        name (str): Delivery mode (one of `DELIVERY`).
+        filename (str): Testcase filename.
+
+    Returns:
+        object: The delivery, or None to write attempts to the testcase file.
+
+    Raises:
+        LithiumError: The delivery mode isn't supported on this platform.
+    """
+    if name == StdinDelivery.name:
+        return StdinDelivery()
+    if name == MemfdDelivery.name:
+        return MemfdDelivery()
+    if name == TmpfsDelivery.name:
+        return TmpfsDelivery(filename)
+    assert name == "file", "unknown delivery mode: %s" % (name,)
+    return None
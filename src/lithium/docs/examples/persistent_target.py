@@ -0,0 +1,94 @@
+# coding=utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Reference target for Lithium's persistent mode (see `timed_run --persistent`).
+
+Testcases are run one line at a time:
+    print <text>: write <text> to stdout
+    error <text>: write <text> to stderr
+    pid: write the process ID to stdout
+    crash: abort the process
+    hang: sleep forever
+    exit <n>: stop running the testcase with exit code <n>
+Other lines are ignored.
+
+Usage:
+    python persistent_target.py testcase.txt
+        Run a single testcase and exit.
+    python persistent_target.py
+        Run testcases using the persistent protocol on stdin/stdout.
+"""
+
+import json
+import os
+import sys
+import time
+
+
+def run(path):
+    """Run a testcase.
+
+    Args:
+        path (str): Path to the testcase.
+
+    Returns:
+        int: Exit code of the testcase.
+    """
+    with open(path, "r") as testcase_fp:
+        for line in testcase_fp:
+            command, _, arg = line.strip().partition(" ")
+            if command == "print":
+                sys.stdout.write(arg + "\n")
+            elif command == "error":
+                sys.stderr.write(arg + "\n")
+            elif command == "pid":
+                sys.stdout.write("%d\n" % (os.getpid(),))
+            elif command == "crash":
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os.abort()
+            elif command == "hang":
+                while True:
+                    time.sleep(60)
+            elif command == "exit":
+                return int(arg)
+    return 0
+
+
+def serve():
+    """Run testcases requested by Lithium, until stdin is closed."""
+    # keep the real stdout for protocol messages, since fd 1 is redirected per test
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    saved_fds = [os.dup(1), os.dup(2)]
+    protocol.write(json.dumps({"version": 1}) + "\n")
+    protocol.flush()
+    for line in sys.stdin:
+        request = json.loads(line)
+        with open(request["stdout"], "wb") as out_fp, open(
+            request["stderr"], "wb"
+        ) as err_fp:
+            os.dup2(out_fp.fileno(), 1)
+            os.dup2(err_fp.fileno(), 2)
+            try:
+                status = run(request["testcase"])
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os.dup2(saved_fds[0], 1)
+                os.dup2(saved_fds[1], 2)
+        protocol.write(json.dumps({"status": status}) + "\n")
+        protocol.flush()
+
+
+def main():
+    """Run a testcase given on the command line, or serve the persistent protocol."""
+    if len(sys.argv) > 1:
+        sys.exit(run(sys.argv[1]))
+    serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Cheap checks which reject reduction attempts before the interestingness test is run.
+
+Attempts rejected by a filter are treated as uninteresting. A filter has a `name`, a
+`start(testcase)` method, which is called with the testcase before reduction starts,
+and an `accept(testcase)` method, which returns False to reject an attempt.
+"""
+
+import logging
+
+from .interestingness.utils import rel_or_abs_import
+from .util import bracket_balance
+
+LOG = logging.getLogger(__name__)
+
+
+class BalancedBrackets:
+    """Reject attempts which remove unbalanced brackets: (), [] or {}.
+
+    The balance of each bracket type in an attempt must be the same as in the
+    original testcase, so this also works for testcases which are not balanced to
+    begin with.
+    """
+
+    name = "balanced"
+    PAIRS = (b"()", b"[]", b"{}")
+
+    def __init__(self):
+        self._expected = None
+
+    def _balance(self, testcase):
+        data = testcase.to_bytes()
+        return tuple(bracket_balance(data, pair) for pair in self.PAIRS)
+
+    def start(self, testcase):
+        """Record the bracket balance of the original testcase.
+
+        Args:
+            testcase (Testcase): Testcase to be reduced.
+        """
+        self._expected = self._balance(testcase)
+
+    def accept(self, testcase):
+        """Check whether an attempt has the same bracket balance as the original.
+
+        Args:
+            testcase (Testcase): Reduction attempt.
+
+        Returns:
+            bool: False if the attempt should be rejected.
+        """
+        return self._balance(testcase) == self._expected
+
+
+class PythonValidator:
+    """Reject attempts using a Python function.
+
+    The module given should define a function `validate(data)`, which is called with
+    the contents of each attempt (bytes), and returns False to reject it.
+    """
+
+    def __init__(self, module):
+        """Initialize a Python validator.
+
+        Args:
+            module (str): Module name or path to a Python file
+                          (see `rel_or_abs_import`).
+        """
+        self.name = module
+        self._validate = rel_or_abs_import(module).validate
+
+    def start(self, testcase):
+        """Nothing to do before reduction starts.
+
+        Args:
+            testcase (Testcase): Testcase to be reduced.
+        """
+
+    def accept(self, testcase):
+        """Check an attempt with the validator.
+
+        Args:
+            testcase (Testcase): Reduction attempt.
+
+        Returns:
+            bool: False if the attempt should be rejected.
+        """
+        return bool(self._validate(testcase.to_bytes()))
+
+
+# Built-in filters, by name.
+FILTERS = {BalancedBrackets.name: BalancedBrackets}
@@ -12,28 +12,23 @@ Example:
 
 import logging
 
-from . import timed_run
+from . import timed_run, utils
 
 
-def interesting(cli_args, temp_prefix):
-    """Interesting if the binary causes a crash. (e.g. SIGKILL/SIGTERM/SIGTRAP etc.)
-
-    Args:
-        cli_args (list): List of input arguments.
-        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
-
-    Returns:
-        bool: True if binary crashes, False otherwise.
-    """
+def _parse_args(cli_args):
     parser = timed_run.ArgumentParser(
         prog="crashes",
         usage="python -m lithium %(prog)s [options] binary [flags] testcase.ext",
     )
-    args = parser.parse_args(cli_args)
+    return parser.parse_args(cli_args)
+
 
+_ARGS = utils.PreparedState(_parse_args)
+
+
+def _result(runinfo, adaptive, timeout):
     log = logging.getLogger(__name__)
-    # Run the program with desired flags and look out for crashes.
-    runinfo = timed_run.timed_run(args.cmd_with_flags, args.timeout, temp_prefix)
+    adaptive.record(runinfo, runinfo.sta == timed_run.CRASHED, timeout)
 
     time_str = " (%.3f seconds)" % runinfo.elapsedtime
     if runinfo.sta == timed_run.CRASHED:
@@ -42,3 +37,46 @@ def interesting(cli_args, temp_prefix):
 
     log.info("[Uninteresting] It didn't crash: " + runinfo.msg + time_str)
     return False
+
+
+def interesting(cli_args, temp_prefix):
+    """Interesting if the binary causes a crash. (e.g. SIGKILL/SIGTERM/SIGTRAP etc.)
+
+    Args:
+        cli_args (list): List of input arguments.
+        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
+
+    Returns:
+        bool: True if binary crashes, False otherwise.
+    """
+    args = _ARGS.get(cli_args)
+    adaptive = timed_run.adaptive_timeout("crashes", args)
+    timeout = adaptive.timeout()
+    # Run the program with desired flags and look out for crashes.
+    runinfo = timed_run.timed_run(
+        args.cmd_with_flags, timeout, temp_prefix, **timed_run.run_options(args)
+    )
+    return _result(runinfo, adaptive, timeout)
+
+
+async def interesting_async(cli_args, temp_prefix):
+    """Coroutine version of `interesting()`, using `timed_run.timed_run_async()`.
+
+    Args:
+        cli_args (list): List of input arguments.
+        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
+
+    Returns:
+        bool: True if binary crashes, False otherwise.
+    """
+    args = _ARGS.get(cli_args)
+    adaptive = timed_run.adaptive_timeout("crashes", args)
+    timeout = adaptive.timeout()
+    runinfo = await timed_run.timed_run_async(
+        args.cmd_with_flags, timeout, temp_prefix, **timed_run.run_options(args)
+    )
+    return _result(runinfo, adaptive, timeout)
+
+
+init = _ARGS.init
+cleanup = _ARGS.cleanup
@@ -24,21 +24,50 @@ Example with autobisectjs, split into separate lines here for readability:
 
 import filecmp
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from . import timed_run
+from . import timed_run, utils
 
 
-def interesting(cli_args, temp_prefix):
-    """Interesting if the binary shows a difference in output when different command
-    line arguments are passed in.
+class _OutputComparator:
+    """Compare the output of two runs as it is produced."""
 
-    Args:
-        cli_args (list): List of input arguments.
-        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
+    def __init__(self):
+        self._lock = threading.Lock()
+        # for each stream, the run which is ahead and the output the other run hasn't
+        # produced yet
+        self._ahead = {}
+        self.diverged = None
 
-    Returns:
-        bool: True if a difference in output appears, False otherwise.
-    """
+    def feed(self, run, stream, data):
+        """Compare the next chunk of output from one run with the other run.
+
+        Args:
+            run (str): Name of the run ("a" or "b")
+            stream (str): Name of the stream ("out" or "err")
+            data (bytes): Output produced by the run since the last call
+
+        Returns:
+            bool: True if the output of the two runs differs
+        """
+        with self._lock:
+            leader, pending = self._ahead.get(stream, (run, bytearray()))
+            if leader == run or not pending:
+                pending += data
+                self._ahead[stream] = (run, pending)
+                return False
+            common = min(len(pending), len(data))
+            if pending[:common] != data[:common]:
+                self.diverged = stream
+                return True
+            del pending[:common]
+            if not pending:
+                self._ahead[stream] = (run, bytearray(data[common:]))
+            return False
+
+
+def _parse_args(cli_args):
     parser = timed_run.ArgumentParser(
         prog="diff_test",
         usage="python -m lithium %(prog)s [options] binary testcase.ext",
@@ -56,23 +85,41 @@ def interesting(cli_args, temp_prefix):
         help="Set of extra arguments given to second run.",
     )
     args = parser.parse_args(cli_args)
+    args.commands = {
+        name: args.cmd_with_flags[:1] + extra_args.split() + args.cmd_with_flags[1:]
+        for name, extra_args in (("a", args.a_args), ("b", args.b_args))
+    }
+    return args
 
-    a_runinfo = timed_run.timed_run(
-        args.cmd_with_flags[:1] + args.a_args.split() + args.cmd_with_flags[1:],
-        args.timeout,
-        temp_prefix + "-a",
-    )
-    b_runinfo = timed_run.timed_run(
-        args.cmd_with_flags[:1] + args.b_args.split() + args.cmd_with_flags[1:],
-        args.timeout,
-        temp_prefix + "-b",
-    )
+
+_ARGS = utils.PreparedState(_parse_args)
+
+
+def _compare(a_runinfo, b_runinfo, comparator):
+    """Compare the results of the two runs.
+
+    Args:
+        a_runinfo (RunData): Result of the first run.
+        b_runinfo (RunData): Result of the second run.
+        comparator (_OutputComparator): Comparator used while the runs were running,
+                                        if any.
+
+    Returns:
+        bool: True if a difference in output appears, False otherwise.
+    """
     log = logging.getLogger(__name__)
     time_str = "(1st Run: %.3f seconds) (2nd Run: %.3f seconds)" % (
         a_runinfo.elapsedtime,
         b_runinfo.elapsedtime,
     )
 
+    if comparator is not None and comparator.diverged is not None:
+        log.info(
+            "[Interesting] Different %s. %s",
+            "output" if comparator.diverged == "out" else "error output",
+            time_str,
+        )
+        return True
     if a_runinfo.sta != timed_run.TIMED_OUT and b_runinfo.sta != timed_run.TIMED_OUT:
         if a_runinfo.return_code != b_runinfo.return_code:
             log.info(
@@ -94,3 +141,120 @@ def interesting(cli_args, temp_prefix):
 
     log.info("[Uninteresting] Identical behaviour. %s", time_str)
     return False
+
+
+class _Runs:
+    """Arguments for the two runs of one test."""
+
+    def __init__(self, args, temp_prefix):
+        self.args = args
+        self.temp_prefix = temp_prefix
+        # Run both configurations at once, comparing their output as it is produced,
+        # and stop both at the first difference, or when the group given to this
+        # thread is stopped (eg. by `repeat --parallel`). Persistent targets are kept
+        # per thread, so they are run one after the other instead.
+        self.comparator = None
+        self.stop_group = None
+        if not args.persistent:
+            self.comparator = _OutputComparator()
+            self.stop_group = timed_run.StopGroup(timed_run.current_stop_group())
+        self.adaptive = timed_run.adaptive_timeout("diff_test", args)
+        self.timeout = self.adaptive.timeout()
+
+    def command(self, name):
+        """Get the command for one run.
+
+        Args:
+            name (str): Name of the run ("a" or "b")
+
+        Returns:
+            tuple(list(str), dict): Positional and keyword arguments for `timed_run()`.
+        """
+        comparator = self.comparator
+        options = timed_run.run_options(self.args)
+        options["stop_on"] = (
+            (lambda stream, data: comparator.feed(name, stream, data))
+            if comparator is not None
+            else None
+        )
+        options["stop_group"] = self.stop_group
+        return (
+            [self.args.commands[name], self.timeout, self.temp_prefix + "-" + name],
+            options,
+        )
+
+    def result(self, a_runinfo, b_runinfo):
+        """Compare the runs, and record their times for `--adaptive-timeout`.
+
+        Args:
+            a_runinfo (RunData): Result of the first run.
+            b_runinfo (RunData): Result of the second run.
+
+        Returns:
+            bool: True if a difference in output appears, False otherwise.
+        """
+        result = _compare(a_runinfo, b_runinfo, self.comparator)
+        self.adaptive.record(a_runinfo, result, self.timeout)
+        self.adaptive.record(b_runinfo, result, self.timeout)
+        return result
+
+
+def interesting(cli_args, temp_prefix):
+    """Interesting if the binary shows a difference in output when different command
+    line arguments are passed in.
+
+    Args:
+        cli_args (list): List of input arguments.
+        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
+
+    Returns:
+        bool: True if a difference in output appears, False otherwise.
+    """
+    runs = _Runs(_ARGS.get(cli_args), temp_prefix)
+    # both runs get the input and owner given to this thread (see `--deliver stdin`)
+    inp = timed_run.default_input()
+    owner = timed_run.current_owner()
+
+    def _run(name):
+        cmd_args, cmd_kwds = runs.command(name)
+        with timed_run.input_from(inp), timed_run.owned_by(owner):
+            return timed_run.timed_run(*cmd_args, **cmd_kwds)
+
+    if runs.args.persistent:
+        a_runinfo = _run("a")
+        b_runinfo = _run("b")
+    else:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            a_future = executor.submit(_run, "a")
+            b_runinfo = _run("b")
+            a_runinfo = a_future.result()
+    return runs.result(a_runinfo, b_runinfo)
+
+
+async def interesting_async(cli_args, temp_prefix):
+    """Coroutine version of `interesting()`, using `timed_run.timed_run_async()`.
+    Both runs are supervised by the event loop, without a thread for each.
+
+    Args:
+        cli_args (list): List of input arguments.
+        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
+
+    Returns:
+        bool: True if a difference in output appears, False otherwise.
+    """
+    runs = _Runs(_ARGS.get(cli_args), temp_prefix)
+
+    def _run(name):
+        cmd_args, cmd_kwds = runs.command(name)
+        return timed_run.timed_run_async(*cmd_args, **cmd_kwds)
+
+    if runs.args.persistent:
+        a_runinfo = await _run("a")
+        b_runinfo = await _run("b")
+    else:
+        a_runinfo, b_runinfo = await timed_run.gather_async(_run("a"), _run("b"))
+    return runs.result(a_runinfo, b_runinfo)
+
+
+init = _ARGS.init
+cleanup = _ARGS.cleanup
@@ -12,7 +12,29 @@ Example:
 
 import logging
 
-from . import timed_run
+from . import timed_run, utils
+
+
+def _parse_args(cli_args):
+    parser = timed_run.ArgumentParser(
+        prog="hangs",
+        usage="python -m lithium %(prog)s [options] binary [flags] testcase.ext",
+        allow_adaptive_timeout=False,
+    )
+    return parser.parse_args(cli_args)
+
+
+_ARGS = utils.PreparedState(_parse_args)
+
+
+def _result(runinfo, args):
+    log = logging.getLogger(__name__)
+    if runinfo.sta == timed_run.TIMED_OUT:
+        log.info("Timed out after %.3f seconds", args.timeout)
+        return True
+
+    log.info("Exited in %.3f seconds", runinfo.elapsedtime)
+    return False
 
 
 def interesting(cli_args, temp_prefix):
@@ -25,18 +47,29 @@ def interesting(cli_args, temp_prefix):
     Returns:
         bool: True if binary causes a hang, False otherwise.
     """
-    parser = timed_run.ArgumentParser(
-        prog="hangs",
-        usage="python -m lithium %(prog)s [options] binary [flags] testcase.ext",
+    args = _ARGS.get(cli_args)
+    runinfo = timed_run.timed_run(
+        args.cmd_with_flags, args.timeout, temp_prefix, **timed_run.run_options(args)
     )
-    args = parser.parse_args(cli_args)
+    return _result(runinfo, args)
 
-    log = logging.getLogger(__name__)
-    runinfo = timed_run.timed_run(args.cmd_with_flags, args.timeout, temp_prefix)
 
-    if runinfo.sta == timed_run.TIMED_OUT:
-        log.info("Timed out after %.3f seconds", args.timeout)
-        return True
+async def interesting_async(cli_args, temp_prefix):
+    """Coroutine version of `interesting()`, using `timed_run.timed_run_async()`.
 
-    log.info("Exited in %.3f seconds", runinfo.elapsedtime)
-    return False
+    Args:
+        cli_args (list): List of input arguments.
+        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
+
+    Returns:
+        bool: True if binary causes a hang, False otherwise.
+    """
+    args = _ARGS.get(cli_args)
+    runinfo = await timed_run.timed_run_async(
+        args.cmd_with_flags, args.timeout, temp_prefix, **timed_run.run_options(args)
+    )
+    return _result(runinfo, args)
+
+
+init = _ARGS.init
+cleanup = _ARGS.cleanup
@@ -4,7 +4,7 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """Lithium's "outputs" interestingness test to assess whether an intended message shows
-up.
+up. The binary is stopped as soon as the message appears, unless --persistent is used.
 
 Example:
     python -m lithium outputs --timeout=9 FOO <binary> --fuzzing-safe <testcase>
@@ -12,21 +12,12 @@ Example:
 
 import logging
 import os
+import re
 
 from . import timed_run, utils
 
 
-def interesting(cli_args, temp_prefix):
-    """Interesting if the binary causes an intended message to show up. (e.g. on
-    stdout/stderr)
-
-    Args:
-        cli_args (list): List of input arguments.
-        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
-
-    Returns:
-        bool: True if the intended message shows up, False otherwise.
-    """
+def _parse_args(cli_args):
     parser = timed_run.ArgumentParser(
         prog="outputs",
         usage="python -m lithium %(prog)s [options] output_message binary [flags] "
@@ -41,15 +32,30 @@ def interesting(cli_args, temp_prefix):
     )
     args = parser.parse_args(cli_args)
 
-    log = logging.getLogger(__name__)
-
     search_for = args.cmd_with_flags[0]
     if not isinstance(search_for, bytes):
         search_for = os.fsencode(search_for)
+    # compiled once for all the matchers searching output as it is produced
+    args.pattern = re.compile(search_for, flags=re.MULTILINE) if args.regex else None
+    return args, search_for
 
-    # Run the program with desired flags and search stdout and stderr for intended
-    # message
-    runinfo = timed_run.timed_run(args.cmd_with_flags[1:], args.timeout, temp_prefix)
+
+_ARGS = utils.PreparedState(_parse_args)
+
+
+def _run_options(args, search_for):
+    # Unless the target is persistent, output is searched as it is produced, and the
+    # program is stopped as soon as the message is found.
+    matcher = None
+    if not args.persistent:
+        matcher = utils.OutputMatcher(search_for, regex=args.pattern or False)
+    options = timed_run.run_options(args)
+    options["stop_on"] = matcher.feed if matcher is not None else None
+    return options
+
+
+def _result(runinfo, args, search_for, temp_prefix, adaptive, timeout):
+    log = logging.getLogger(__name__)
 
     def file_contains(path):
         if args.regex:
@@ -59,6 +65,53 @@ def interesting(cli_args, temp_prefix):
     result = any(
         file_contains(temp_prefix + suffix) for suffix in ("-out.txt", "-err.txt")
     )
+    adaptive.record(runinfo, result, timeout)
 
     log.info("Exit status: %s (%.3f seconds)", runinfo.msg, runinfo.elapsedtime)
     return result
+
+
+def interesting(cli_args, temp_prefix):
+    """Interesting if the binary causes an intended message to show up. (e.g. on
+    stdout/stderr)
+
+    Args:
+        cli_args (list): List of input arguments.
+        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
+
+    Returns:
+        bool: True if the intended message shows up, False otherwise.
+    """
+    args, search_for = _ARGS.get(cli_args)
+
+    # Run the program with desired flags and search stdout and stderr for intended
+    # message.
+    adaptive = timed_run.adaptive_timeout("outputs", args)
+    timeout = adaptive.timeout()
+    runinfo = timed_run.timed_run(
+        args.cmd_with_flags[1:], timeout, temp_prefix, **_run_options(args, search_for)
+    )
+    return _result(runinfo, args, search_for, temp_prefix, adaptive, timeout)
+
+
+async def interesting_async(cli_args, temp_prefix):
+    """Coroutine version of `interesting()`, using `timed_run.timed_run_async()`.
+
+    Args:
+        cli_args (list): List of input arguments.
+        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
+
+    Returns:
+        bool: True if the intended message shows up, False otherwise.
+    """
+    args, search_for = _ARGS.get(cli_args)
+    adaptive = timed_run.adaptive_timeout("outputs", args)
+    timeout = adaptive.timeout()
+    runinfo = await timed_run.timed_run_async(
+        args.cmd_with_flags[1:], timeout, temp_prefix, **_run_options(args, search_for)
+    )
+    return _result(runinfo, args, search_for, temp_prefix, adaptive, timeout)
+
+
+init = _ARGS.init
+cleanup = _ARGS.cleanup
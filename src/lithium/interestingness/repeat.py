@@ -28,25 +28,72 @@ Use for:
    On the command line: (SpiderMonkey-specific example)
      python -m lithium repeat 20 crashes --timeout=9 \
        ./js --fuzzing-safe -e "n=REPEATNUM;" testcase.js
+
+With `--parallel K`, up to K repetitions are run at once, each with its own temporary
+prefix. Once one of them is interesting, no more are started, and commands still
+running in the others (using `timed_run`) are killed. The same K threads are used for
+every test, so persistent targets (which are kept per thread) are reused.
 """
 
 import argparse
 import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-from .utils import rel_or_abs_import
+from . import timed_run
+from .utils import PreparedState, rel_or_abs_import
 
 
-def interesting(cli_args, temp_prefix):
-    """Interesting if the desired interestingness test that is run together with
-    "repeat" also reports "interesting".
+def _run_parallel(args, condition_args, temp_prefix):
+    """Run repetitions of an interestingness test concurrently, until one is
+    interesting.
 
     Args:
-        cli_args (list): List of input arguments.
+        args (Namespace): Prepared arguments, with the interestingness test to repeat
+                          and the executor to run repetitions in.
+        condition_args (callable): Called with the repetition number to get the
+                                   arguments for the interestingness test.
         temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
 
     Returns:
-        bool: True if the desired interestingness test also returns True.
+        tuple(int, int): The first interesting repetition (or None), and the number
+                         of repetitions started.
     """
+    log = logging.getLogger(__name__)
+    # also stopped with the group given to this thread, if any (eg. by `diff_test`)
+    stop_group = timed_run.StopGroup(timed_run.current_stop_group())
+    inp = timed_run.default_input()
+    owner = timed_run.current_owner()
+
+    def _repeat(num):
+        log.info("Repeat number %d:", num)
+        with timed_run.stopped_by(stop_group), timed_run.owned_by(owner):
+            with timed_run.input_from(inp):
+                return args.condition_script.interesting(
+                    condition_args(num), "%s-%d" % (temp_prefix, num)
+                )
+
+    found = None
+    next_num = 1
+    running = {}
+    while running or (not stop_group.is_set and next_num <= args.loop_num):
+        # the group is also stopped by `outputs` as soon as it finds a match
+        while (
+            not stop_group.is_set
+            and next_num <= args.loop_num
+            and len(running) < args.parallel
+        ):
+            running[args.executor.submit(_repeat, next_num)] = next_num
+            next_num += 1
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            num = running.pop(future)
+            if future.result() and found is None:
+                found = num
+                stop_group.set()
+    return found, next_num - 1
+
+
+def _prepare(cli_args):
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-n",
@@ -56,29 +103,90 @@ def interesting(cli_args, temp_prefix):
         help="Set the cookie that is to be altered in the testcase. Defaults to "
         "'%(default)s'.",
     )
+    parser.add_argument(
+        "-p",
+        "--parallel",
+        default=1,
+        type=int,
+        help="Run up to this many repetitions at once. Defaults to '%(default)s'.",
+    )
     parser.add_argument("cmd_with_flags", nargs=argparse.REMAINDER)
     args = parser.parse_args(cli_args)
 
-    log = logging.getLogger(__name__)
+    args.loop_num = int(args.cmd_with_flags[0])
+    assert args.loop_num > 0, "Minimum number of iterations should be at least 1"
+
+    args.condition_script = rel_or_abs_import(args.cmd_with_flags[1])
+    args.condition_args = args.cmd_with_flags[2:]
+    args.executor = None
+    if args.parallel > 1:
+        args.executor = ThreadPoolExecutor(max_workers=args.parallel)
+
+    if hasattr(args.condition_script, "init"):
+        args.condition_script.init(args.condition_args)
+    return args
+
+
+_ARGS = PreparedState(_prepare)
+
+init = _ARGS.init
+
+
+def cleanup(cli_args):
+    """Clean up the interestingness tests which were repeated, and stop the threads
+    used by `--parallel`.
+
+    Args:
+        cli_args (list): List of input arguments.
+    """
+    for args in _ARGS.clear(cli_args):
+        if args.executor is not None:
+            args.executor.shutdown()
+        if hasattr(args.condition_script, "cleanup"):
+            args.condition_script.cleanup(args.condition_args)
 
-    loop_num = int(args.cmd_with_flags[0])
-    assert loop_num > 0, "Minimum number of iterations should be at least 1"
 
-    condition_script = rel_or_abs_import(args.cmd_with_flags[1])
-    condition_args = args.cmd_with_flags[2:]
+def interesting(cli_args, temp_prefix):
+    """Interesting if the desired interestingness test that is run together with
+    "repeat" also reports "interesting".
 
-    if hasattr(condition_script, "init"):
-        condition_script.init(condition_args)
+    Args:
+        cli_args (list): List of input arguments.
+        temp_prefix (str): Temporary directory prefix, e.g. tmp1/1 or tmp4/1
+
+    Returns:
+        bool: True if the desired interestingness test also returns True.
+    """
+    args = _ARGS.get(cli_args)
+
+    log = logging.getLogger(__name__)
+
+    loop_num = args.loop_num
+    condition_script = args.condition_script
+    condition_args = args.condition_args
+
+    def _condition_args(num):
+        # This doesn't do anything if REPEATNUM is not found.
+        return [arg.replace(args.repeat_num, str(num)) for arg in condition_args]
+
+    if args.parallel > 1:
+        found, started = _run_parallel(args, _condition_args, temp_prefix)
+        if found is not None:
+            log.info(
+                "Repetition %d of %d was interesting (%d started)",
+                found,
+                loop_num,
+                started,
+            )
+            return True
+        return False
 
     # Run the program over as many iterations as intended, with desired flags, replacing
     # REPEATNUM where necessary.
     for i in range(1, loop_num + 1):
-        # This doesn't do anything if REPEATNUM is not found.
-        replaced_condition_args = [
-            s.replace("REPEATNUM", str(i)) for s in condition_args
-        ]
         log.info("Repeat number %d:", i)
-        if condition_script.interesting(replaced_condition_args, temp_prefix):
+        if condition_script.interesting(_condition_args(i), temp_prefix):
+            log.info("Repetition %d of %d was interesting", i, loop_num)
             return True
 
     return False
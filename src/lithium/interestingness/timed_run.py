@@ -4,31 +4,110 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """Run a subprocess with timeout
+
+Targets which support it can also be kept running between tests ("persistent mode"),
+avoiding the cost of starting a new process for each test. Persistent targets
+communicate with Lithium using JSON messages, one per line, over their stdin/stdout:
+
+1. When the target is ready, it writes `{"version": 1}` to stdout.
+2. For each test, Lithium writes a request to the target's stdin:
+   `{"testcase": "<path>", "stdout": "<path>", "stderr": "<path>"}`
+3. The target runs the testcase with its output redirected to the `stdout` and `stderr`
+   files given, then writes `{"status": <code>}`, where `code` is the exit code it
+   would have exited with if run normally (0 for a normal exit, -N for signal N).
+
+The target is started with the command given to `timed_run()`, except for the last
+argument (the testcase), which is sent in each request instead. If the target exits
+while running a testcase, that testcase is treated as having exited with the same
+status as the target, and the target is restarted for the next test. If a testcase
+times out, the target is killed and restarted.
+
+See `lithium/docs/examples/persistent_target.py` for a reference implementation.
 """
 
 import argparse
+import asyncio
+import atexit
 import collections
+import contextlib
+import io
+import json
+import logging
+import math
+import os
 import platform
+import queue
 import signal
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+import weakref
 from pathlib import Path
 
-(CRASHED, TIMED_OUT, NORMAL, ABNORMAL, NONE) = range(5)
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+(CRASHED, TIMED_OUT, NORMAL, ABNORMAL, NONE, STOPPED) = range(6)
 
 
 # Define struct that contains data from a process that has already ended.
 RunData = collections.namedtuple(
     "RunData",
-    "sta, return_code, msg, elapsedtime, killed, out, err, pid",
+    "sta, return_code, msg, elapsedtime, killed, out, err, pid, rusage",
 )
+# rusage is optional
+RunData.__new__.__defaults__ = (None,)
+
+# Define struct that contains the resource usage of a process (see `os.wait4()`).
+# Times are in seconds, and maxrss is in KiB.
+ResourceUsage = collections.namedtuple(
+    "ResourceUsage", "utime, stime, maxrss, minflt, majflt"
+)
+
+_LAST_RUN = threading.local()
+_TOTALS_LOCK = threading.Lock()
+_TOTALS = {}
+_STOP_GROUP = threading.local()
+# owner of the persistent targets and adaptive timeouts used in each thread (see
+# `owned_by()`)
+_OWNER = threading.local()
+# default stdin for commands run in each thread (see `input_from()`)
+_INPUT = threading.local()
+# results of `timed_run_async()`, keyed by asyncio task
+_ASYNC_LAST_RUN = weakref.WeakKeyDictionary()
+
+LOG = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+# Persistent targets, keyed by owner, thread, command and environment.
+_PERSISTENT_TARGETS = {}
+_PERSISTENT_LOCK = threading.Lock()
+# Adaptive timeouts, keyed by owner, interestingness test and timeout arguments.
+_ADAPTIVE_TIMEOUTS = {}
+_ADAPTIVE_LOCK = threading.Lock()
+
+
+def _megabytes(value):
+    return int(value) * 1024 * 1024
 
 
 class ArgumentParser(argparse.ArgumentParser):
     """Argument parser with `timeout` and `cmd_with_args`"""
 
-    def __init__(self, *args, **kwds):
+    def __init__(self, *args, allow_adaptive_timeout=True, **kwds):
+        """Initialize the argument parser.
+
+        Args:
+            *args: Arguments for `argparse.ArgumentParser`.
+            allow_adaptive_timeout (bool): Add the `--adaptive-timeout` option. This
+                                           should be False for tests which look
+                                           for timeouts.
+            **kwds: Keyword arguments for `argparse.ArgumentParser`.
+        """
         super().__init__(*args, **kwds)
         self.add_argument(
             "-t",
@@ -38,8 +117,206 @@ class ArgumentParser(argparse.ArgumentParser):
             type=int,
             help="Set the timeout. Defaults to '%(default)s' seconds.",
         )
+        self.add_argument(
+            "--persistent",
+            action="store_true",
+            help="Keep the target running between tests. The target must support "
+            "the persistent protocol described in `lithium.interestingness.timed_run`.",
+        )
+        self.add_argument(
+            "--memory-limit",
+            dest="memory_limit",
+            metavar="MB",
+            type=_megabytes,
+            help="Limit the address space of the target (RLIMIT_AS), in megabytes.",
+        )
+        self.add_argument(
+            "--cpu-limit",
+            dest="cpu_limit",
+            metavar="SECONDS",
+            type=int,
+            help="Limit the CPU time of the target (RLIMIT_CPU). Runs which exceed "
+            "this are treated as timed out.",
+        )
+        if allow_adaptive_timeout:
+            self.add_argument(
+                "--adaptive-timeout",
+                dest="adaptive_timeout",
+                metavar="K",
+                type=float,
+                help="Lower the timeout to K times the 95th percentile runtime of "
+                "interesting runs so far (at most --timeout).",
+            )
         self.add_argument("cmd_with_flags", nargs=argparse.REMAINDER)
 
+    def parse_args(self, args=None, namespace=None):
+        """Parse the arguments. Resource limits apply to the whole target process, so
+        they can't be used with `--persistent`, where one process runs many tests.
+        """
+        result = super().parse_args(args, namespace)
+        if result.persistent and (
+            result.memory_limit is not None or result.cpu_limit is not None
+        ):
+            self.error("--memory-limit and --cpu-limit can't be used with --persistent")
+        return result
+
+
+def run_options(args):
+    """Get the options given to `timed_run()` from arguments parsed by
+    `ArgumentParser`.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments.
+
+    Returns:
+        dict: Keyword arguments for `timed_run()` or `timed_run_async()`.
+    """
+    return {
+        "persistent": args.persistent,
+        "memory_limit": args.memory_limit,
+        "cpu_limit": args.cpu_limit,
+    }
+
+
+class AdaptiveTimeout:
+    """Timeout learned from the runtime of interesting runs.
+
+    Once an interesting run has been seen, the timeout is capped at `factor` times the
+    `PERCENTILE`th percentile of the `WINDOW` most recent interesting runtimes.
+    """
+
+    PERCENTILE = 95
+    WINDOW = 100
+
+    def __init__(self, max_timeout, factor=None):
+        """Initialize an adaptive timeout.
+
+        Args:
+            max_timeout (int): Timeout to use until a runtime is known, and upper
+                               bound for the adaptive timeout.
+            factor (float): Multiple of the observed runtime to use as the timeout,
+                            or None to always use `max_timeout`.
+        """
+        assert factor is None or factor > 0
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.saved = 0
+        self.stopped = 0
+        self._lock = threading.Lock()
+        self._runtimes = collections.deque(maxlen=self.WINDOW)
+
+    def timeout(self):
+        """Get the timeout for the next run.
+
+        Returns:
+            int: Timeout, in seconds.
+        """
+        with self._lock:
+            if self.factor is None or not self._runtimes:
+                return self.max_timeout
+            runtimes = sorted(self._runtimes)
+        idx = max(int(math.ceil(len(runtimes) * self.PERCENTILE / 100.0)) - 1, 0)
+        cap = max(int(math.ceil(runtimes[idx] * self.factor)), 1)
+        return min(cap, self.max_timeout)
+
+    def record(self, run_data, interesting, timeout):
+        """Record the result of a run.
+
+        Args:
+            run_data (RunData): Result of `timed_run()`.
+            interesting (bool): Whether the run was interesting.
+            timeout (int): Timeout the run was given (see `timeout()`).
+        """
+        if self.factor is None:
+            return
+        with self._lock:
+            if interesting:
+                self._runtimes.append(run_data.elapsedtime)
+            if run_data.sta == TIMED_OUT and timeout < self.max_timeout:
+                self.saved += self.max_timeout - timeout
+                self.stopped += 1
+
+
+def adaptive_timeout(name, args):
+    """Get the adaptive timeout for an interestingness test, shared between calls
+    with the same timeout arguments and owner (see `owned_by()`).
+
+    Args:
+        name (str): Name of the interestingness test.
+        args (argparse.Namespace): Arguments parsed by `ArgumentParser`.
+
+    Returns:
+        AdaptiveTimeout: The adaptive timeout. If `--adaptive-timeout` wasn't given,
+                         this always uses `--timeout`.
+    """
+    factor = getattr(args, "adaptive_timeout", None)
+    if factor is None:
+        return AdaptiveTimeout(args.timeout)
+    key = (current_owner(), name, args.timeout, factor)
+    with _ADAPTIVE_LOCK:
+        if key not in _ADAPTIVE_TIMEOUTS:
+            _ADAPTIVE_TIMEOUTS[key] = AdaptiveTimeout(args.timeout, factor)
+        return _ADAPTIVE_TIMEOUTS[key]
+
+
+@contextlib.contextmanager
+def owned_by(owner):
+    """Keep the persistent targets and adaptive timeouts used by `timed_run()` in the
+    current thread for `owner` (eg. one reduction), so they aren't shared with, or
+    stopped by `cleanup()` for, other reductions running in the same process.
+
+    Args:
+        owner (object): Hashable owner, eg. a `Lithium` instance.
+
+    Yields:
+        object: The owner.
+    """
+    previous = getattr(_OWNER, "owner", None)
+    _OWNER.owner = owner
+    try:
+        yield owner
+    finally:
+        _OWNER.owner = previous
+
+
+def current_owner():
+    """Get the owner given to `owned_by()` in the current thread, eg. to pass it on
+    to other threads running commands for the same test.
+
+    Returns:
+        object or None: The owner, or None if no owner was given.
+    """
+    return getattr(_OWNER, "owner", None)
+
+
+def cleanup():
+    """Stop the persistent targets and report the time saved by the adaptive timeouts
+    of the current owner (see `owned_by()`). Interestingness tests using `timed_run()`
+    should call this from their own `cleanup()`.
+    """
+    owner = current_owner()
+    with _PERSISTENT_LOCK:
+        targets = [
+            _PERSISTENT_TARGETS.pop(key)
+            for key in list(_PERSISTENT_TARGETS)
+            if key[0] == owner
+        ]
+    for target in targets:
+        target.close()
+    with _ADAPTIVE_LOCK:
+        adaptive = [
+            (key, _ADAPTIVE_TIMEOUTS.pop(key))
+            for key in list(_ADAPTIVE_TIMEOUTS)
+            if key[0] == owner
+        ]
+    for (_, name, _, _), state in adaptive:
+        LOG.info(
+            "%s: adaptive timeout saved %d seconds (%d runs timed out early)",
+            name,
+            state.saved,
+            state.stopped,
+        )
+
 
 def get_signal_name(signum, default="Unknown signal"):
     """Stringify a signal number. The result will be something like "SIGSEGV",
@@ -61,26 +338,561 @@ def get_signal_name(signum, default="Unknown signal"):
     return default
 
 
-def timed_run(
-    cmd_with_args, timeout, log_prefix=None, env=None, inp=None, preexec_fn=None
-):
-    """If log_prefix is None, uses pipes instead of files for all output.
+def _exit_status(return_code):
+    """Classify the exit code of a process that wasn't killed by Lithium.
 
     Args:
-        cmd_with_args (list): List of command and parameters to be executed
-        timeout (int): Timeout for the command to be run, in seconds
-        log_prefix (str): Prefix string of the log files
-        env (dict): Environment for the command to be executed in
-        inp (str): stdin to be passed to the command
-        preexec_fn (callable): called in child process after fork, prior to exec
+        return_code (int): Exit code of the process.
 
-    Raises:
-        TypeError: Raises if input parameters are not of the desired types
-                   (e.g. cmd_with_args should be a list)
-        OSError: Raises if timed_run is attempted to be used with gdb
+    Returns:
+        tuple(int, str): Status (eg. `CRASHED`) and message describing it.
+    """
+    if return_code == 0:
+        return NORMAL, "NORMAL"
+    if 0 < return_code < 0x80000000:
+        return ABNORMAL, "ABNORMAL exit code " + str(return_code)
+    # return_code < 0 (or > 0x80000000 in Windows)
+    # The program was terminated by a signal, which usually indicates a crash.
+    # Mac/Linux only!
+    # XXX: this doesn't work on Windows
+    if return_code < 0:
+        signum = -return_code
+    else:
+        signum = return_code
+    return CRASHED, "CRASHED signal %d (%s)" % (signum, get_signal_name(signum))
+
+
+class PersistentTarget:
+    """A target process which is kept running to run many testcases, using the
+    persistent protocol described at the top of this module.
+    """
+
+    def __init__(self, cmd, env=None, preexec_fn=None):
+        """Initialize a persistent target. The process is started on first use.
+
+        Args:
+            cmd (list): Command and parameters to start the target, without a
+                        testcase.
+            env (dict): Environment for the target to be executed in
+            preexec_fn (callable): called in child process after fork, prior to exec
+        """
+        self.cmd = list(cmd)
+        self.env = env
+        self.preexec_fn = preexec_fn
+        self.pid = None
+        self.spawn_count = 0
+        self._proc = None
+        self._responses = None
+        # held while running a testcase, so the target isn't closed from another
+        # thread (eg. by `close_persistent_targets()` at exit) during a run
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._proc = subprocess.Popen(  # pylint: disable=subprocess-popen-preexec-fn
+            self.cmd,
+            env=self.env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            preexec_fn=self.preexec_fn,
+        )
+        self.pid = self._proc.pid
+        self.spawn_count += 1
+        self._responses = queue.Queue()
+        reader = threading.Thread(
+            target=self._read, args=(self._proc.stdout, self._responses)
+        )
+        reader.daemon = True
+        reader.start()
+
+    @staticmethod
+    def _read(stream, responses):
+        with stream:
+            for line in stream:
+                responses.put(line)
+        responses.put(None)
+
+    def _receive(self, deadline):
+        """Wait for the next message from the target.
+
+        Returns:
+            dict or None: The message, or None if the target exited.
+
+        Raises:
+            queue.Empty: No message was received before `deadline`.
+            RuntimeError: The target sent an invalid message.
+        """
+        line = self._responses.get(timeout=max(deadline - time.monotonic(), 0))
+        if line is None:
+            return None
+        try:
+            message = json.loads(line.decode("utf-8"))
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            self._close()
+            raise RuntimeError("Invalid message from persistent target: %r" % (line,))
+        return message
+
+    def run(self, testcase, timeout, stdout_path, stderr_path):
+        """Run a testcase in the target, starting it if necessary.
+
+        Args:
+            testcase (str): Path to the testcase.
+            timeout (int): Timeout for the testcase, in seconds. This includes the
+                           time to start the target, if it isn't already running.
+            stdout_path (str): File for the target to write testcase output to.
+            stderr_path (str): File for the target to write testcase errors to.
+
+        Returns:
+            int or None: Exit status of the testcase, or None if it timed out.
+        """
+        with self._lock:
+            return self._run(testcase, timeout, stdout_path, stderr_path)
+
+    def _run(self, testcase, timeout, stdout_path, stderr_path):
+        deadline = time.monotonic() + timeout
+        if self._proc is not None and self._proc.poll() is not None:
+            # the target exited while idle, its status isn't for this testcase
+            LOG.debug(
+                "Persistent target %d exited with %d between testcases, restarting",
+                self.pid,
+                self._proc.returncode,
+            )
+            self._close()
+        try:
+            if self._proc is None:
+                self._start()
+                message = self._receive(deadline)
+                if message is not None and message.get("version") != PROTOCOL_VERSION:
+                    self._close()
+                    raise RuntimeError(
+                        "Unsupported persistent protocol version: %r"
+                        % (message.get("version"),)
+                    )
+            else:
+                message = {}
+            if message is not None:
+                request = {
+                    "testcase": testcase,
+                    "stdout": stdout_path,
+                    "stderr": stderr_path,
+                }
+                try:
+                    self._proc.stdin.write(json.dumps(request).encode("utf-8") + b"\n")
+                    self._proc.stdin.flush()
+                except OSError:
+                    pass  # the target exited, which will be seen by `_receive`
+                message = self._receive(deadline)
+        except queue.Empty:
+            self._close()
+            return None
+        if message is None:
+            # the target exited while running the testcase
+            self._proc.wait()
+            status = self._proc.returncode
+            self._close()
+            return status
+        return int(message["status"])
+
+    def close(self):
+        """Stop the target process, if it is running."""
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._proc is None:
+            return
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass  # unwritten data can't be flushed to a target which exited
+        self._proc = None
+
+
+def close_persistent_targets():
+    """Stop all persistent targets started by `timed_run()`."""
+    with _PERSISTENT_LOCK:
+        targets = list(_PERSISTENT_TARGETS.values())
+        _PERSISTENT_TARGETS.clear()
+    for target in targets:
+        target.close()
+
+
+atexit.register(close_persistent_targets)
+
+
+def _persistent_target(cmd, env, preexec_fn, owner):
+    key = (
+        owner,
+        threading.current_thread().ident,
+        tuple(cmd),
+        tuple(sorted(env.items())) if env is not None else None,
+    )
+    with _PERSISTENT_LOCK:
+        if key not in _PERSISTENT_TARGETS:
+            _PERSISTENT_TARGETS[key] = PersistentTarget(cmd, env, preexec_fn)
+        return _PERSISTENT_TARGETS[key]
+
+
+def _persistent_run(cmd_with_args, timeout, log_prefix, env, preexec_fn, owner):
+    target = _persistent_target(cmd_with_args[:-1], env, preexec_fn, owner)
+    if log_prefix is not None:
+        out_path = log_prefix + "-out.txt"
+        err_path = log_prefix + "-err.txt"
+    else:
+        out_fd, out_path = tempfile.mkstemp(suffix="-out.txt")
+        err_fd, err_path = tempfile.mkstemp(suffix="-err.txt")
+        os.close(out_fd)
+        os.close(err_fd)
+    # the target may not write anything, eg. if it crashes before opening these
+    for path in (out_path, err_path):
+        open(path, "wb").close()
+
+    start_time = time.monotonic()
+    return_code = target.run(
+        str(Path(cmd_with_args[-1]).resolve()),
+        timeout,
+        str(Path(out_path).resolve()),
+        str(Path(err_path).resolve()),
+    )
+    elapsed_time = time.monotonic() - start_time
+
+    if return_code is None:
+        sta, msg = TIMED_OUT, "TIMED OUT"
+    else:
+        sta, msg = _exit_status(return_code)
+
+    if log_prefix is not None:
+        stdout, stderr = out_path, err_path
+    else:
+        stdout = Path(out_path).read_bytes()
+        stderr = Path(err_path).read_bytes()
+        os.unlink(out_path)
+        os.unlink(err_path)
+
+    _LAST_RUN.run_data = RunData(
+        sta,
+        return_code,
+        msg,
+        elapsed_time,
+        sta == TIMED_OUT,
+        stdout,
+        stderr,
+        target.pid,
+    )
+    _add_to_totals(_LAST_RUN.run_data)
+    return _LAST_RUN.run_data
+
+
+class StopGroup:
+    """Commands run by `timed_run()` which are stopped together, eg. when comparing
+    their output as it is produced.
+
+    Args:
+        parent (StopGroup): Group which also stops this group, eg. the group given to
+                            the current thread by `stopped_by()`.
+    """
+
+    def __init__(self, parent=None):
+        self._lock = threading.Lock()
+        self._children = []
+        self._stopped = set()
+        self.is_set = False
+        if parent is not None:
+            parent.add(self)
+
+    def add(self, child):
+        """Add a process or group to the group. It is stopped immediately if the group
+        has already been stopped.
+
+        Args:
+            child (Popen or asyncio.subprocess.Process or StopGroup): Process or group
+                                                                      to add.
+        """
+        with self._lock:
+            self._children.append(child)
+            if self.is_set:
+                self._kill(child)
+
+    def _kill(self, child):
+        if isinstance(child, StopGroup):
+            child.set()
+            return
+        # asyncio processes (see `timed_run_async()`) don't have `poll()`
+        if hasattr(child, "poll"):
+            running = child.poll() is None
+        else:
+            running = child.returncode is None
+        if running:
+            child.kill()
+            self._stopped.add(child.pid)
+
+    def set(self):
+        """Stop all processes in the group which are still running."""
+        with self._lock:
+            self.is_set = True
+            for child in self._children:
+                self._kill(child)
+
+    def stopped(self, child):
+        """Check whether a process was killed by this group.
+
+        Args:
+            child (Popen or asyncio.subprocess.Process): Process in the group.
+
+        Returns:
+            bool: True if the process was killed by `set()`.
+        """
+        with self._lock:
+            return child.pid in self._stopped
+
+
+@contextlib.contextmanager
+def stopped_by(stop_group):
+    """Add commands run by `timed_run()` in the current thread to a stop group, eg. so
+    an interestingness test run in this thread can be cancelled.
+
+    Args:
+        stop_group (StopGroup): Group to add commands to.
+
+    Yields:
+        StopGroup: The group.
+    """
+    previous = getattr(_STOP_GROUP, "group", None)
+    _STOP_GROUP.group = stop_group
+    try:
+        yield stop_group
+    finally:
+        _STOP_GROUP.group = previous
+
+
+def current_stop_group():
+    """Get the group given to `stopped_by()` in the current thread, eg. to chain a
+    group of commands run for the same test to it.
 
     Returns:
-        class: A rundata instance containing run information
+        StopGroup or None: The group, or None if no group was given.
+    """
+    return getattr(_STOP_GROUP, "group", None)
+
+
+@contextlib.contextmanager
+def input_from(data):
+    """Give `data` as stdin to commands run by `timed_run()` in the current thread
+    which aren't given `inp`, eg. to pass a testcase to the target of an
+    interestingness test which doesn't know how the testcase is delivered.
+
+    Args:
+        data (bytes): Input for the commands.
+
+    Yields:
+        bytes: The input.
+    """
+    previous = getattr(_INPUT, "data", None)
+    _INPUT.data = data
+    try:
+        yield data
+    finally:
+        _INPUT.data = previous
+
+
+def default_input():
+    """Get the input given to `input_from()` in the current thread, eg. to pass it on
+    to other threads running commands for the same test.
+
+    Returns:
+        bytes or None: The input, or None if no input was given.
+    """
+    return getattr(_INPUT, "data", None)
+
+
+def _write_input(child, inp):
+    """Write input to a child process, and close its stdin."""
+    try:
+        child.stdin.write(inp)
+    except (BrokenPipeError, ConnectionResetError):
+        # the process doesn't have to read all of its input
+        pass
+    try:
+        child.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+def _stream_output(child, timeout, stop_on, stop_group, out_sink, err_sink, inp=None):
+    """Copy output from a child process as it is produced, killing the process if
+    `stop_on` returns True.
+
+    Args:
+        child (Popen): Process with stdout and stderr pipes (and a stdin pipe, if
+                       `inp` is given).
+        timeout (int): Timeout for the process, in seconds.
+        stop_on (callable): See `timed_run()`.
+        stop_group (StopGroup): Group to stop when `stop_on` returns True.
+        out_sink (file): File to copy stdout to.
+        err_sink (file): File to copy stderr to.
+        inp (bytes): Input to write to the process.
+
+    Returns:
+        tuple(bytes, bytes, int): Output copied to `out_sink` and `err_sink` (if they
+                                  are `BytesIO`), and the run status: `TIMED_OUT`,
+                                  `STOPPED` or `NONE` if the process exited by itself.
+    """
+    lock = threading.Lock()
+    stop_group.add(child)
+
+    def _copy(stream, name, sink):
+        with stream:
+            for chunk in iter(lambda: stream.read1(65536), b""):
+                sink.write(chunk)
+                with lock:
+                    if not stop_group.is_set and stop_on(name, chunk):
+                        stop_group.set()
+
+    readers = [
+        threading.Thread(target=_copy, args=(child.stdout, "out", out_sink)),
+        threading.Thread(target=_copy, args=(child.stderr, "err", err_sink)),
+    ]
+    if inp is not None:
+        readers.append(threading.Thread(target=_write_input, args=(child, inp)))
+    for reader in readers:
+        reader.start()
+    sta = NONE
+    try:
+        child.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        child.kill()
+        child.wait()
+        sta = TIMED_OUT
+    for reader in readers:
+        reader.join()
+    if stop_group.stopped(child):
+        sta = STOPPED
+    if isinstance(out_sink, io.BytesIO):
+        return out_sink.getvalue(), err_sink.getvalue(), sta
+    return None, None, sta
+
+
+class _Popen(subprocess.Popen):
+    """Popen which reaps the process itself with `os.wait4()`, to record its resource
+    usage.
+    """
+
+    rusage = None
+    # True if the exit status couldn't be read (see `_reap()`)
+    status_lost = False
+
+    def __init__(self, *args, **kwds):
+        self._reap_lock = threading.Lock()
+        super().__init__(*args, **kwds)
+
+    def _reap(self, flags):
+        """Reap the process if it has exited, and set `returncode` and `rusage`.
+
+        Must be called with `_reap_lock` held.
+        """
+        if self.returncode is not None:
+            return
+        try:
+            pid, sts, rusage = os.wait4(self.pid, flags)
+        except ChildProcessError:
+            # reaped by someone else (eg. SIGCHLD is ignored), the status is lost, so
+            # don't report it as a normal exit (or as a crash)
+            LOG.warning("Exit status of process %d was lost", self.pid)
+            self.status_lost = True
+            self.returncode = 255
+            return
+        if pid != self.pid:
+            return
+        if os.WIFSIGNALED(sts):
+            self.returncode = -os.WTERMSIG(sts)
+        else:
+            self.returncode = os.WEXITSTATUS(sts)
+        # ru_maxrss is in bytes on macOS, and KiB elsewhere
+        maxrss = rusage.ru_maxrss
+        if platform.system() == "Darwin":
+            maxrss //= 1024
+        self.rusage = ResourceUsage(
+            rusage.ru_utime,
+            rusage.ru_stime,
+            maxrss,
+            rusage.ru_minflt,
+            rusage.ru_majflt,
+        )
+
+    def poll(self):
+        if not hasattr(os, "wait4"):
+            return super().poll()
+        # don't wait for a blocking `wait()` in another thread (see `StopGroup`)
+        if self._reap_lock.acquire(False):
+            try:
+                self._reap(os.WNOHANG)
+            finally:
+                self._reap_lock.release()
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not hasattr(os, "wait4"):
+            return super().wait(timeout=timeout)
+        if timeout is None:
+            with self._reap_lock:
+                self._reap(0)
+            return self.returncode
+        end_time = time.monotonic() + timeout
+        delay = 0.0005
+        while self.poll() is None:
+            remaining = end_time - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            delay = min(delay * 2, remaining, 0.05)
+            time.sleep(delay)
+        return self.returncode
+
+
+def _limit_resources(preexec_fn, memory_limit, cpu_limit):
+    """Add resource limits to a preexec_fn.
+
+    Raises:
+        OSError: Resource limits aren't supported on this platform.
+    """
+    if memory_limit is None and cpu_limit is None:
+        return preexec_fn
+    if resource is None:
+        raise OSError("Resource limits are not supported on this platform")
+
+    def _preexec():
+        if memory_limit is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        if cpu_limit is not None:
+            # SIGXCPU at the limit, SIGKILL if that is ignored
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+        if preexec_fn is not None:
+            preexec_fn()
+
+    return _preexec
+
+
+def _cpu_limited(return_code, rusage, cpu_limit):
+    """Check whether a process was killed for exceeding RLIMIT_CPU."""
+    if return_code == -signal.SIGXCPU:
+        return True
+    return (
+        return_code == -signal.SIGKILL
+        and rusage is not None
+        and rusage.utime + rusage.stime >= cpu_limit
+    )
+
+
+def _check_args(cmd_with_args, timeout, log_prefix, preexec_fn):
+    """Check the arguments to `timed_run()`, and expand `~` in the command.
+
+    Raises:
+        TypeError: See `timed_run()`.
+        OSError: The command is gdb.
     """
     if not isinstance(cmd_with_args, list):
         raise TypeError("cmd_with_args should be a list (of strings).")
@@ -100,27 +912,189 @@ def timed_run(
             "kill gdb but leave the process within gdb still running"
         )
 
+
+def _run_data(sta, child, rusage, elapsed_time, log_prefix, stdout, stderr, cpu_limit):
+    """Describe a finished run, and add it to the resource totals.
+
+    Returns:
+        RunData: The result of the run.
+    """
+    if sta == TIMED_OUT:
+        msg = "TIMED OUT"
+    elif sta == STOPPED:
+        msg = "STOPPED"
+    elif getattr(child, "status_lost", False):
+        sta, msg = ABNORMAL, "ABNORMAL exit status lost"
+    else:
+        sta, msg = _exit_status(child.returncode)
+        if (
+            sta == CRASHED
+            and cpu_limit is not None
+            and _cpu_limited(child.returncode, rusage, cpu_limit)
+        ):
+            sta = TIMED_OUT
+            msg = "CPU LIMIT EXCEEDED"
+
+    run_data = RunData(
+        sta,
+        child.returncode if sta not in {TIMED_OUT, STOPPED} else None,
+        msg,
+        elapsed_time,
+        sta in {TIMED_OUT, STOPPED},
+        log_prefix + "-out.txt" if log_prefix is not None else stdout,
+        log_prefix + "-err.txt" if log_prefix is not None else stderr,
+        child.pid,
+        rusage,
+    )
+    _add_to_totals(run_data)
+    return run_data
+
+
+def _add_to_totals(run_data):
+    with _TOTALS_LOCK:
+        _TOTALS["runs"] = _TOTALS.get("runs", 0) + 1
+        _TOTALS["elapsed"] = _TOTALS.get("elapsed", 0) + run_data.elapsedtime
+        if run_data.rusage is not None:
+            _TOTALS["measured"] = _TOTALS.get("measured", 0) + 1
+            for field in ("utime", "stime", "minflt", "majflt"):
+                _TOTALS[field] = _TOTALS.get(field, 0) + getattr(run_data.rusage, field)
+            _TOTALS["maxrss"] = max(_TOTALS.get("maxrss", 0), run_data.rusage.maxrss)
+
+
+def resource_totals(reset=False):
+    """Get the resources used by all commands run by `timed_run()`.
+
+    Args:
+        reset (bool): Start counting again from zero.
+
+    Returns:
+        dict: "runs" (number of commands run), "elapsed" (total wall time in seconds),
+              and for the commands whose resource usage is known ("measured"), the
+              total "utime", "stime", "minflt" and "majflt", and the highest
+              "maxrss". Keys are missing if no commands were run.
+    """
+    with _TOTALS_LOCK:
+        totals = dict(_TOTALS)
+        if reset:
+            _TOTALS.clear()
+    return totals
+
+
+def last_run():
+    """Get the result of the most recent `timed_run` call in the current thread.
+
+    Returns:
+        RunData or None: The last run, or None if nothing was run in this thread.
+    """
+    return getattr(_LAST_RUN, "run_data", None)
+
+
+def timed_run(
+    cmd_with_args,
+    timeout,
+    log_prefix=None,
+    env=None,
+    inp=None,
+    preexec_fn=None,
+    persistent=False,
+    stop_on=None,
+    stop_group=None,
+    memory_limit=None,
+    cpu_limit=None,
+):
+    """If log_prefix is None, uses pipes instead of files for all output.
+
+    Args:
+        cmd_with_args (list): List of command and parameters to be executed
+        timeout (int): Timeout for the command to be run, in seconds
+        log_prefix (str): Prefix string of the log files
+        env (dict): Environment for the command to be executed in
+        inp (bytes): stdin to be passed to the command. Defaults to the input given
+                     to `input_from()` in this thread, if any.
+        preexec_fn (callable): called in child process after fork, prior to exec
+        persistent (bool): Run the testcase (the last item in cmd_with_args) in a
+                           persistent target, which is reused by later calls with the
+                           same command and environment in the same thread and with
+                           the same owner (see `owned_by()`).
+        stop_on (callable): Read output as it is produced, calling
+                            `stop_on(stream, data)` with each chunk of output, where
+                            stream is "out" or "err". If it returns True, the command
+                            is killed and the result is `STOPPED`.
+        stop_group (StopGroup): Kill the command if this group is stopped. With
+                                stop_on, the group is stopped when stop_on returns
+                                True. Defaults to the group given to `stopped_by()`
+                                in this thread, if any.
+        memory_limit (int): Limit the address space of the command, in bytes
+        cpu_limit (int): Limit the CPU time of the command, in seconds. If it is
+                         exceeded, the result is `TIMED_OUT`.
+
+    Raises:
+        TypeError: Raises if input parameters are not of the desired types
+                   (e.g. cmd_with_args should be a list), or if inp, stop_on or
+                   resource limits are given with persistent
+        OSError: Raises if timed_run is attempted to be used with gdb, or if resource
+                 limits are given on a platform which doesn't support them
+
+    Returns:
+        class: A rundata instance containing run information
+    """
+    _check_args(cmd_with_args, timeout, log_prefix, preexec_fn)
+    preexec_fn = _limit_resources(preexec_fn, memory_limit, cpu_limit)
+    if inp is None:
+        inp = default_input()
+
+    if persistent:
+        if inp is not None or stop_on is not None:
+            raise TypeError("inp and stop_on are not supported by persistent targets.")
+        if memory_limit is not None or cpu_limit is not None:
+            # the limits would apply to all the tests run by the target together
+            raise TypeError(
+                "memory_limit and cpu_limit are not supported by persistent targets."
+            )
+        return _persistent_run(
+            cmd_with_args, timeout, log_prefix, env, preexec_fn, current_owner()
+        )
+
+    if stop_group is None:
+        stop_group = current_stop_group()
+
     sta = NONE
-    msg = ""
 
     child_stdout = child_stderr = subprocess.PIPE
     if log_prefix is not None:
         child_stdout = open(log_prefix + "-out.txt", "wb")
         child_stderr = open(log_prefix + "-err.txt", "wb")
 
-    start_time = time.time()
-    child = subprocess.Popen(  # pylint: disable=subprocess-popen-preexec-fn
+    start_time = time.monotonic()
+    child = _Popen(  # pylint: disable=subprocess-popen-preexec-fn
         cmd_with_args,
         env=env,
-        stderr=child_stderr,
-        stdout=child_stdout,
+        stdin=subprocess.PIPE if inp is not None else None,
+        # when streaming, output is copied to the log files as it is read
+        stderr=child_stderr if stop_on is None else subprocess.PIPE,
+        stdout=child_stdout if stop_on is None else subprocess.PIPE,
         preexec_fn=preexec_fn,
     )
     try:
-        stdout, stderr = child.communicate(
-            input=inp,
-            timeout=timeout,
-        )
+        if stop_on is not None:
+            stdout, stderr, sta = _stream_output(
+                child,
+                timeout,
+                stop_on,
+                stop_group if stop_group is not None else StopGroup(),
+                child_stdout if log_prefix is not None else io.BytesIO(),
+                child_stderr if log_prefix is not None else io.BytesIO(),
+                inp=inp,
+            )
+        else:
+            if stop_group is not None:
+                stop_group.add(child)
+            stdout, stderr = child.communicate(
+                input=inp,
+                timeout=timeout,
+            )
+            if stop_group is not None and stop_group.stopped(child):
+                sta = STOPPED
     except subprocess.TimeoutExpired:
         child.kill()
         stdout, stderr = child.communicate()
@@ -135,38 +1109,365 @@ def timed_run(
         if log_prefix is not None:
             child_stdout.close()
             child_stderr.close()
-    elapsed_time = time.time() - start_time
+    elapsed_time = time.monotonic() - start_time
 
-    if sta == TIMED_OUT:
-        msg = "TIMED OUT"
-    elif child.returncode == 0:
-        msg = "NORMAL"
-        sta = NORMAL
-    elif 0 < child.returncode < 0x80000000:
-        msg = "ABNORMAL exit code " + str(child.returncode)
-        sta = ABNORMAL
+    _LAST_RUN.run_data = _run_data(
+        sta,
+        child,
+        child.rusage,
+        elapsed_time,
+        log_prefix,
+        stdout,
+        stderr,
+        cpu_limit,
+    )
+    return _LAST_RUN.run_data
+
+
+def last_run_async():
+    """Get the result of the most recent `timed_run_async` call in the current asyncio
+    task.
+
+    Returns:
+        RunData or None: The last run, or None if nothing was run in this task.
+    """
+    task = _current_task()
+    if task is None:
+        return None
+    return _ASYNC_LAST_RUN.get(task)
+
+
+def _current_task():
+    # asyncio.current_task() was added in Python 3.7
+    if hasattr(asyncio, "current_task"):
+        try:
+            return asyncio.current_task()
+        except RuntimeError:
+            return None
+    return asyncio.Task.current_task()
+
+
+def _set_last_run_async(run_data):
+    task = _current_task()
+    if task is not None:
+        _ASYNC_LAST_RUN[task] = run_data
+
+
+async def gather_async(*runs):
+    """Await `timed_run_async()` calls concurrently, like `asyncio.gather()`.
+
+    `asyncio.gather()` runs each call in a task of its own, so their results aren't
+    available from `last_run_async()` in the calling task. Here the result of the
+    last call is, as if the calls had been awaited one after the other.
+
+    Args:
+        *runs (coroutine): `timed_run_async()` calls.
+
+    Returns:
+        list(RunData): The results of the calls.
+    """
+    results = await asyncio.gather(*runs)
+    if results:
+        _set_last_run_async(results[-1])
+    return results
+
+
+class _AsyncPopen:
+    """`_Popen` with its pipes connected to the event loop, used like an
+    `asyncio.subprocess.Process`. Unlike asyncio's own subprocesses, it is reaped
+    with `os.wait4()`, so its resource usage is recorded.
+    """
+
+    def __init__(self, popen):
+        self.popen = popen
+        self.pid = popen.pid
+        self.stdin = None
+        self.stdout = None
+        self.stderr = None
+        self._pidfd = None
+        # pidfds (Linux 5.3+) become readable when the process exits. Open it before
+        # anything can reap the process, so it can't refer to another process.
+        if hasattr(os, "pidfd_open"):
+            try:
+                self._pidfd = getattr(os, "pidfd_open")(popen.pid)
+            except OSError:
+                pass
+
+    @classmethod
+    async def create(cls, cmd_with_args, env, stdin, preexec_fn):
+        """Start a process, with stdout and stderr connected to `StreamReader`s and
+        stdin to a `StreamWriter` (if it is a pipe).
+        """
+        loop = asyncio.get_event_loop()
+        child = cls(
+            _Popen(  # pylint: disable=subprocess-popen-preexec-fn
+                cmd_with_args,
+                env=env,
+                stdin=stdin,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                preexec_fn=preexec_fn,
+            )
+        )
+        try:
+            for name in ("stdout", "stderr"):
+                reader = asyncio.StreamReader()
+                await loop.connect_read_pipe(
+                    lambda reader=reader: asyncio.StreamReaderProtocol(reader),
+                    getattr(child.popen, name),
+                )
+                setattr(child, name, reader)
+            if child.popen.stdin is not None:
+                transport, protocol = await loop.connect_write_pipe(
+                    lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader()),
+                    child.popen.stdin,
+                )
+                child.stdin = asyncio.StreamWriter(transport, protocol, None, loop)
+        except BaseException:
+            child.kill()
+            child.popen.wait()
+            child.close()
+            raise
+        return child
+
+    @property
+    def returncode(self):
+        """Exit status of the process, or None if it hasn't been reaped yet."""
+        return self.popen.returncode
+
+    @property
+    def rusage(self):
+        """Resource usage of the process, or None if it hasn't been reaped yet."""
+        return self.popen.rusage
+
+    def poll(self):
+        """Reap the process if it has exited.
+
+        Returns:
+            int or None: See `returncode`.
+        """
+        return self.popen.poll()
+
+    def kill(self):
+        """Kill the process."""
+        self.popen.kill()
+
+    async def wait(self):
+        """Wait for the process to exit, and reap it.
+
+        Returns:
+            int: See `returncode`.
+        """
+        if self._pidfd is None:
+            delay = 0.0005
+            while self.poll() is None:
+                delay = min(delay * 2, 0.05)
+                await asyncio.sleep(delay)
+            return self.returncode
+        loop = asyncio.get_event_loop()
+        exited = loop.create_future()
+
+        def _exited():
+            if not exited.done():
+                exited.set_result(None)
+
+        loop.add_reader(self._pidfd, _exited)
+        try:
+            await exited
+        finally:
+            loop.remove_reader(self._pidfd)
+        # the process has exited, so this doesn't block
+        self.popen.wait()
+        self.close()
+        return self.returncode
+
+    def close(self):
+        """Close the pidfd used to wait for the process."""
+        if self._pidfd is not None:
+            os.close(self._pidfd)
+            self._pidfd = None
+
+
+async def _copy_stream(stream, name, sink, stop_on, stop_group):
+    """Copy output from an asyncio stream to a file, until it is closed."""
+    while True:
+        data = await stream.read(65536)
+        if not data:
+            return
+        sink.write(data)
+        if stop_on is not None and not stop_group.is_set and stop_on(name, data):
+            stop_group.set()
+
+
+async def _feed_input(child, inp):
+    if inp is None:
+        return
+    try:
+        child.stdin.write(inp)
+        await child.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    child.stdin.close()
+
+
+async def timed_run_async(
+    cmd_with_args,
+    timeout,
+    log_prefix=None,
+    env=None,
+    inp=None,
+    preexec_fn=None,
+    persistent=False,
+    stop_on=None,
+    stop_group=None,
+    memory_limit=None,
+    cpu_limit=None,
+):
+    """Coroutine version of `timed_run()`, using asyncio subprocesses so many commands
+    can be supervised by one event loop, without threads to wait for each of them.
+
+    Arguments and result are the same as for `timed_run()`, except that `stop_group`
+    and `inp` must be given explicitly.
+    Persistent targets are run in the loop's default executor. The result is also
+    available from `last_run_async()` in the calling task (use `gather_async()` to
+    run several commands at once).
+
+    Raises:
+        TypeError: See `timed_run()`.
+        OSError: See `timed_run()`.
+
+    Returns:
+        RunData: A rundata instance containing run information
+    """
+    _check_args(cmd_with_args, timeout, log_prefix, preexec_fn)
+    preexec_fn = _limit_resources(preexec_fn, memory_limit, cpu_limit)
+
+    if persistent:
+        if inp is not None or stop_on is not None:
+            raise TypeError("inp and stop_on are not supported by persistent targets.")
+        if memory_limit is not None or cpu_limit is not None:
+            # the limits would apply to all the tests run by the target together
+            raise TypeError(
+                "memory_limit and cpu_limit are not supported by persistent targets."
+            )
+        run_data = await asyncio.get_event_loop().run_in_executor(
+            None,
+            _persistent_run,
+            cmd_with_args,
+            timeout,
+            log_prefix,
+            env,
+            preexec_fn,
+            # the executor's threads don't have an owner
+            current_owner(),
+        )
     else:
-        # return_code < 0 (or > 0x80000000 in Windows)
-        # The program was terminated by a signal, which usually indicates a crash.
-        # Mac/Linux only!
-        # XXX: this doesn't work on Windows
-        if child.returncode < 0:
-            signum = -child.returncode
-        else:
-            signum = child.returncode
-        msg = "CRASHED signal %d (%s)" % (
-            signum,
-            get_signal_name(signum),
+        run_data = await _run_async(
+            cmd_with_args,
+            timeout,
+            log_prefix,
+            env,
+            inp,
+            preexec_fn,
+            stop_on,
+            stop_group,
+            cpu_limit,
         )
-        sta = CRASHED
+    _set_last_run_async(run_data)
+    return run_data
+
+
+async def _run_async(
+    cmd_with_args,
+    timeout,
+    log_prefix,
+    env,
+    inp,
+    preexec_fn,
+    stop_on,
+    stop_group,
+    cpu_limit,
+):
+    """Run a command in an asyncio subprocess (see `timed_run_async()`)."""
+    if stop_on is not None and stop_group is None:
+        stop_group = StopGroup()
+
+    sta = NONE
+    if log_prefix is not None:
+        out_sink = open(log_prefix + "-out.txt", "wb")
+        err_sink = open(log_prefix + "-err.txt", "wb")
+    else:
+        out_sink = io.BytesIO()
+        err_sink = io.BytesIO()
+
+    start_time = time.monotonic()
+    child = None
+    try:
+        try:
+            if hasattr(os, "wait4"):
+                child = await _AsyncPopen.create(
+                    cmd_with_args,
+                    env,
+                    subprocess.PIPE if inp is not None else None,
+                    preexec_fn,
+                )
+            else:
+                # resource usage isn't available (Windows)
+                child = await asyncio.create_subprocess_exec(
+                    *cmd_with_args,
+                    env=env,
+                    stdin=subprocess.PIPE if inp is not None else None,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    preexec_fn=preexec_fn
+                )
+        except OSError as exc:
+            print("Tried to run:")
+            print("  %r" % cmd_with_args)
+            print("but got this error:")
+            print("  %s" % exc)
+            sys.exit(2)
+        if stop_group is not None:
+            stop_group.add(child)
+        copiers = [
+            _copy_stream(child.stdout, "out", out_sink, stop_on, stop_group),
+            _copy_stream(child.stderr, "err", err_sink, stop_on, stop_group),
+        ]
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(_feed_input(child, inp), child.wait(), *copiers),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            child.kill()
+            # keep the output produced before the timeout
+            await asyncio.gather(
+                child.wait(),
+                _copy_stream(child.stdout, "out", out_sink, None, None),
+                _copy_stream(child.stderr, "err", err_sink, None, None),
+            )
+            sta = TIMED_OUT
+        if sta != TIMED_OUT and stop_group is not None and stop_group.stopped(child):
+            sta = STOPPED
+    finally:
+        if isinstance(child, _AsyncPopen):
+            child.close()
+        if log_prefix is not None:
+            out_sink.close()
+            err_sink.close()
+    elapsed_time = time.monotonic() - start_time
 
-    return RunData(
+    stdout = stderr = None
+    if log_prefix is None:
+        stdout = out_sink.getvalue()
+        stderr = err_sink.getvalue()
+    return _run_data(
         sta,
-        child.returncode if sta != TIMED_OUT else None,
-        msg,
+        child,
+        getattr(child, "rusage", None),
         elapsed_time,
-        sta == TIMED_OUT,
-        log_prefix + "-out.txt" if log_prefix is not None else stdout,
-        log_prefix + "-err.txt" if log_prefix is not None else stderr,
-        child.pid,
+        log_prefix,
+        stdout,
+        stderr,
+        cpu_limit,
     )
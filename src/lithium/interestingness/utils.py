@@ -13,8 +13,15 @@ import logging
 import os
 import re
 import sys
+import threading
 from pathlib import Path
 
+from . import timed_run
+
+# held while `rel_or_abs_import()` adds a directory to `sys.path`. Reentrant, since a
+# module imported this way may import others the same way.
+_IMPORT_LOCK = threading.RLock()
+
 
 def file_contains_str(input_file, regex, verbose=True):
     """Helper function to check if file contains a given string
@@ -75,6 +82,145 @@ def file_contains_regex(input_file, regex, verbose=True):
     return found, matched_str
 
 
+class OutputMatcher:
+    """Search output for a string or regular expression as it is produced, for use
+    as `timed_run(stop_on=...)`.
+
+    Each stream is searched separately. Regular expressions are only searched for in
+    the last `REGEX_WINDOW` bytes of each stream (plus the data most recently fed), so
+    a match longer than that may only be found once the process exits, by
+    `file_contains_regex`.
+    """
+
+    REGEX_WINDOW = 65536
+
+    def __init__(self, pattern, regex=False):
+        """Initialize an output matcher.
+
+        Args:
+            pattern (bytes): String or regular expression to look for
+            regex (bool or re.Pattern): Treat `pattern` as a regular expression. A
+                                        compiled pattern is used as is.
+        """
+        self.pattern = pattern
+        if hasattr(regex, "search"):
+            self._regex = regex
+        else:
+            self._regex = re.compile(pattern, flags=re.MULTILINE) if regex else None
+        # unsearched data carried over from the previous chunk of each stream
+        self._tails = {}
+
+    def feed(self, stream, data):
+        """Search the next chunk of output from a stream.
+
+        Args:
+            stream (str): Name of the stream (eg. "out" or "err")
+            data (bytes): Output produced since the last call for this stream
+
+        Returns:
+            bool: True if the pattern has been found in this stream
+        """
+        # The tail starts one byte before the data still to be searched, so that
+        # "^" only matches there if that byte is a newline.
+        tail = self._tails.get(stream, b"\n")
+        buf = tail + data
+        if self._regex is None:
+            if buf.find(self.pattern, 1) != -1:
+                return True
+            keep = max(len(self.pattern) - 1, 0)
+        else:
+            if self._regex.search(buf, 1):
+                return True
+            keep = self.REGEX_WINDOW
+        self._tails[stream] = buf[len(buf) - min(keep, len(buf) - 1) - 1 :]
+        return False
+
+
+class PreparedState:
+    """State which an interestingness test prepares once from its arguments (eg. by
+    parsing them), and reuses for every call with the same arguments.
+
+    Create one at module level, use `init()` as the module's `init()` to prepare the
+    state before the first test (`init = _ARGS.init`), call `get()` from
+    `interesting()` to reuse it, and use `cleanup()` as the module's `cleanup()`, or
+    call `clear()` from it. Arguments which weren't given to `init()` (eg. with the
+    path of a copy of the testcase used by a job) are prepared on first use.
+
+    State is kept separately for each owner (see `timed_run.owned_by()`), so
+    reductions running in the same process don't share or clear each other's state.
+    """
+
+    def __init__(self, prepare):
+        """Initialize prepared state.
+
+        Args:
+            prepare (callable): Called with the list of arguments to prepare the
+                                state for them.
+        """
+        self._prepare = prepare
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def get(self, cli_args):
+        """Get the state for a set of arguments, preparing it on first use.
+
+        Args:
+            cli_args (list): List of input arguments.
+
+        Returns:
+            object: The result of `prepare(cli_args)`.
+        """
+        key = (timed_run.current_owner(), tuple(cli_args))
+        try:
+            return self._states[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._states:
+                self._states[key] = self._prepare(list(cli_args))
+            return self._states[key]
+
+    def clear(self, cli_args):
+        """Forget the state prepared for a set of arguments. If there is a current
+        owner, the state it prepared for other arguments (eg. for the copies of the
+        testcase used by jobs) is also forgotten.
+
+        Args:
+            cli_args (list): List of input arguments.
+
+        Returns:
+            list: The states which were prepared.
+        """
+        owner = timed_run.current_owner()
+        key = (owner, tuple(cli_args))
+        with self._lock:
+            keys = [
+                other
+                for other in self._states
+                if other == key or (owner is not None and other[0] == owner)
+            ]
+            return [self._states.pop(other) for other in keys]
+
+    def init(self, cli_args):
+        """Prepare the state for a set of arguments, before the first test.
+
+        Args:
+            cli_args (list): List of input arguments.
+        """
+        self.get(cli_args)
+
+    def cleanup(self, cli_args):
+        """Forget the state prepared for a set of arguments (see `clear()`), and stop
+        the persistent targets and report the time saved by the adaptive timeouts of
+        the current owner (see `timed_run.cleanup()`).
+
+        Args:
+            cli_args (list): List of input arguments.
+        """
+        self.clear(cli_args)
+        timed_run.cleanup()
+
+
 def rel_or_abs_import(module):
     """Import a module from anywhere.
     If a full path to module is given, try to import from there.
@@ -99,21 +245,24 @@ def rel_or_abs_import(module):
         path, module = os.path.split(path)
     if module.endswith(".py"):
         module = module[:-3]
-    if path:
-        # full path given, try that
-        sys.path.append(os.path.realpath(path))
-    else:
-        sys.path.append(os.path.realpath("."))
-    try:
-        return importlib.import_module(module)
-    except ImportError:
-        # only raise if path was given, otherwise we also try under 'interestingness'
+    # `sys.path` is shared by every thread, eg. the reductions run by lithium-batch
+    with _IMPORT_LOCK:
         if path:
-            log.error("Failed to import: %s", orig_arg)
-            log.error("From: %s", __file__)
-            raise
-    finally:
-        sys.path.pop()
+            # full path given, try that
+            sys.path.append(os.path.realpath(path))
+        else:
+            sys.path.append(os.path.realpath("."))
+        try:
+            return importlib.import_module(module)
+        except ImportError:
+            # only raise if path was given, otherwise we also try under
+            # 'interestingness'
+            if path:
+                log.error("Failed to import: %s", orig_arg)
+                log.error("From: %s", __file__)
+                raise
+        finally:
+            sys.path.pop()
     # if we have not returned or raised by now, the import was unsuccessful and module
     # was a name only also try to import from 'interestingness'
     try:
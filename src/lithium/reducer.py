@@ -5,21 +5,52 @@
 """lithium reducer"""
 
 import argparse
+import asyncio
+import contextlib
+import itertools
 import logging
 import os
+import pickle
+import queue
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pkg_resources
 
+from .artifacts import Artifacts, ArtifactStore, RetentionPolicy
+from .delivery import DELIVERY, StdinDelivery, open_delivery
+from .filters import FILTERS, PythonValidator
+from .interestingness import timed_run
 from .interestingness.utils import rel_or_abs_import
+from .remote import RemoteWorker, connect_workers, parse_address, read_token
 from .strategies import DEFAULT as DEFAULT_STRATEGY
+from .strategies import Cascade, CheckOnly, Minimize, Pipeline
+from .testcases import CASCADE
 from .testcases import DEFAULT as DEFAULT_TESTCASE
+from .testcases import TestcaseLine
 from .util import LithiumError, quantity, summary_header
+from .verdicts import VerdictCache
 
 LOG = logging.getLogger(__name__)
 
 
+def _retention_policy(spec):
+    try:
+        return RetentionPolicy.parse(spec)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc))
+
+
+def _worker_address(spec):
+    try:
+        return parse_address(spec)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc))
+
+
 class Lithium:
     """Lithium reduction object."""
 
@@ -29,6 +60,8 @@ class Lithium:
 
         self.condition_script = None
         self.condition_args = None
+        # condition module as given on the command line, for remote workers
+        self.condition_name = None
 
         self.test_count = 0
         self.test_total = 0
@@ -40,6 +73,42 @@ class Lithium:
 
         self.temp_file_count = 1
 
+        self.jobs = 1
+        self._pool = None
+        self._pending = {}
+        self._slots = None
+        self._job_count = itertools.count(1)
+        # addresses of workers to run the condition script on (see remote.py)
+        self.remote = []
+        # token shared with the workers (see `remote.read_token()`)
+        self.remote_token = None
+        self._workers = []
+        # how attempts are given to the condition script (see delivery.py)
+        self.deliver = "file"
+        self._delivery = None
+        # event loop running `interesting_async()` of the condition script for all jobs
+        self._loop = None
+        self._loop_thread = None
+
+        self.verdict_cache = None
+
+        # cheap checks run before the condition script (see filters.py)
+        self.filters = []
+        self.filtered_count = 0
+
+        self.checkpoint_interval = None
+        self._last_checkpoint = None
+        self._reduction = None
+        self._resume = None
+
+        self.retention = None
+        self.artifact_store = False
+        self._artifacts = None
+
+        # semaphore limiting how many condition scripts run at once, shared with other
+        # reductions (see batch.py)
+        self.worker_slots = None
+
     def main(self, argv=None):
         """Main entrypoint (parse args and call `run()`)
 
@@ -54,19 +123,34 @@ class Lithium:
         try:
             return self.run()
 
-        except LithiumError:
+        except LithiumError as exc:
             summary_header()
-            LOG.exception()
+            LOG.error("%s", exc)
             return 1
 
+        finally:
+            if self.verdict_cache is not None:
+                self.verdict_cache.close()
+
     def run(self):
         """Reduction Loop
 
         Returns:
             int: 0 for successful reduction
         """
+        # persistent targets and adaptive timeouts are kept for this reduction, since
+        # other reductions may run in the same process (see batch.py)
+        with timed_run.owned_by(self):
+            return self._run()
+
+    def _run(self):
         if hasattr(self.condition_script, "init"):
             self.condition_script.init(self.condition_args)
+        if self.worker_slots is None:
+            # resource totals are shared by all reductions in a batch
+            timed_run.resource_totals(reset=True)
+        for test_filter in self.filters:
+            test_filter.start(self.testcase)
 
         try:
             if self.temp_dir is None:
@@ -75,16 +159,85 @@ class Lithium:
                     "Intermediate files will be stored in %s%s.", self.temp_dir, os.sep
                 )
 
+            store = None
+            if self.artifact_store:
+                store = ArtifactStore(self.temp_dir / "artifacts")
+            self._artifacts = Artifacts(self.retention, store)
+            self._delivery = open_delivery(self.deliver, self.testcase.filename)
+
+            kwds = {}
+            if self.remote:
+                # each worker slot is used like a job
+                self._workers = connect_workers(self.remote, self.remote_token)
+                self.jobs = len(self._workers)
+            if self.jobs > 1 or self._workers:
+                self._pool = ThreadPoolExecutor(max_workers=self.jobs)
+                self._slots = queue.Queue()
+                for slot in self._workers or range(1, self.jobs + 1):
+                    self._slots.put(slot)
+                kwds["speculate"] = self.speculate
+                # subprocesses can only be run from a loop in another thread with
+                # the child watchers used by default since Python 3.8
+                # stdin is given to commands in the thread running the condition
+                if (
+                    not self._workers
+                    and self.deliver != StdinDelivery.name
+                    and sys.version_info >= (3, 8)
+                    and hasattr(self.condition_script, "interesting_async")
+                ):
+                    self._start_loop()
+            if self.checkpoint_interval:
+                self._last_checkpoint = time.time()
+                kwds["checkpoint"] = self.checkpoint
+            if self._resume is not None:
+                kwds["resume"] = self._resume
+
             result = self.strategy.main(
-                self.testcase, self.interesting, self.testcase_temp_filename
+                self.testcase, self.interesting, self.testcase_temp_filename, **kwds
             )
+            # there is nothing left to resume
+            self._remove_checkpoint()
+            self._reduction = None
 
             LOG.info("  Tests performed: %d", self.test_count)
             LOG.info("  Test total: %s", quantity(self.test_total, self.testcase.atom))
+            if self.verdict_cache is not None:
+                LOG.info("  Cached verdicts used: %d", self.verdict_cache.hits)
+            if self.filters:
+                LOG.info("  Attempts rejected by filters: %d", self.filtered_count)
+            if self.worker_slots is None:
+                self.log_resource_totals()
 
             return result
 
         finally:
+            if self._pool is not None:
+                for future in self._pending.values():
+                    future.cancel()
+                self._pending.clear()
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+            if self._loop is not None:
+                self._stop_loop()
+
+            for worker in self._workers:
+                worker.close()
+            self._workers = []
+
+            if self._reduction is not None:
+                # the reduction was interrupted
+                LOG.info("Reduction state saved to %s", self.save_checkpoint())
+                self._reduction = None
+
+            if self._artifacts is not None:
+                self._artifacts.close()
+                self._artifacts = None
+
+            if self._delivery is not None:
+                self._delivery.close()
+                self._delivery = None
+
             if hasattr(self.condition_script, "cleanup"):
                 self.condition_script.cleanup(self.condition_args)
 
@@ -168,35 +321,189 @@ class Lithium:
         )
 
         # Try to parse --strategy and testcase_type before anything else
-        early_parser.add_argument(
-            "--strategy", default=DEFAULT_STRATEGY, choices=strategies.keys()
-        )
+        early_parser.add_argument("--strategy", choices=strategies.keys())
+        early_parser.add_argument("--pipeline")
+        early_parser.add_argument("--cascade", action="store_true")
         args = early_parser.parse_known_args(argv)
         atom = args[0].atom if args else DEFAULT_TESTCASE
-        self.strategy = strategies.get(
-            args[0].strategy if args else None, strategies[DEFAULT_STRATEGY]
-        )()
+        stages = None
+        if args and args[0].pipeline is not None:
+            if args[0].pipeline == "all":
+                stages = [DEFAULT_STRATEGY] + sorted(
+                    set(strategies) - {DEFAULT_STRATEGY, CheckOnly.name}
+                )
+            else:
+                stages = [name.strip() for name in args[0].pipeline.split(",")]
+            unknown = [name for name in stages if name not in strategies]
+            if unknown:
+                parser.error(
+                    "unknown --pipeline strateg%s: %s (choose from %s)"
+                    % (
+                        "ies" if len(unknown) > 1 else "y",
+                        ", ".join(unknown),
+                        ", ".join(sorted(strategies)),
+                    )
+                )
+            if args[0].strategy is not None:
+                parser.error("--strategy and --pipeline can't be used together")
+            self.strategy = Pipeline([strategies[name]() for name in stages])
+        else:
+            self.strategy = strategies.get(
+                args[0].strategy if args else None, strategies[DEFAULT_STRATEGY]
+            )()
+        cascade = [atom]
+        if args and args[0].cascade:
+            if atom not in CASCADE:
+                parser.error(
+                    "--cascade can't be used with %s" % (testcase_types[atom].args[-1],)
+                )
+            cascade = list(CASCADE[CASCADE.index(atom) :])
+            self.strategy = Cascade(
+                self.strategy, [testcase_types[level] for level in cascade[1:]]
+            )
 
         grp_opt.add_argument(
             "--testcase", help="testcase file. default: last argument is used."
         )
+        grp_opt.add_argument(
+            "--mmap",
+            action="store_true",
+            help="map the testcase into memory instead of reading it, so only the "
+            "parts which are used are loaded. The testcase must not be modified in "
+            "place during reduction (eg. by the condition script): that kills "
+            "Lithium with SIGBUS.",
+        )
         grp_opt.add_argument(
             "--tempdir",
             help="specify the directory to use as temporary directory.",
             type=Path,
         )
+        grp_opt.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="number of reduction attempts to evaluate concurrently. Each job "
+            "runs the condition on its own copy of the testcase. default: 1",
+        )
+        grp_opt.add_argument(
+            "--remote",
+            action="append",
+            default=[],
+            type=_worker_address,
+            metavar="ADDRESS",
+            help="run the condition script on a worker started with lithium-worker, "
+            "at host:port or a Unix socket path. Every slot of the worker is used "
+            "like --jobs. Can be given more than once.",
+        )
+        grp_opt.add_argument(
+            "--remote-token-file",
+            type=Path,
+            metavar="FILE",
+            help="file containing the token given to the --remote workers with "
+            "lithium-worker --token-file.",
+        )
+        grp_opt.add_argument(
+            "--deliver",
+            choices=DELIVERY,
+            default="file",
+            help="how to give each attempt to the condition script. 'file' rewrites "
+            "the testcase. The others leave it alone until reduction is finished, "
+            "and replace it in the condition args: 'stdin' with /dev/stdin, giving "
+            "the attempt as stdin to the commands run by the condition (with "
+            "timed_run), 'memfd' with an in-memory file, or 'tmpfs' with a copy in "
+            "/dev/shm for each job. default: %(default)s",
+        )
+        grp_opt.add_argument(
+            "--verdict-cache",
+            type=Path,
+            help="file to store interestingness results in, so they can be reused by "
+            "later runs with the same condition and args.",
+        )
+        grp_opt.add_argument(
+            "--verdict-cache-size",
+            type=int,
+            default=100000,
+            help="maximum number of results to keep in --verdict-cache. "
+            "default: %(default)s",
+        )
+        grp_opt.add_argument(
+            "--checkpoint-interval",
+            type=int,
+            default=300,
+            help="save the reduction state to the temporary directory every n "
+            "seconds, and when the reduction is interrupted, so it can be continued "
+            "with --resume. The state is removed once the reduction is finished. 0 "
+            "to disable. default: %(default)s",
+        )
+        grp_opt.add_argument(
+            "--resume",
+            type=Path,
+            help="continue the reduction saved in the given temporary directory (or "
+            "checkpoint file). Use the same strategy and condition as the original "
+            "run.",
+        )
+        grp_opt.add_argument(
+            "--keep-artifacts",
+            type=_retention_policy,
+            default=RetentionPolicy(),
+            metavar="POLICY",
+            help="which tested testcases to keep in the temporary directory: all, "
+            "none, interesting, last:K (the K most recent) or every:N (every Nth "
+            "test). default: %(default)s",
+        )
+        grp_opt.add_argument(
+            "--artifact-store",
+            action="store_true",
+            help="keep tested testcases compressed in the artifacts directory of the "
+            "temporary directory, storing identical testcases only once.",
+        )
+        grp_opt.add_argument(
+            "--filter",
+            action="append",
+            default=[],
+            choices=sorted(FILTERS),
+            dest="filters",
+            help="reject reduction attempts without running the condition if they "
+            "fail a built-in check. 'balanced' requires the same balance of (), [] "
+            "and {} as the original testcase. Can be given more than once.",
+        )
+        grp_opt.add_argument(
+            "--validator",
+            action="append",
+            default=[],
+            metavar="MODULE",
+            help="reject reduction attempts without running the condition if the "
+            "function validate(data) in this Python module returns False. Can be "
+            "given more than once.",
+        )
+        grp_opt.add_argument(
+            "--cascade",
+            action="store_true",
+            help="after reducing the testcase, split it into smaller atoms and "
+            "reduce it again, until it is reduced by chars (lines, then symbols, "
+            "then chars). Testcase type options such as --cut-before apply.",
+        )
         grp_opt.add_argument(
             "-v", "--verbose", action="store_true", help="enable verbose debug logging"
         )
-        # this has already been parsed above, it's only here for the help message
+        # these have already been parsed above, they're only here for the help message
         grp_opt.add_argument(
             "--strategy",
             default=self.strategy.name,
             choices=strategies.keys(),
             help="reduction strategy to use. default: %s" % DEFAULT_STRATEGY,
         )
+        grp_opt.add_argument(
+            "--pipeline",
+            metavar="STRATEGY,...",
+            help="run several reduction strategies in turn (eg. "
+            "minimize,minimize-balanced), repeating them until none of them makes "
+            "progress. Testcases tried by one strategy are not tried again. 'all' "
+            "uses every reduction strategy (see also --schedule).",
+        )
         self.strategy.add_args(parser)
-        testcase_types[atom].add_arguments(parser)
+        for level in cascade:
+            testcase_types[level].add_arguments(parser)
         grp_ext = parser.add_argument_group(
             description="Condition, condition options and file-to-reduce"
         )
@@ -213,6 +520,19 @@ class Lithium:
         self.strategy.process_args(parser, args)
 
         self.temp_dir = args.tempdir
+        self.filters = [FILTERS[name]() for name in args.filters]
+        self.filters.extend(PythonValidator(module) for module in args.validator)
+        self.retention = args.keep_artifacts
+        self.artifact_store = args.artifact_store
+        if args.jobs < 1:
+            parser.error("--jobs must be at least 1")
+        self.jobs = args.jobs
+        if args.verdict_cache_size < 1:
+            parser.error("--verdict-cache-size must be at least 1")
+        if args.verdict_cache is not None:
+            self.verdict_cache = VerdictCache(
+                args.verdict_cache, args.verdict_cache_size
+            )
 
         extra_args = args.extra_args[0]
 
@@ -227,10 +547,40 @@ class Lithium:
         LOG.info("Testcase type: %s", atom)
         self.testcase = testcase_types[atom]()
         self.testcase.handle_args(args)
-        self.testcase.load(testcase_filename)
+        self.testcase.load(testcase_filename, map_file=args.mmap)
+
+        self.checkpoint_interval = args.checkpoint_interval
+        if args.resume is not None:
+            try:
+                self.load_checkpoint(args.resume)
+            except (LithiumError, OSError) as exc:
+                parser.error("Can't resume from %s: %s" % (args.resume, exc))
 
         self.condition_script = rel_or_abs_import(extra_args[0])
+        self.condition_name = extra_args[0]
         self.condition_args = extra_args[1:]
+        self.remote = args.remote
+        if args.remote_token_file is not None:
+            try:
+                self.remote_token = read_token(args.remote_token_file)
+            except (OSError, ValueError) as exc:
+                parser.error("Can't read --remote-token-file: %s" % (exc,))
+        self.deliver = args.deliver
+
+        if self.deliver != "file" and self.remote:
+            parser.error("--deliver can't be used with --remote")
+        if self.remote:
+            needs_path = "--remote"
+        elif self.deliver != "file":
+            # with stdin, attempts don't need a path
+            needs_path = None if self.deliver == StdinDelivery.name else "--deliver"
+        else:
+            needs_path = "--jobs" if self.jobs > 1 else None
+        if needs_path is not None and not self._testcase_args():
+            parser.error(
+                "%s requires the testcase to be passed to the condition script"
+                % (needs_path,)
+            )
 
     def testcase_temp_filename(self, filename_stem, use_number=True):
         """Create a temporary filename for the next testcase.
@@ -247,6 +597,86 @@ class Lithium:
             self.temp_file_count += 1
         return self.temp_dir / (filename_stem + self.testcase.extension)
 
+    def checkpoint(self, reduction):
+        """Periodically save the state of a reduction in progress
+        (see `--checkpoint-interval`).
+
+        Args:
+            reduction (ReductionIterator): The reduction in progress.
+        """
+        self._reduction = reduction
+        if time.time() - self._last_checkpoint >= self.checkpoint_interval:
+            self.save_checkpoint()
+
+    def save_checkpoint(self):
+        """Save the state of the current reduction to the temporary directory.
+
+        Returns:
+            Path: Location of the checkpoint file.
+        """
+        testcase = self._reduction.testcase
+        state = {
+            "strategy": self.strategy.name,
+            "atom": testcase.atom,
+            "reduction": self._reduction.snapshot(),
+            "test_count": self.test_count,
+            "test_total": self.test_total,
+            "temp_file_count": self.temp_file_count,
+            "testcase": testcase.snapshot(),
+        }
+        path = self.temp_dir / "checkpoint.pickle"
+        tmp_path = self.temp_dir / "checkpoint.pickle.tmp"
+        with tmp_path.open("wb") as fileobj:
+            pickle.dump(state, fileobj, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(str(tmp_path), str(path))
+        self._last_checkpoint = time.time()
+        LOG.debug("Saved checkpoint to %s", path)
+        return path
+
+    def _remove_checkpoint(self):
+        """Remove the checkpoint saved by `save_checkpoint()`, if any."""
+        if self.temp_dir is not None:
+            try:
+                (self.temp_dir / "checkpoint.pickle").unlink()
+            except FileNotFoundError:
+                pass
+
+    def load_checkpoint(self, path):
+        """Restore the state saved by `save_checkpoint()`. The testcase must already
+        be loaded, and the checkpoint contents replace it.
+
+        Args:
+            path (Path): Checkpoint file, or the temporary directory containing it.
+
+        Raises:
+            LithiumError: The checkpoint doesn't match the current arguments.
+        """
+        path = Path(path)
+        if path.is_dir():
+            path = path / "checkpoint.pickle"
+        with path.open("rb") as fileobj:
+            state = pickle.load(fileobj)
+        if state["strategy"] != self.strategy.name:
+            raise LithiumError(
+                "checkpoint was saved using the %s strategy" % (state["strategy"],)
+            )
+        atoms = {self.testcase.atom}
+        if isinstance(self.strategy, Cascade):
+            # the testcase is split again by each level of the cascade
+            atoms.update(level.atom for level in self.strategy.levels)
+        if state["atom"] not in atoms:
+            raise LithiumError(
+                "checkpoint was saved using the %s testcase type" % (state["atom"],)
+            )
+        self.testcase.restore(state["testcase"])
+        self.test_count = state["test_count"]
+        self.test_total = state["test_total"]
+        self.temp_file_count = state["temp_file_count"]
+        if self.temp_dir is None:
+            self.temp_dir = path.parent
+        self._resume = state["reduction"]
+        LOG.info("Resuming from %s after %s", path, quantity(self.test_count, "test"))
+
     def create_temp_dir(self):
         """Create and switch to the next available temporary working folder. """
         i = 1
@@ -262,11 +692,211 @@ class Lithium:
                 self.temp_dir = temp_dir
                 break
 
+    def _testcase_args(self):
+        """Find the testcase filename in the condition args.
+
+        Returns:
+            list(int): Indexes of the condition args which refer to the testcase.
+        """
+        testcase_path = os.path.abspath(self.testcase.filename)
+        return [
+            idx
+            for idx, arg in enumerate(self.condition_args)
+            if os.path.abspath(arg) == testcase_path
+        ]
+
+    def _job_args(self, path):
+        """Substitute the testcase filename in the condition args.
+
+        Args:
+            path (str): Filename to use instead of the testcase.
+
+        Returns:
+            list or None: Condition args, or None if the testcase isn't in the args.
+        """
+        indexes = self._testcase_args()
+        if not indexes:
+            return None
+        result = list(self.condition_args)
+        for idx in indexes:
+            result[idx] = path
+        return result
+
+    @staticmethod
+    def log_resource_totals():
+        """Summarize the resources used by commands run with `timed_run()`."""
+        totals = timed_run.resource_totals()
+        if not totals:
+            return
+        LOG.info(
+            "  Target runs: %d (%.1f seconds elapsed)",
+            totals["runs"],
+            totals["elapsed"],
+        )
+        if totals.get("measured"):
+            LOG.info(
+                "  Target CPU time: %.1f seconds user, %.1f seconds system",
+                totals["utime"],
+                totals["stime"],
+            )
+            LOG.info(
+                "  Target peak RSS: %d KiB, page faults: %d minor, %d major",
+                totals["maxrss"],
+                totals["minflt"],
+                totals["majflt"],
+            )
+
+    def _start_loop(self):
+        """Start an event loop in a separate thread, to supervise the condition
+        scripts run by all jobs (see `timed_run.timed_run_async()`).
+        """
+        self._loop = asyncio.new_event_loop()
+
+        def _run_loop(loop):
+            with timed_run.owned_by(self):
+                loop.run_forever()
+
+        self._loop_thread = threading.Thread(
+            target=_run_loop, args=(self._loop,), name="lithium-asyncio", daemon=True
+        )
+        self._loop_thread.start()
+        LOG.debug("Running condition script with asyncio")
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
+        self._loop_thread = None
+
+    async def _interesting_async(self, condition_args, temp_prefix):
+        inter = await self.condition_script.interesting_async(
+            condition_args, temp_prefix
+        )
+        return inter, timed_run.last_run_async()
+
+    def _call_condition(self, condition_args, temp_prefix):
+        """Run the condition script.
+
+        Args:
+            condition_args (list(str)): Arguments to the condition script.
+            temp_prefix (str): Prefix for any temporary files created by the condition.
+
+        Returns:
+            tuple(bool, float, str): Whether or not the testcase was interesting,
+                                     the time taken in seconds and the exit status of
+                                     the target (None if no target was run).
+        """
+        # wait for a slot shared with other reductions, if any (see batch.py)
+        with self.worker_slots or contextlib.suppress():
+            start_time = time.monotonic()
+            if self._loop is not None:
+                # each call runs in a new task, so there is no previous run
+                prev_run = None
+                inter, run_data = asyncio.run_coroutine_threadsafe(
+                    self._interesting_async(condition_args, temp_prefix), self._loop
+                ).result()
+            else:
+                prev_run = timed_run.last_run()
+                # jobs run in the threads of `_pool`
+                with timed_run.owned_by(self):
+                    inter = self.condition_script.interesting(
+                        condition_args, temp_prefix
+                    )
+                run_data = timed_run.last_run()
+            elapsed_time = time.monotonic() - start_time
+        if run_data is None or run_data is prev_run:
+            return inter, elapsed_time, None
+        return inter, elapsed_time, run_data.msg
+
+    def _run_job(self, testcase_suggestion):
+        """Run the condition script against a copy of the testcase in a job slot.
+
+        Args:
+            testcase_suggestion (Testcase): Testcase to check.
+
+        Returns:
+            tuple(bool, float, str): See `_call_condition()`.
+        """
+        slot = self._slots.get()
+        try:
+            if isinstance(slot, RemoteWorker):
+                return slot.run(
+                    self.condition_name,
+                    self.condition_args,
+                    self._testcase_args(),
+                    os.path.basename(self.testcase.filename),
+                    testcase_suggestion.to_bytes(),
+                )
+            job_dir = self.temp_dir / ("job%d" % (slot,))
+            if not job_dir.is_dir():
+                job_dir.mkdir()
+            temp_prefix = str(job_dir / str(next(self._job_count)))
+            if self._delivery is not None:
+                return self._call_delivered(testcase_suggestion, slot, temp_prefix)
+            path = job_dir / os.path.basename(self.testcase.filename)
+            testcase_suggestion.dump(path)
+            return self._call_condition(self._job_args(str(path)), temp_prefix)
+        finally:
+            self._slots.put(slot)
+
+    def _call_delivered(self, testcase_suggestion, slot, temp_prefix):
+        """Run the condition script against a testcase given using `--deliver`.
+
+        Args:
+            testcase_suggestion (Testcase): Testcase to check.
+            slot (int): Job slot running the condition script.
+            temp_prefix (str): Prefix for any temporary files created by the condition.
+
+        Returns:
+            tuple(bool, float, str): See `_call_condition()`.
+        """
+        with self._delivery.deliver(testcase_suggestion.to_bytes(), slot) as path:
+            condition_args = self._job_args(path)
+            if condition_args is None:
+                # the condition doesn't refer to the testcase, eg. with stdin
+                condition_args = self.condition_args
+            return self._call_condition(condition_args, temp_prefix)
+
+    def _cache_key(self, tc_hash):
+        return VerdictCache.key(self.condition_script, self.condition_args, tc_hash)
+
+    def speculate(self, attempts):
+        """Start evaluating upcoming testcase suggestions in the background
+        (see `--jobs`). Any result which is still pending and not among the next
+        `jobs` attempts is cancelled.
+
+        Args:
+            attempts (iterable(Testcase)): Suggestions about to be passed to
+                                           `interesting()`, in order.
+        """
+        pending = {}
+        for attempt in itertools.islice(attempts, self.jobs):
+            tc_hash = attempt.hexdigest()
+            if tc_hash in pending or self._rejected_by(attempt) is not None:
+                continue
+            if (
+                self.verdict_cache is not None
+                and self._cache_key(tc_hash) in self.verdict_cache
+            ):
+                continue
+            future = self._pending.pop(tc_hash, None)
+            if future is None:
+                future = self._pool.submit(self._run_job, attempt)
+            pending[tc_hash] = future
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = pending
+
     # If the file is still interesting after the change, changes "parts" and returns
     # True.
     def interesting(self, testcase_suggestion, write_it=True):
         """Test whether a testcase suggestion is interesting.
 
+        Attempts rejected by a filter are uninteresting. If a verdict cache is in
+        use, the result is looked up there next. The original testcase
+        (`write_it=False`) is always tested.
+
         Args:
             testcase_suggestion (Testcase): Testcase to check.
             write_it (bool): Update the original file on disk to the suggestion before
@@ -276,28 +906,138 @@ class Lithium:
             bool: Whether or not the testcase was interesting.
         """
         if write_it:
-            testcase_suggestion.dump()
+            rejected_by = self._rejected_by(testcase_suggestion)
+            if rejected_by is not None:
+                self.filtered_count += 1
+                LOG.info("Rejected by filter: %s", rejected_by)
+                return False
 
-        self.test_count += 1
-        self.test_total += len(testcase_suggestion)
+        tc_hash = None
+        cache_key = None
+        if (self._pool is not None or self.verdict_cache is not None) and write_it:
+            tc_hash = testcase_suggestion.hexdigest()
+        if self.verdict_cache is not None and write_it:
+            cache_key = self._cache_key(tc_hash)
+            verdict = self.verdict_cache.get(cache_key)
+            if verdict is not None:
+                LOG.info(
+                    "Using cached result: %sinteresting",
+                    "" if verdict.interesting else "un",
+                )
+                if verdict.interesting:
+                    self._update_best(testcase_suggestion)
+                return verdict.interesting
 
-        temp_prefix = str(self.temp_dir / str(self.temp_file_count))
+        if self._pool is not None and (write_it or self._workers):
+            # evaluate in a job slot, the original file is only written with the
+            # final result. With remote workers, the original testcase is also
+            # tested remotely.
+            future = self._pending.pop(tc_hash, None)
+            if future is None:
+                future = self._pool.submit(self._run_job, testcase_suggestion)
+            inter, elapsed_time, status = future.result()
+        else:
+            temp_prefix = str(self.temp_dir / str(self.temp_file_count))
 
-        inter = self.condition_script.interesting(self.condition_args, temp_prefix)
+            if self._delivery is not None:
+                inter, elapsed_time, status = self._call_delivered(
+                    testcase_suggestion, 0, temp_prefix
+                )
+            else:
+                if write_it:
+                    testcase_suggestion.dump()
+
+                inter, elapsed_time, status = self._call_condition(
+                    self.condition_args, temp_prefix
+                )
+
+        self.test_count += 1
+        self.test_total += len(testcase_suggestion)
+        if cache_key is not None:
+            self.verdict_cache.put(cache_key, inter, elapsed_time, status)
 
         # Save an extra copy of the file inside the temp directory.
         # This is useful if you're reducing an assertion and encounter a crash:
         # it gives you a way to try to reproduce the crash.
         if self.temp_dir:
             temp_file_tag = "interesting" if inter else "boring"
-            testcase_suggestion.dump(self.testcase_temp_filename(temp_file_tag))
+            path = self.testcase_temp_filename(temp_file_tag)
+            if self._artifacts is not None:
+                self._artifacts.save(testcase_suggestion, path, inter)
+            else:
+                testcase_suggestion.dump(path)
 
         if inter:
-            self.testcase = testcase_suggestion
-            self.last_interesting = self.testcase
+            self._update_best(testcase_suggestion)
 
         return inter
 
+    def _rejected_by(self, testcase):
+        """Check a testcase suggestion against the filters.
+
+        Args:
+            testcase (Testcase): Testcase to check.
+
+        Returns:
+            str or None: Name of the first filter which rejects the testcase, if any.
+        """
+        for test_filter in self.filters:
+            if not test_filter.accept(testcase):
+                return test_filter.name
+        return None
+
+    def _update_best(self, testcase):
+        """Record a new interesting testcase.
+
+        Args:
+            testcase (Testcase): Testcase which was found interesting.
+        """
+        self.testcase = testcase
+        self.last_interesting = self.testcase
+        # pending results were based on the previous testcase
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+
+def reduce_bytes(data, predicate, strategy=None, testcase_type=TestcaseLine):
+    """Reduce data in memory, using a Python callable as the interestingness test.
+
+    Nothing is written to disk and no condition script is run, so this is suited to
+    cheap predicates which can evaluate the data directly.
+
+    Args:
+        data (bytes): Testcase contents to reduce.
+        predicate (callable): Interestingness test. This is called with the contents
+                              of each reduction attempt (bytes), and should return
+                              True if the attempt is interesting.
+        strategy (Strategy): Reduction strategy to use (default: `Minimize()`).
+        testcase_type (type): Testcase class used to split the data into parts.
+
+    Returns:
+        bytes: The reduced testcase contents.
+
+    Raises:
+        LithiumError: The original data is not interesting.
+    """
+    if strategy is None:
+        strategy = Minimize()
+    testcase = testcase_type()
+    testcase.split_parts(data)
+    best = [testcase]
+
+    def _interesting(testcase_suggestion, write_it=True):
+        if predicate(testcase_suggestion.to_bytes()):
+            best[0] = testcase_suggestion
+            return True
+        if not write_it:
+            # only the original testcase is checked with `write_it=False`
+            raise LithiumError("The original testcase is not interesting")
+        return False
+
+    strategy.main(testcase, _interesting, None)
+    return best[0].to_bytes()
+
 
 def main():
     """Lithium main entrypoint"""
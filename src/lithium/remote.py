@@ -0,0 +1,443 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Run interestingness tests on other machines.
+
+A worker (`lithium-worker --listen ADDRESS`) accepts connections from Lithium
+(`lithium --remote ADDRESS ...`) over TCP (`host:port`) or a Unix socket (a path
+containing `/`). Each connection runs one test at a time, and Lithium opens as many
+connections to a worker as it has slots, using them like `--jobs`.
+
+A worker runs whatever condition module and commands it is sent, so anyone who can
+connect to it can run code as the worker's user. Unix sockets are only accessible to
+the user running the worker. TCP workers require a shared token (`--token-file`),
+which Lithium proves it knows by answering a challenge, so the token itself is never
+sent. The connection is not encrypted: only use TCP on trusted networks.
+
+Messages are JSON objects, one per line:
+    worker -> Lithium on connect: {"version": 2, "slots": <n>,
+                                   "challenge": <random hex>}
+    Lithium -> worker: {"auth": <hex HMAC-SHA256 of the challenge with the token,
+                                 or null without a token>}
+    worker -> Lithium: {"authenticated": true} or {"error": <message>}
+    Lithium -> worker: {"condition": <module>, "args": [...],
+                        "testcase_args": [<indexes of args to replace>],
+                        "filename": <testcase basename>, "data": <base64 contents>}
+    worker -> Lithium: {"interesting": <bool>, "elapsed": <seconds>,
+                        "status": <target exit status or null>}
+                    or {"error": <message>}
+
+The worker writes the testcase to its own temporary directory, and passes that path
+in place of `args[i]` for each `i` in `testcase_args`. Condition modules must be
+importable by the worker (see `rel_or_abs_import`). Each condition is initialized
+with its args on first use, and cleaned up when the connection is closed.
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import os
+import shutil
+import socket
+import socketserver
+import tempfile
+import time
+
+from .interestingness import timed_run
+from .interestingness.utils import rel_or_abs_import
+from .util import LithiumError
+
+LOG = logging.getLogger(__name__)
+PROTOCOL_VERSION = 2
+# default address for `lithium-worker`, only accessible to the current user
+DEFAULT_LISTEN = "./lithium-worker.sock"
+
+
+def parse_address(spec):
+    """Parse a worker address.
+
+    Args:
+        spec (str): `host:port`, or a Unix socket path (containing `/`).
+
+    Returns:
+        tuple or str: (host, port) for TCP, or the socket path.
+
+    Raises:
+        ValueError: `spec` is not a valid address.
+    """
+    if "/" in spec:
+        return spec
+    host, sep, port = spec.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError("expected host:port or a socket path, got %r" % (spec,))
+    return (host or "localhost", int(port))
+
+
+def read_token(path):
+    """Read a shared token for authenticating Lithium to workers.
+
+    Args:
+        path (str or Path): File containing the token.
+
+    Returns:
+        bytes: The token, without surrounding whitespace.
+
+    Raises:
+        ValueError: The file is empty.
+    """
+    with open(path, "rb") as token_fp:
+        token = token_fp.read().strip()
+    if not token:
+        raise ValueError("token file %s is empty" % (path,))
+    return token
+
+
+def _response(token, challenge):
+    return hmac.new(token, challenge.encode("ascii"), hashlib.sha256).hexdigest()
+
+
+def _connect(address):
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+        return sock
+    return socket.create_connection(address)
+
+
+def _send(stream, message):
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+def _receive(stream):
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line.decode("utf-8"))
+
+
+class RemoteWorker:
+    """A connection to a worker, which runs one test at a time."""
+
+    def __init__(self, address, token=None):
+        """Connect to a worker.
+
+        Args:
+            address (tuple or str): Result of `parse_address()`.
+            token (bytes): Token shared with the worker (see `read_token()`).
+
+        Raises:
+            LithiumError: The worker couldn't be reached, doesn't speak this
+                          protocol version, or rejected the token.
+        """
+        self.address = address
+        self._sock = self._stream = None
+        try:
+            self._sock = _connect(address)
+            self._stream = self._sock.makefile("rwb")
+            hello = _receive(self._stream)
+            if hello is None or hello.get("version") != PROTOCOL_VERSION:
+                self.close()
+                raise LithiumError(
+                    "Worker %s uses an unsupported protocol: %r" % (self, hello)
+                )
+            auth = None
+            if token is not None:
+                auth = _response(token, hello["challenge"])
+            _send(self._stream, {"auth": auth})
+            reply = _receive(self._stream)
+        except (OSError, ValueError, KeyError) as exc:
+            self.close()
+            raise LithiumError("Can't connect to worker %s: %s" % (self, exc)) from None
+        if reply is None or not reply.get("authenticated"):
+            self.close()
+            raise LithiumError(
+                "Worker %s rejected the connection: %s"
+                % (self, (reply or {}).get("error", "connection closed"))
+            )
+        self.slots = int(hello.get("slots", 1))
+
+    def __str__(self):
+        if isinstance(self.address, str):
+            return self.address
+        return "%s:%d" % self.address
+
+    def run(self, condition, args, testcase_args, filename, data):
+        """Run an interestingness test on the worker.
+
+        Args:
+            condition (str): Condition module, as given to Lithium.
+            args (list(str)): Arguments to the condition script.
+            testcase_args (list(int)): Indexes of `args` to replace with the path of
+                                       the testcase on the worker.
+            filename (str): Basename for the testcase on the worker.
+            data (bytes): Testcase contents.
+
+        Returns:
+            tuple(bool, float, str): See `Lithium._call_condition()`.
+
+        Raises:
+            LithiumError: The worker failed to run the test.
+        """
+        request = {
+            "condition": condition,
+            "args": list(args),
+            "testcase_args": list(testcase_args),
+            "filename": filename,
+            "data": base64.b64encode(data).decode("ascii"),
+        }
+        try:
+            _send(self._stream, request)
+            response = _receive(self._stream)
+        except (OSError, ValueError) as exc:
+            raise LithiumError(
+                "Lost connection to worker %s: %s" % (self, exc)
+            ) from exc
+        if response is None:
+            raise LithiumError("Worker %s closed the connection" % (self,))
+        if "error" in response:
+            raise LithiumError("Worker %s failed: %s" % (self, response["error"]))
+        return response["interesting"], response["elapsed"], response["status"]
+
+    def close(self):
+        """Close the connection to the worker."""
+        if self._stream is not None:
+            self._stream.close()
+        if self._sock is not None:
+            self._sock.close()
+
+
+def connect_workers(addresses, token=None):
+    """Connect to workers, using every slot each worker offers.
+
+    Args:
+        addresses (list): Worker addresses (see `parse_address()`).
+        token (bytes): Token shared with the workers (see `read_token()`).
+
+    Returns:
+        list(RemoteWorker): One connection for each worker slot.
+
+    Raises:
+        LithiumError: A worker couldn't be reached.
+    """
+    workers = []
+    try:
+        for address in addresses:
+            first = RemoteWorker(address, token)
+            workers.append(first)
+            for _ in range(first.slots - 1):
+                workers.append(RemoteWorker(address, token))
+            LOG.info("Connected to worker %s (%d slots)", first, first.slots)
+    except LithiumError:
+        for worker in workers:
+            worker.close()
+        raise
+    return workers
+
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    """Run tests for one Lithium connection."""
+
+    def handle(self):
+        if not self._authenticate():
+            return
+        # persistent targets and adaptive timeouts are kept for each connection, and
+        # stopped by the cleanup of its conditions
+        with timed_run.owned_by(self):
+            self._serve()
+
+    def _serve(self):
+        work_dir = tempfile.mkdtemp(prefix="lithium-worker-")
+        numbers = itertools.count(1)
+        # initialized conditions, keyed by module name and args
+        conditions = {}
+        try:
+            while True:
+                try:
+                    request = _receive(self.rfile)
+                except (OSError, ValueError):
+                    break
+                if request is None:
+                    break
+                try:
+                    response = self._run(request, conditions, work_dir, numbers)
+                except Exception as exc:  # pylint: disable=broad-except
+                    LOG.exception("error running %r", request.get("condition"))
+                    response = {"error": "%s: %s" % (type(exc).__name__, exc)}
+                _send(self.wfile, response)
+        finally:
+            for (_, args), condition in conditions.items():
+                if hasattr(condition, "cleanup"):
+                    condition.cleanup(list(args))
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _authenticate(self):
+        """Check that Lithium knows the token given to the worker, if any.
+
+        Returns:
+            bool: True if the connection can be used to run tests.
+        """
+        challenge = os.urandom(32).hex()
+        _send(
+            self.wfile,
+            {
+                "version": PROTOCOL_VERSION,
+                "slots": self.server.slots,
+                "challenge": challenge,
+            },
+        )
+        try:
+            message = _receive(self.rfile)
+        except (OSError, ValueError):
+            return False
+        if message is None:
+            return False
+        token = self.server.token
+        if token is not None:
+            auth = message.get("auth")
+            expected = _response(token, challenge).encode("ascii")
+            if not isinstance(auth, str) or not hmac.compare_digest(
+                auth.encode("utf-8"), expected
+            ):
+                LOG.warning(
+                    "rejected connection from %r: bad token", self.client_address
+                )
+                _send(self.wfile, {"error": "authentication failed"})
+                return False
+        _send(self.wfile, {"authenticated": True})
+        return True
+
+    @staticmethod
+    def _run(request, conditions, work_dir, numbers):
+        args = list(request["args"])
+        key = (request["condition"], tuple(args))
+        condition = conditions.get(key)
+        if condition is None:
+            condition = rel_or_abs_import(request["condition"])
+            if hasattr(condition, "init"):
+                condition.init(args)
+            conditions[key] = condition
+        path = os.path.join(work_dir, os.path.basename(request["filename"]))
+        with open(path, "wb") as testcase_fp:
+            testcase_fp.write(base64.b64decode(request["data"]))
+        for idx in request["testcase_args"]:
+            args[idx] = path
+        temp_prefix = os.path.join(work_dir, str(next(numbers)))
+        prev_run = timed_run.last_run()
+        start_time = time.monotonic()
+        inter = condition.interesting(args, temp_prefix)
+        elapsed_time = time.monotonic() - start_time
+        run_data = timed_run.last_run()
+        status = None
+        if run_data is not None and run_data is not prev_run:
+            status = run_data.msg
+        return {"interesting": bool(inter), "elapsed": elapsed_time, "status": status}
+
+
+class _WorkerServer:
+    """Settings of a worker server, used by its `_WorkerHandler`s."""
+
+    daemon_threads = True
+
+    def __init__(self, address, slots, token):
+        self.slots = slots
+        self.token = token
+        super().__init__(address, _WorkerHandler)
+
+
+class _TCPWorkerServer(_WorkerServer, socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+
+
+class _UnixWorkerServer(_WorkerServer, socketserver.ThreadingUnixStreamServer):
+    pass
+
+
+def worker_server(address, slots=1, token=None):
+    """Create a worker server. Call `serve_forever()` on the result to start it.
+
+    Args:
+        address (tuple or str): Address to listen on (see `parse_address()`). Use
+                                port 0 to choose a free port (see `server_address`).
+        slots (int): Number of tests Lithium should run on this worker at once.
+        token (bytes): Token Lithium must know to use the worker (see
+                       `read_token()`). Required for TCP.
+
+    Returns:
+        socketserver.BaseServer: The server.
+
+    Raises:
+        ValueError: No token was given for a TCP address.
+    """
+    if isinstance(address, str):
+        # only the current user can connect to the socket
+        umask = os.umask(0o177)
+        try:
+            server = _UnixWorkerServer(address, slots, token)
+        finally:
+            os.umask(umask)
+    else:
+        if token is None:
+            raise ValueError("a token is required to listen on TCP")
+        server = _TCPWorkerServer(address, slots, token)
+    return server
+
+
+def main(argv=None):
+    """Lithium worker entrypoint
+
+    Args:
+        argv (list, None): specify command line args
+    """
+    parser = argparse.ArgumentParser(
+        description="Run Lithium interestingness tests for a remote Lithium process"
+    )
+    parser.add_argument(
+        "--listen",
+        default=DEFAULT_LISTEN,
+        help="address to listen on: host:port, or a Unix socket path. Anyone who "
+        "can connect can run commands as this user. default: %(default)s",
+    )
+    parser.add_argument(
+        "--token-file",
+        help="file containing a token Lithium must know to connect (see "
+        "lithium --remote-token-file). Required to listen on TCP.",
+    )
+    parser.add_argument(
+        "--slots",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of tests to run at once. default: number of CPUs",
+    )
+    args = parser.parse_args(argv)
+    try:
+        address = parse_address(args.listen)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.slots < 1:
+        parser.error("--slots must be at least 1")
+    token = None
+    if args.token_file is not None:
+        try:
+            token = read_token(args.token_file)
+        except (OSError, ValueError) as exc:
+            parser.error("can't read --token-file: %s" % (exc,))
+    elif not isinstance(address, str):
+        parser.error("--token-file is required to listen on TCP")
+
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+    server = worker_server(address, args.slots, token)
+    LOG.info("Listening on %s", args.listen)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if isinstance(address, str):
+            os.unlink(address)
@@ -5,13 +5,15 @@
 """Lithium reduction strategy implementations"""
 
 import abc
+import collections
 import functools
-import hashlib
+import itertools
 import logging
 import re
 import time
 
 from .util import (
+    bracket_balance,
     divide_rounding_up,
     is_power_of_two,
     largest_power_of_two_smaller_than,
@@ -31,13 +33,28 @@ class ReductionIterator(abc.ABC):
     `best`.
     """
 
+    # number of tried testcases kept as copies until they are hashed. Copies share the
+    # buffer of the testcase they were made from, so this also limits how many old
+    # buffers are kept alive.
+    MAX_COPIES = 32
+
     def __init__(self, testcase):
         self._best_testcase = testcase
         self._testcase_attempt = None
         self._any_success = False
         self._last_success = None
         self._description = "Reduction"
+        # hashes of testcases tried elsewhere (see `update_tried()`)
         self._tried = set()
+        # testcases tried by this iterator, keyed by `Testcase.fingerprint()`. Values
+        # are lists of testcase copies (or their hashes, once computed), so that the
+        # full hash is only needed when fingerprints match.
+        self._fingerprints = {}
+        # (list, index) of the copies in `_fingerprints`, oldest first
+        self._copies = collections.deque()
+        self._lookahead = ()
+        # strategy specific position in the reduction, saved in checkpoints
+        self.state = {}
 
     @property
     def last_feedback(self):
@@ -53,6 +70,9 @@ class ReductionIterator(abc.ABC):
         """Update the list of tried hashes. Testcases are hashed with SHA-512
         and digested to bytes (`hashlib.sha512(testcase).digest()`)
 
+        These can't be compared by fingerprint, so each testcase tried afterwards is
+        hashed. Use `share_tried()` to share tried testcases between iterators.
+
         Args:
             tried (iterable(str)): Set of already tried testcase hashes.
 
@@ -68,7 +88,100 @@ class ReductionIterator(abc.ABC):
         Returns:
             frozenset(str): Testcase hashes.
         """
-        return frozenset(self._tried)
+        return frozenset(self._tried.union(*self._tried_hashes().values()))
+
+    def share_tried(self, other):
+        """Use the same record of tried testcases as another iterator, so testcases
+        tried by either are not tried again. This must be called before iterating.
+
+        Args:
+            other (ReductionIterator): Iterator to share tried testcases with.
+        """
+        self._tried = other._tried  # pylint: disable=protected-access
+        self._fingerprints = other._fingerprints  # pylint: disable=protected-access
+        self._copies = other._copies  # pylint: disable=protected-access
+
+    def _tried_hashes(self):
+        """Compute the full hash of testcases tried by this iterator.
+
+        Returns:
+            dict: Lists of testcase hashes, keyed by testcase fingerprint.
+        """
+        while self._copies:
+            self._hash_copy()
+        return self._fingerprints
+
+    def _hash_copy(self):
+        """Replace the oldest testcase copy in `_fingerprints` by its hash."""
+        attempts, idx = self._copies.popleft()
+        # the copy may already have been hashed for a fingerprint collision
+        if not isinstance(attempts[idx], str):
+            attempts[idx] = attempts[idx].hexdigest()
+
+    def _is_new(self, testcase):
+        """Check whether a testcase has been tried before, and record it if not.
+
+        Args:
+            testcase (Testcase): The testcase to check.
+
+        Returns:
+            bool: True if the testcase was not tried before.
+        """
+        tc_hash = None
+        if self._tried:
+            tc_hash = testcase.hexdigest()
+            if tc_hash in self._tried:
+                return False
+        attempts = self._fingerprints.setdefault(testcase.fingerprint(), [])
+        if attempts:
+            # fingerprints can collide, compare the full hash
+            if tc_hash is None:
+                tc_hash = testcase.hexdigest()
+            for idx, attempt in enumerate(attempts):
+                if not isinstance(attempt, str):
+                    attempt = attempts[idx] = attempt.hexdigest()
+                if attempt == tc_hash:
+                    return False
+        if tc_hash is None and testcase.shared:
+            # keep a copy to hash later if needed. copies share the parts buffer, so
+            # this is cheap.
+            self._copies.append((attempts, len(attempts)))
+            attempts.append(testcase.copy())
+            if len(self._copies) > self.MAX_COPIES:
+                self._hash_copy()
+        else:
+            # the parts were not shared, so this testcase was built from scratch and
+            # hashing it costs no more than building it did.
+            attempts.append(tc_hash or testcase.hexdigest())
+        return True
+
+    def snapshot(self):
+        """Get the progress of this reduction, so it can be continued later using
+        `restore()`. The current attempt is not included if no feedback was received
+        for it yet, so it will be tried again.
+
+        Returns:
+            dict: Reduction state and the tried testcase hashes.
+        """
+        tried = {
+            fingerprint: list(attempts)
+            for fingerprint, attempts in self._tried_hashes().items()
+        }
+        if self._testcase_attempt is not None:
+            fingerprint = self._testcase_attempt.fingerprint()
+            tried[fingerprint].remove(self._testcase_attempt.hexdigest())
+        return {"state": dict(self.state), "tried": set(self._tried), "hashes": tried}
+
+    def restore(self, snapshot):
+        """Continue a reduction from a snapshot. This must be called before iterating.
+
+        Args:
+            snapshot (dict): Result of `snapshot()` from a previous reduction.
+        """
+        self.state.update(snapshot["state"])
+        self.update_tried(snapshot["tried"])
+        for fingerprint, attempts in snapshot["hashes"].items():
+            self._fingerprints.setdefault(fingerprint, []).extend(attempts)
 
     def feedback(self, success):
         """Provide feedback on the current reduction attempt.
@@ -83,6 +196,28 @@ class ReductionIterator(abc.ABC):
             self._best_testcase = self._testcase_attempt
             self._any_success = True
         self._testcase_attempt = None
+        self._lookahead = ()
+
+    def predict(self, attempts):
+        """Describe the attempts expected to follow the current one, assuming it is
+        not successful. This is optional, and is used to evaluate upcoming attempts
+        concurrently (see `--jobs`). Predictions are discarded when `feedback()` is
+        called.
+
+        Args:
+            attempts (iterable(Testcase)): Upcoming attempts, in order. This is
+                                           consumed lazily and may be left unfinished.
+        """
+        self._lookahead = attempts
+
+    @property
+    def lookahead(self):
+        """Get the attempts expected to follow the current one (see `predict()`).
+
+        Returns:
+            iterable(Testcase): Upcoming attempts, in order.
+        """
+        return self._lookahead
 
     def try_testcase(self, testcase, description="Reduction"):
         """Update the currently attempted testcase.
@@ -95,16 +230,7 @@ class ReductionIterator(abc.ABC):
         """
         assert self._testcase_attempt is None, "Already attempting a testcase"
         # de-dupe the testcase
-        # include before/after since different testcase types
-        #   may split them inconsistently.
-        tc_hash = hashlib.sha512()
-        tc_hash.update(testcase.before)
-        for part in testcase.parts:
-            tc_hash.update(part)
-        tc_hash.update(testcase.after)
-        tc_hash = tc_hash.hexdigest()
-        if tc_hash not in self._tried:
-            self._tried.add(tc_hash)
+        if self._is_new(testcase):
             self._last_success = None
             self._testcase_attempt = testcase
             self._description = description
@@ -206,7 +332,15 @@ class Strategy(abc.ABC):
             Iterable: An iterable to reduce the testcase (see ReductionIterator).
         """
 
-    def main(self, testcase, interesting, temp_filename):
+    def main(
+        self,
+        testcase,
+        interesting,
+        temp_filename,
+        speculate=None,
+        checkpoint=None,
+        resume=None,
+    ):
         """
 
         Args:
@@ -227,7 +361,8 @@ class Strategy(abc.ABC):
                         bool: Whether the condition was observed when evaluating the
                               given testcase.
             temp_filename (callback): Create a temporary filename for the next testcase.
-                The callback has the following signature:
+                If None, the original testcase is not saved. The callback has the
+                following signature:
 
                 def temp_filename(filename_stem, use_number=True):
 
@@ -238,11 +373,33 @@ class Strategy(abc.ABC):
 
                     Returns:
                         Path: Filename to use for the next testcase.
+            speculate (callback, optional): Start evaluating upcoming reductions
+                ahead of time, so `interesting` can return their results without
+                waiting. The callback has the following signature:
+
+                def speculate(attempts):
+
+                    Args:
+                        attempts (iterable(Testcase)): reductions about to be
+                                                       tested, in order, beginning
+                                                       with the current attempt.
+            checkpoint (callback, optional): Called before each attempt, so the
+                progress of the reduction can be saved. The callback has the following
+                signature:
+
+                def checkpoint(reduction):
+
+                    Args:
+                        reduction (ReductionIterator): the reduction in progress
+                                                       (see `snapshot()`).
+            resume (dict, optional): Continue from a previous reduction snapshot
+                (see `ReductionIterator.snapshot()`).
 
         Returns:
             int: 0 on success
         """
-        testcase.dump(temp_filename("original", False))
+        if temp_filename is not None:
+            testcase.dump(temp_filename("original", False))
 
         if not testcase:
             LOG.info(
@@ -260,7 +417,13 @@ class Strategy(abc.ABC):
             return 1
 
         reduction = self.reduce(testcase)
+        if resume is not None:
+            reduction.restore(resume)
         for attempt in reduction:
+            if checkpoint is not None:
+                checkpoint(reduction)
+            if speculate is not None:
+                speculate(itertools.chain((attempt,), reduction.lookahead))
             success = interesting(attempt)
             if success:
                 LOG.info("%s was successful", reduction.description)
@@ -269,7 +432,8 @@ class Strategy(abc.ABC):
             reduction.feedback(success)
         # write the final best testcase to disk
         testcase = reduction.testcase
-        testcase.dump()
+        if testcase.filename is not None:
+            testcase.dump()
 
         summary_header()
 
@@ -289,7 +453,15 @@ class CheckOnly(Strategy):
         # check doesn't reduce, only checks
         yield from iterator.try_testcase(iterator.testcase, "Check")
 
-    def main(self, testcase, interesting, temp_filename):
+    def main(
+        self,
+        testcase,
+        interesting,
+        temp_filename,
+        speculate=None,
+        checkpoint=None,
+        resume=None,
+    ):
         result = interesting(testcase, write_it=False)
         LOG.info("Lithium result: %sinteresting.", ("" if result else "not "))
         return int(not result)
@@ -398,6 +570,31 @@ class Minimize(Strategy):
     def _post_round_cb(self, iterator):  # pylint: disable=no-self-use
         return []
 
+    @staticmethod
+    def _predict_round(testcase, chunk_size, chunk_end):
+        """Generate the attempts which follow the removal of the chunk ending at
+        `chunk_end`, if none of them are successful. Only the current round is
+        predicted.
+
+        Args:
+            testcase (Testcase): Testcase the current round is reducing.
+            chunk_size (int): Chunk size of the current round.
+            chunk_end (int): End of the chunk currently being removed.
+
+        Yields:
+            Testcase: Upcoming attempts, in the order `reduce` will try them.
+        """
+        while True:
+            if chunk_size <= 2:
+                chunk_end -= 1
+            else:
+                chunk_end -= chunk_size
+            if chunk_end - chunk_size < 0:
+                return
+            attempt = testcase.copy()
+            attempt.rmslice(max(0, chunk_end - chunk_size), chunk_end)
+            yield attempt
+
     @ReductionIterator.wrap
     def reduce(self, iterator):  # pylint: disable=arguments-differ
         chunk_size = min(
@@ -406,15 +603,30 @@ class Minimize(Strategy):
         min_chunk_size = min(chunk_size, max(self.minimize_min, 1))
         chunk_end = len(iterator.testcase)
         removed_chunks = self.minimize_repeat_first_round
+        if iterator.state:
+            LOG.info("Resuming with chunk size %d", iterator.state["chunk_size"])
+            chunk_size = iterator.state["chunk_size"]
+            min_chunk_size = iterator.state["min_chunk_size"]
+            chunk_end = iterator.state["chunk_end"]
+            removed_chunks = iterator.state["removed_chunks"]
         stop_after_time = None
         if self.stop_after_time is not None:
             stop_after_time = time.time() + self.stop_after_time
 
+        def _save_state():
+            iterator.state.update(
+                chunk_size=chunk_size,
+                min_chunk_size=min_chunk_size,
+                chunk_end=chunk_end,
+                removed_chunks=removed_chunks,
+            )
+
         while True:
+            _save_state()
             if stop_after_time is not None and time.time() > stop_after_time:
                 LOG.warning(
                     "Lithium result: run time elapsed, please perform another pass "
-                    "using the same arguments"
+                    "using the same arguments, or continue using --resume"
                 )
                 return
 
@@ -470,6 +682,7 @@ class Minimize(Strategy):
 
                 removed_chunks = False
 
+            _save_state()
             chunk_start = max(0, chunk_end - chunk_size)
             status = "Removing chunk from %s to %s of %d" % (
                 chunk_start,
@@ -478,6 +691,9 @@ class Minimize(Strategy):
             )
             test_to_try = iterator.testcase.copy()
             test_to_try.rmslice(chunk_start, chunk_end)
+            iterator.predict(
+                self._predict_round(iterator.testcase, chunk_size, chunk_end)
+            )
             for test in iterator.try_testcase(test_to_try, status):
                 yield test
                 if iterator.last_feedback:
@@ -741,10 +957,7 @@ class MinimizeBalancedPairs(MinimizeSurroundingPairs):
         )
 
         def _count_diff(chunk, ops):
-            assert len(ops) == 2
-            return iterator.testcase.parts[chunk].count(
-                ops[0]
-            ) - iterator.testcase.parts[chunk].count(ops[1])
+            return bracket_balance(iterator.testcase.parts[chunk], ops)
 
         summary = "S" * num_chunks
         curly = [_count_diff(i, b"{}") for i in range(num_chunks)]
@@ -1534,13 +1747,361 @@ class CollapseEmptyBraces(Minimize):
 
         # Don't update the testcase if no changes were applied
         if raw != modified:
-            with open(iterator.testcase.filename, "wb") as testf:
-                testf.write(iterator.testcase.before)
-                testf.write(modified)
-                testf.write(iterator.testcase.after)
-
             # Re-parse the modified testcase
-            new_tc = iterator.testcase.copy()
-            new_tc.load(iterator.testcase.filename)
+            new_tc = iterator.testcase.empty_copy()
+            new_tc.split_parts(modified)
 
             yield from iterator.try_testcase(new_tc, "Collapse empty braces")
+
+
+class _PipelineIterator(ReductionIterator):
+    """Iterator over the stages of a `Pipeline`."""
+
+    def __init__(self, testcase, stages):
+        super().__init__(testcase)
+        self._stages = stages
+        self._reduction = None
+
+    @property
+    def lookahead(self):
+        if self._reduction is None:
+            return ()
+        return self._reduction.lookahead
+
+    def __iter__(self):
+        passes = self.state.get("pass", 1)
+        stage_idx = self.state.get("stage", 0)
+        progress = self.state.get("progress", False)
+        stage_state = self.state.get("stage_state")
+        while True:
+            while stage_idx < len(self._stages):
+                stage = self._stages[stage_idx]
+                LOG.info("Pass %d, stage %d: %s", passes, stage_idx + 1, stage.name)
+                self._reduction = stage.reduce(self.testcase)
+                self._reduction.share_tried(self)
+                if stage_state is not None:
+                    self._reduction.state.update(stage_state)
+                    stage_state = None
+                for attempt in self._reduction:
+                    self.state.update(
+                        {
+                            "pass": passes,
+                            "stage": stage_idx,
+                            "progress": progress,
+                            "stage_state": dict(self._reduction.state),
+                        }
+                    )
+                    self._last_success = None
+                    self._testcase_attempt = attempt
+                    self._description = self._reduction.description
+                    yield attempt
+                    self._reduction.feedback(self.last_feedback)
+                progress = progress or self._reduction.reduced
+                self._reduction = None
+                stage_idx += 1
+            if not progress:
+                LOG.info("Pipeline pass %d made no progress, finished", passes)
+                return
+            passes += 1
+            stage_idx = 0
+            progress = False
+
+
+class _ScheduledPipelineIterator(_PipelineIterator):
+    """Iterator over the stages of a `Pipeline`, choosing which stage to run next by
+    how quickly each has been reducing the testcase.
+
+    Stages are run for a slice of time each. Every stage is tried once, then each
+    slice goes to the stage which removed the most atoms per second of testing in its
+    last slice. A stage which is interrupted continues where it stopped, unless
+    another stage changed the testcase in the meantime. A stage which finishes
+    without reducing the testcase isn't run again until another stage makes progress.
+    """
+
+    def __init__(self, testcase, stages, time_slice, time_budget=None):
+        super().__init__(testcase, stages)
+        self._time_slice = time_slice
+        self._time_budget = time_budget
+        # per stage: tests run, seconds spent testing, atoms removed, the rate of the
+        # last slice (None until run) and whether the stage is finished
+        self.stats = [
+            {
+                "name": stage.name,
+                "tests": 0,
+                "seconds": 0.0,
+                "removed": 0,
+                "rate": None,
+                "finished": False,
+            }
+            for stage in stages
+        ]
+
+    def _choose(self):
+        """Choose the stage to run next.
+
+        Returns:
+            int: Index of the stage to run next, or None if all stages are finished.
+        """
+        candidates = [
+            idx for idx, stats in enumerate(self.stats) if not stats["finished"]
+        ]
+        for idx in candidates:
+            if self.stats[idx]["rate"] is None:
+                return idx
+        if not candidates:
+            return None
+        return max(candidates, key=lambda idx: (self.stats[idx]["rate"], -idx))
+
+    def _log_stats(self):
+        LOG.info("Time spent testing by each strategy:")
+        for stats in self.stats:
+            LOG.info(
+                "  %s: %s in %0.1fs, removed %s",
+                stats["name"],
+                quantity(stats["tests"], "test"),
+                stats["seconds"],
+                quantity(stats["removed"], self.testcase.atom),
+            )
+
+    def __iter__(self):
+        if "stats" in self.state:
+            self.stats = self.state["stats"]
+        resume_idx = self.state.get("stage")
+        stage_state = self.state.get("stage_state")
+        deadline = None
+        if self._time_budget is not None:
+            deadline = time.monotonic() + self._time_budget
+        # interrupted stages: reduction and the iterator over its attempts
+        running = {}
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                LOG.info("Time budget used up, stopping")
+                break
+            if resume_idx is not None:
+                idx = resume_idx
+                resume_idx = None
+            else:
+                idx = self._choose()
+            if idx is None:
+                LOG.info("None of the strategies can make progress, finished")
+                break
+            stage = self._stages[idx]
+            stats = self.stats[idx]
+            reduction, attempts = running.pop(idx, (None, None))
+            if reduction is None or reduction.testcase is not self.testcase:
+                LOG.info("Scheduling strategy: %s", stage.name)
+                reduction = stage.reduce(self.testcase)
+                reduction.share_tried(self)
+                if stage_state is not None:
+                    reduction.state.update(stage_state)
+                attempts = iter(reduction)
+            else:
+                LOG.info("Continuing strategy: %s", stage.name)
+            stage_state = None
+            self._reduction = reduction
+            orig_len = len(self.testcase)
+            slice_end = time.monotonic() + self._time_slice
+            progress = False
+            finished = True
+            elapsed = 0.0
+            for attempt in attempts:
+                self.state.update(
+                    {
+                        "stats": self.stats,
+                        "stage": idx,
+                        "stage_state": dict(reduction.state),
+                    }
+                )
+                self._last_success = None
+                self._testcase_attempt = attempt
+                self._description = reduction.description
+                start = time.monotonic()
+                yield attempt
+                now = time.monotonic()
+                elapsed += now - start
+                stats["tests"] += 1
+                progress = progress or self.last_feedback
+                reduction.feedback(self.last_feedback)
+                if now >= slice_end or (deadline is not None and now >= deadline):
+                    finished = False
+                    running[idx] = (reduction, attempts)
+                    break
+            self._reduction = None
+            removed = orig_len - len(self.testcase)
+            stats["seconds"] += elapsed
+            stats["removed"] += removed
+            stats["rate"] = removed / max(elapsed, 0.001)
+            stats["finished"] = finished and not reduction.reduced
+            if progress:
+                for other in self.stats:
+                    if other is not stats:
+                        other["finished"] = False
+            LOG.info(
+                "%s removed %s in %0.1fs",
+                stage.name,
+                quantity(removed, self.testcase.atom),
+                elapsed,
+            )
+        self.state.pop("stage", None)
+        self.state.pop("stage_state", None)
+        self._log_stats()
+
+
+class Pipeline(Strategy):
+    """Run several strategies in turn, and repeat them until a whole pass makes no
+    progress. Testcases tried by any stage are not tried again by the others.
+
+    Stages use the same values for options they have in common (eg. `--max`). With
+    `--schedule`, the stages aren't run in a fixed order, but scheduled according to
+    how quickly each is reducing the testcase (see `_ScheduledPipelineIterator`).
+    """
+
+    name = "pipeline"
+
+    def __init__(self, stages=()):
+        """Initialize a pipeline.
+
+        Args:
+            stages (list(Strategy)): Strategies to run, in order.
+        """
+        super().__init__()
+        self.stages = list(stages)
+        self.schedule = False
+        self.time_slice = 30
+        self.time_budget = None
+
+    def add_args(self, parser):
+        super().add_args(parser)
+        grp_add = parser.add_argument_group(
+            description="Additional options for the %s strategy" % (self.name,)
+        )
+        grp_add.add_argument(
+            "--schedule",
+            action="store_true",
+            help="run whichever strategy is removing the most per second of testing, "
+            "instead of running them in order",
+        )
+        grp_add.add_argument(
+            "--schedule-slice",
+            type=float,
+            default=30,
+            help="with --schedule, seconds to run a strategy for before choosing "
+            "again. default: %(default)s",
+        )
+        grp_add.add_argument(
+            "--time-budget",
+            type=float,
+            default=None,
+            help="with --schedule, stop after n seconds",
+        )
+        # options shared by several stages are only added once
+        conflict_handler = parser.conflict_handler
+        parser.conflict_handler = "resolve"
+        try:
+            for stage in self.stages:
+                stage.add_args(parser)
+        finally:
+            parser.conflict_handler = conflict_handler
+
+    def process_args(self, parser, args):
+        super().process_args(parser, args)
+        self.schedule = args.schedule
+        if args.schedule_slice <= 0:
+            parser.error("--schedule-slice must be positive")
+        self.time_slice = args.schedule_slice
+        self.time_budget = args.time_budget
+        for stage in self.stages:
+            stage.process_args(parser, args)
+
+    def reduce(self, testcase):
+        if self.schedule:
+            return _ScheduledPipelineIterator(
+                testcase, self.stages, self.time_slice, self.time_budget
+            )
+        return _PipelineIterator(testcase, self.stages)
+
+
+class _CascadeIterator(_PipelineIterator):
+    """Iterator over the levels of a `Cascade`."""
+
+    def __init__(self, testcase, strategy, levels):
+        super().__init__(testcase, [strategy])
+        self._levels = levels
+
+    def __iter__(self):
+        level = self.state.get("level", 0)
+        stage_state = self.state.get("stage_state")
+        strategy = self._stages[0]
+        while True:
+            if level:
+                testcase = self._levels[level - 1]()
+                testcase.split_from(self.testcase)
+                LOG.info(
+                    "Splitting the testcase into %s",
+                    quantity(len(testcase), testcase.atom),
+                )
+                self._best_testcase = testcase
+            self._reduction = strategy.reduce(self.testcase)
+            self._reduction.share_tried(self)
+            if stage_state is not None:
+                self._reduction.state.update(stage_state)
+                stage_state = None
+            for attempt in self._reduction:
+                self.state.update(
+                    {"level": level, "stage_state": dict(self._reduction.state)}
+                )
+                self._last_success = None
+                self._testcase_attempt = attempt
+                self._description = self._reduction.description
+                yield attempt
+                self._reduction.feedback(self.last_feedback)
+            self._reduction = None
+            level += 1
+            if level > len(self._levels):
+                return
+
+
+class Cascade(Strategy):
+    """Reduce a testcase using another strategy, then split the result into smaller
+    atoms (eg. lines, then symbols, then chars) and reduce it again, in one run.
+
+    The testcase is split again in memory, so the original testcase is only checked
+    once, and testcases tried at one level are not tried again at the next.
+    """
+
+    name = "cascade"
+
+    def __init__(self, strategy, levels=()):
+        """Initialize a cascade.
+
+        Args:
+            strategy (Strategy): Strategy to reduce each level with.
+            levels (list(type)): Testcase types to split the testcase into after the
+                                 first reduction, in order.
+        """
+        super().__init__()
+        self.strategy = strategy
+        self.levels = list(levels)
+        self._args = None
+
+    def add_args(self, parser):
+        super().add_args(parser)
+        self.strategy.add_args(parser)
+
+    def process_args(self, parser, args):
+        super().process_args(parser, args)
+        self.strategy.process_args(parser, args)
+        self._args = args
+
+    def _new_testcase(self, testcase_cls):
+        testcase = testcase_cls()
+        if self._args is not None:
+            testcase.handle_args(self._args)
+        return testcase
+
+    def reduce(self, testcase):
+        return _CascadeIterator(
+            testcase,
+            self.strategy,
+            [functools.partial(self._new_testcase, level) for level in self.levels],
+        )
@@ -8,14 +8,519 @@ A testcase is a file to be reduced, split in a certain way (eg. bytes, lines).
 """
 
 import abc
+import array
+import bisect
+import hashlib
+import itertools
 import logging
+import mmap
 import os.path
+import platform
 import re
+import shutil
+import tempfile
 
 from .util import LithiumError
 
 DEFAULT = "line"
+# testcase types used by `--cascade`, from the largest atoms to the smallest
+CASCADE = ("line", "symbol-delimiter", "char")
 LOG = logging.getLogger(__name__)
+# Mersenne prime modulus for testcase fingerprints (see `Testcase.fingerprint()`)
+FINGERPRINT_MOD = (1 << 127) - 1
+
+
+def _fingerprint_concat(value, data_value, data_len):
+    """Combine the fingerprint of two adjacent byte strings.
+
+    Fingerprints are the contents interpreted as a big-endian integer modulo
+    `FINGERPRINT_MOD`. Since `2 ** 127 == 1 (mod FINGERPRINT_MOD)`, appending `data`
+    is a rotation of `value` by `data_len` bytes plus the value of `data`.
+
+    Args:
+        value (int): Fingerprint value of the first byte string.
+        data_value (int): Fingerprint value of the second byte string.
+        data_len (int): Length of the second byte string.
+
+    Returns:
+        int: Fingerprint value of the concatenation.
+    """
+    return ((value << (8 * data_len % 127)) + data_value) % FINGERPRINT_MOD
+
+
+class _DataFingerprints:
+    """Fingerprints of byte ranges in a large buffer.
+
+    Prefix fingerprints are only kept every `BLOCK` bytes, and the rest of each
+    range is hashed on demand.
+    """
+
+    BLOCK = 512
+    __slots__ = ("data", "_hashes")
+
+    def __init__(self, data):
+        self.data = data
+        self._hashes = [0]
+        for block in range(0, len(data), self.BLOCK):
+            chunk = data[block : block + self.BLOCK]
+            self._hashes.append(
+                _fingerprint_concat(
+                    self._hashes[-1], int.from_bytes(chunk, "big"), len(chunk)
+                )
+            )
+
+    def _prefix(self, pos):
+        block = pos // self.BLOCK
+        start = block * self.BLOCK
+        value = int.from_bytes(self.data[start:pos], "big")
+        return _fingerprint_concat(self._hashes[block], value, pos - start)
+
+    def fingerprint(self, start, stop):
+        """Fingerprint a range of the buffer.
+
+        Args:
+            start (int): Range start offset
+            stop (int): Range stop offset
+
+        Returns:
+            tuple(int, int): Length and fingerprint value of `data[start:stop]`.
+        """
+        length = stop - start
+        value = (
+            self._prefix(stop) - (self._prefix(start) << (8 * length % 127))
+        ) % FINGERPRINT_MOD
+        return length, value
+
+
+class _PartsBuffer:
+    """Immutable storage for the parts of a testcase, shared between copies.
+
+    Testcases refer to ranges of the buffer, so removing parts from a testcase or
+    copying it does not need to copy the parts themselves.
+    """
+
+    __slots__ = ("parts", "reducible", "_rank", "_hashes", "_offsets")
+
+    def __init__(self, parts, reducible):
+        assert len(parts) == len(reducible)
+        self.parts = tuple(parts)
+        self.reducible = tuple(reducible)
+        # `_rank[i]` is the number of reducible parts in `parts[:i]`
+        self._rank = array.array("q", [0])
+        self._rank.extend(itertools.accumulate(self.reducible))
+        # prefix fingerprints and byte offsets, built when first needed
+        self._hashes = None
+        self._offsets = None
+
+    def __len__(self):
+        return len(self.parts)
+
+    def __reduce__(self):
+        # the counts and fingerprints are rebuilt, rather than pickled
+        return (type(self), (self.parts, self.reducible))
+
+    def compact(self, pieces):
+        """Copy the parts in some ranges of the buffer to a new buffer, eg. so a
+        testcase can be saved without the parts it no longer uses.
+
+        Args:
+            pieces (list(tuple(int, int))): Ranges of the buffer to copy.
+
+        Returns:
+            _PartsBuffer: Buffer of the same type holding only those parts.
+        """
+        return type(self)(
+            list(
+                itertools.chain.from_iterable(
+                    self.part_list(start, stop) for start, stop in pieces
+                )
+            ),
+            list(
+                itertools.chain.from_iterable(
+                    self.reducible_list(start, stop) for start, stop in pieces
+                )
+            ),
+        )
+
+    def part_list(self, start, stop):
+        """Get the parts in a range of the buffer.
+
+        Args:
+            start (int): Range start index
+            stop (int): Range stop index
+
+        Returns:
+            list(bytes): `parts[start:stop]`
+        """
+        return list(self.parts[start:stop])
+
+    def reducible_list(self, start, stop):
+        """Get the reducibility of the parts in a range of the buffer.
+
+        Args:
+            start (int): Range start index
+            stop (int): Range stop index
+
+        Returns:
+            list(bool): `reducible[start:stop]`
+        """
+        return list(self.reducible[start:stop])
+
+    def chunks(self, start, stop):
+        """Get the contents of a range of the buffer, for writing or hashing.
+
+        Args:
+            start (int): Range start index
+            stop (int): Range stop index
+
+        Returns:
+            iterable(bytes): Contents of `parts[start:stop]`
+        """
+        return self.parts[start:stop]
+
+    def count(self, start, stop):
+        """Count the reducible parts in a range of the buffer.
+
+        Args:
+            start (int): Range start index
+            stop (int): Range stop index
+
+        Returns:
+            int: Number of reducible parts in `parts[start:stop]`
+        """
+        return self._rank[stop] - self._rank[start]
+
+    def fingerprint(self, start, stop):
+        """Fingerprint the contents of a range of the buffer.
+
+        Args:
+            start (int): Range start index
+            stop (int): Range stop index
+
+        Returns:
+            tuple(int, int): Length and fingerprint value of `parts[start:stop]`.
+        """
+        if self._hashes is None:
+            self._hashes = hashes = [0]
+            self._offsets = array.array("q", [0])
+            for part in self.parts:
+                hashes.append(
+                    _fingerprint_concat(
+                        hashes[-1], int.from_bytes(part, "big"), len(part)
+                    )
+                )
+            self._offsets.extend(itertools.accumulate(len(part) for part in self.parts))
+        length = self._offsets[stop] - self._offsets[start]
+        value = (
+            self._hashes[stop] - (self._hashes[start] << (8 * length % 127))
+        ) % FINGERPRINT_MOD
+        return length, value
+
+    def select(self, index):
+        """Find a reducible part by index.
+
+        Args:
+            index (int): Index of the part among the reducible parts in the buffer.
+
+        Returns:
+            int: Index of the part in `parts`.
+        """
+        return bisect.bisect_right(self._rank, index) - 1
+
+    def select_fixed(self, index):
+        """Find a non-reducible part by index.
+
+        Args:
+            index (int): Index of the part among the non-reducible parts in the
+                         buffer.
+
+        Returns:
+            int: Index of the part in `parts`.
+        """
+        low, high = 0, len(self)
+        while low < high:
+            mid = (low + high) // 2
+            if mid + 1 - self._rank[mid + 1] <= index:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+
+class _SpansBuffer(_PartsBuffer):
+    """Storage for testcases where the parts are consecutive spans of one buffer
+    (eg. the lines of a memory-mapped file), shared between copies.
+
+    This avoids creating a `bytes` object for each part until the parts are needed as
+    a list.
+    """
+
+    __slots__ = ("data", "offsets", "_fingerprints")
+
+    def __init__(self, data, offsets, reducible):
+        # pylint: disable=super-init-not-called
+        assert len(offsets) == len(reducible) + 1
+        self.parts = None
+        self.data = data
+        # part `i` is `data[offsets[i]:offsets[i + 1]]`
+        self.offsets = offsets
+        self.reducible = bytes(reducible)
+        self._rank = array.array("q", [0])
+        self._rank.extend(itertools.accumulate(self.reducible))
+        self._fingerprints = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __reduce__(self):
+        return (type(self), (bytes(self.data), self.offsets, self.reducible))
+
+    def compact(self, pieces):
+        offsets = array.array("q", [0])
+        for start, stop in pieces:
+            base = offsets[-1] - self.offsets[start]
+            offsets.extend(
+                base + self.offsets[idx] for idx in range(start + 1, stop + 1)
+            )
+        return type(self)(
+            b"".join(
+                itertools.chain.from_iterable(
+                    self.chunks(start, stop) for start, stop in pieces
+                )
+            ),
+            offsets,
+            b"".join(self.reducible[start:stop] for start, stop in pieces),
+        )
+
+    def part_list(self, start, stop):
+        offsets = self.offsets
+        return [
+            bytes(self.data[offsets[idx] : offsets[idx + 1]])
+            for idx in range(start, stop)
+        ]
+
+    def reducible_list(self, start, stop):
+        return [bool(flag) for flag in self.reducible[start:stop]]
+
+    def chunks(self, start, stop):
+        return (memoryview(self.data)[self.offsets[start] : self.offsets[stop]],)
+
+    def fingerprint(self, start, stop):
+        if self._fingerprints is None:
+            self._fingerprints = _DataFingerprints(self.data)
+        return self._fingerprints.fingerprint(self.offsets[start], self.offsets[stop])
+
+
+class _BytesBuffer:
+    """Compact storage for testcases split into single bytes, shared between copies.
+
+    This implements the same interface as `_PartsBuffer`, but stores the parts as one
+    `bytes` object with a parallel string of 0/1 reducible flags. Counts of reducible
+    parts and fingerprints are only sampled every `BLOCK` bytes, so the buffer takes
+    about 2 bytes per part.
+    """
+
+    BLOCK = 512
+    __slots__ = ("data", "reducible", "_rank", "_fingerprints")
+
+    def __init__(self, data, reducible):
+        assert len(data) == len(reducible)
+        self.data = data if isinstance(data, memoryview) else bytes(data)
+        self.reducible = bytes(reducible)
+        # `_rank[i]` is the number of reducible parts in `data[:i * BLOCK]`, or None if
+        # all parts are reducible
+        self._rank = None
+        if 0 in self.reducible:
+            self._rank = array.array("q", [0])
+            self._rank.extend(
+                itertools.accumulate(
+                    self.reducible.count(1, pos, pos + self.BLOCK)
+                    for pos in range(0, len(self.reducible), self.BLOCK)
+                )
+            )
+        # built when first needed
+        self._fingerprints = None
+
+    def __len__(self):
+        return len(self.data)
+
+    def __reduce__(self):
+        # the counts and fingerprints are rebuilt, rather than pickled
+        return (type(self), (bytes(self.data), self.reducible))
+
+    def compact(self, pieces):
+        """Copy the parts in some ranges of the buffer to a new buffer, eg. so a
+        testcase can be saved without the parts it no longer uses.
+
+        Args:
+            pieces (list(tuple(int, int))): Ranges of the buffer to copy.
+
+        Returns:
+            _BytesBuffer: Buffer holding only those parts.
+        """
+        return type(self)(
+            b"".join(self.data[start:stop] for start, stop in pieces),
+            b"".join(self.reducible[start:stop] for start, stop in pieces),
+        )
+
+    def part_list(self, start, stop):
+        """Get the parts in a range of the buffer.
+
+        Args:
+            start (int): Range start index
+            stop (int): Range stop index
+
+        Returns:
+            list(bytes): `parts[start:stop]`
+        """
+        return [bytes(self.data[pos : pos + 1]) for pos in range(start, stop)]
+
+    def reducible_list(self, start, stop):
+        """Get the reducibility of the parts in a range of the buffer.
+
+        Args:
+            start (int): Range start index
+            stop (int): Range stop index
+
+        Returns:
+            list(bool): `reducible[start:stop]`
+        """
+        return [bool(flag) for flag in self.reducible[start:stop]]
+
+    def chunks(self, start, stop):
+        """Get the contents of a range of the buffer, for writing or hashing.
+
+        Args:
+            start (int): Range start index
+            stop (int): Range stop index
+
+        Returns:
+            iterable(bytes): Contents of `parts[start:stop]`
+        """
+        return (memoryview(self.data)[start:stop],)
+
+    def _rank_at(self, pos):
+        # number of reducible parts in `data[:pos]`
+        if self._rank is None:
+            return pos
+        block = pos // self.BLOCK
+        return self._rank[block] + self.reducible.count(1, block * self.BLOCK, pos)
+
+    def count(self, start, stop):
+        """Count the reducible parts in a range of the buffer.
+
+        Args:
+            start (int): Range start index
+            stop (int): Range stop index
+
+        Returns:
+            int: Number of reducible parts in `parts[start:stop]`
+        """
+        return self._rank_at(stop) - self._rank_at(start)
+
+    def fingerprint(self, start, stop):
+        """Fingerprint the contents of a range of the buffer.
+
+        Args:
+            start (int): Range start index
+            stop (int): Range stop index
+
+        Returns:
+            tuple(int, int): Length and fingerprint value of `parts[start:stop]`.
+        """
+        if self._fingerprints is None:
+            self._fingerprints = _DataFingerprints(self.data)
+        return self._fingerprints.fingerprint(start, stop)
+
+    def _search(self, index, fixed):
+        # find the position of the `index`th reducible (or fixed) part
+        low, high = 0, len(self.data)
+        while low < high:
+            mid = (low + high) // 2
+            found = self._rank_at(mid + 1)
+            if fixed:
+                found = mid + 1 - found
+            if found <= index:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def select(self, index):
+        """Find a reducible part by index.
+
+        Args:
+            index (int): Index of the part among the reducible parts in the buffer.
+
+        Returns:
+            int: Index of the part in `parts`.
+        """
+        if self._rank is None:
+            return index
+        return self._search(index, False)
+
+    def select_fixed(self, index):
+        """Find a non-reducible part by index.
+
+        Args:
+            index (int): Index of the part among the non-reducible parts in the
+                         buffer.
+
+        Returns:
+            int: Index of the part in `parts`.
+        """
+        return self._search(index, True)
+
+
+class _PieceIndex:
+    """Cumulative counts over the pieces of a testcase, shared by copies of the
+    testcase until the pieces change.
+    """
+
+    __slots__ = ("buffer", "pieces", "ranks", "offsets", "_lengths", "_hashes")
+
+    def __init__(self, buffer, pieces):
+        self.buffer = buffer
+        self.pieces = pieces
+        # `ranks[i]` is the number of reducible parts and `offsets[i]` is the number
+        # of parts before `pieces[i]`. Both have an extra entry at the end for the
+        # totals.
+        self.ranks = array.array("q", [0])
+        self.ranks.extend(
+            itertools.accumulate(buffer.count(start, stop) for start, stop in pieces)
+        )
+        self.offsets = array.array("q", [0])
+        self.offsets.extend(
+            itertools.accumulate(stop - start for start, stop in pieces)
+        )
+        # prefix byte lengths and fingerprints, built when first needed
+        self._lengths = None
+        self._hashes = None
+
+    def fingerprint(self, start, stop):
+        """Fingerprint the contents of a range of pieces.
+
+        Args:
+            start (int): Index of the first piece.
+            stop (int): Index after the last piece.
+
+        Returns:
+            tuple(int, int): Length and fingerprint value of `pieces[start:stop]`.
+        """
+        if self._hashes is None:
+            self._lengths = array.array("q", [0])
+            self._hashes = [0]
+            for piece_start, piece_stop in self.pieces:
+                length, value = self.buffer.fingerprint(piece_start, piece_stop)
+                self._lengths.append(self._lengths[-1] + length)
+                self._hashes.append(
+                    _fingerprint_concat(self._hashes[-1], value, length)
+                )
+        length = self._lengths[stop] - self._lengths[start]
+        value = (
+            self._hashes[stop] - (self._hashes[start] << (8 * length % 127))
+        ) % FINGERPRINT_MOD
+        return length, value
 
 
 class Testcase(abc.ABC):
@@ -24,13 +529,139 @@ class Testcase(abc.ABC):
     def __init__(self):
         self.before = b""
         self.after = b""
-        self.parts = []
+        # While a testcase is being split, `parts` and `reducible` are plain lists.
+        # Once it is copied or sliced, the lists are moved into a `_PartsBuffer` which
+        # is shared with the copies, and the contents of each testcase are a list of
+        # `(start, stop)` ranges into the buffer (`_pieces`). Accessing `parts` or
+        # `reducible` turns them back into lists.
+        self._parts = []
         # bool array with same length as `parts`
         # parts with a matchine `False` in `reducible` should
         # not be removed by the Strategy
-        self.reducible = []
+        self._reducible = []
+        self._buffer = None
+        self._pieces = None
+        # see `_piece_index()`
+        self._index = None
+        # length and fingerprint value of the pieces, if known
+        self._pieces_fp = None
         self.filename = None
         self.extension = None
+        # (st_dev, st_ino) of the file mapped by `load()`, which the parts of this
+        # testcase (or the testcase it was copied from) may refer to
+        self._mapped = None
+
+    @property
+    def parts(self):
+        """Get the parts of the testcase.
+
+        Returns:
+            list(bytes): Testcase parts.
+        """
+        self._unshare()
+        return self._parts
+
+    @parts.setter
+    def parts(self, value):
+        self._unshare()
+        self._parts = value
+
+    @property
+    def reducible(self):
+        """Get the reducibility of each part of the testcase.
+
+        Returns:
+            list(bool): Whether each part in `parts` can be removed.
+        """
+        self._unshare()
+        return self._reducible
+
+    @reducible.setter
+    def reducible(self, value):
+        self._unshare()
+        self._reducible = value
+
+    @property
+    def shared(self):
+        """Check whether the parts are stored in a buffer shared with copies. This is
+        the case after `copy()` or `rmslice()`, until `parts` or `reducible` are
+        accessed.
+
+        Returns:
+            bool: True if the parts are in a shared buffer.
+        """
+        return self._pieces is not None
+
+    def _share(self):
+        """Move the parts into a buffer which can be shared with copies."""
+        if self._pieces is None:
+            self._set_buffer(self._new_buffer(self._parts, self._reducible))
+
+    @staticmethod
+    def _new_buffer(parts, reducible):
+        """Create a buffer to share the parts of this testcase with copies.
+
+        Args:
+            parts (list(bytes)): Testcase parts.
+            reducible (list(bool)): Whether each part can be removed.
+
+        Returns:
+            _PartsBuffer: Buffer holding the given parts.
+        """
+        return _PartsBuffer(parts, reducible)
+
+    def _set_buffer(self, buffer):
+        """Replace the contents of the testcase with all the parts in a buffer.
+
+        Args:
+            buffer (_PartsBuffer): Buffer holding the testcase parts.
+        """
+        self._buffer = buffer
+        self._pieces = [(0, len(buffer))] if buffer else []
+        self._parts = self._reducible = None
+        self._index = self._pieces_fp = None
+
+    def _unshare(self):
+        """Copy the parts out of the shared buffer into lists."""
+        if self._pieces is not None:
+            self._parts = list(
+                itertools.chain.from_iterable(
+                    self._buffer.part_list(start, stop) for start, stop in self._pieces
+                )
+            )
+            self._reducible = list(
+                itertools.chain.from_iterable(
+                    self._buffer.reducible_list(start, stop)
+                    for start, stop in self._pieces
+                )
+            )
+            self._buffer = self._pieces = self._index = self._pieces_fp = None
+
+    def _iter_parts(self):
+        """Iterate over the contents of the testcase without copying the parts to a
+        list.
+
+        Returns:
+            iterable(bytes): Testcase contents, either as parts or larger chunks.
+        """
+        if self._pieces is None:
+            return self._parts
+        return itertools.chain.from_iterable(
+            self._buffer.chunks(start, stop) for start, stop in self._pieces
+        )
+
+    def _piece_index(self):
+        """Get the cumulative counts of reducible parts and parts before each piece.
+
+        The index is built when first needed after the pieces change, and shared by
+        copies of the testcase.
+
+        Returns:
+            _PieceIndex: Index of `self._pieces`.
+        """
+        if self._index is None:
+            self._index = _PieceIndex(self._buffer, self._pieces)
+        return self._index
 
     def __len__(self):
         """Length of the testcase in terms of parts to be reduced.
@@ -38,11 +669,30 @@ class Testcase(abc.ABC):
         Returns:
             int: length of parts
         """
-        return len(self.parts) - self.reducible.count(False)
+        if self._pieces is None:
+            return len(self._parts) - self._reducible.count(False)
+        return self._piece_index().ranks[-1]
+
+    def _locate(self, index):
+        """Find the piece containing a reducible part.
+
+        Args:
+            index (int): Index of the part among the reducible parts in the testcase.
+
+        Returns:
+            tuple(int, int): Index of the piece in `self._pieces`, and index of the
+                             part in the buffer.
+        """
+        ranks = self._piece_index().ranks
+        piece = bisect.bisect_right(ranks, index) - 1
+        piece_start = self._pieces[piece][0]
+        buf_rank = self._buffer.count(0, piece_start) + index - ranks[piece]
+        return piece, self._buffer.select(buf_rank)
 
     def _slice_xlat(self, start=None, stop=None):
         # translate slice bounds within `[0, len(self))` (excluding non-reducible parts)
         # to bounds within `self.parts`
+        self._share()
         len_self = len(self)
 
         def _clamp(bound, default):
@@ -54,13 +704,17 @@ class Testcase(abc.ABC):
                 return len_self
             return bound
 
-        start = _clamp(start, 0)
-        stop = _clamp(stop, len_self)
+        offsets = self._piece_index().offsets
 
-        opts = [i for i in range(len(self.parts)) if self.reducible[i]]
-        opts = [0] + opts[1:] + [len(self.parts)]
+        def _xlat(bound):
+            if bound == 0:
+                return 0
+            if bound == len_self:
+                return offsets[-1]
+            piece, pos = self._locate(bound)
+            return offsets[piece] + pos - self._pieces[piece][0]
 
-        return opts[start], opts[stop]
+        return _xlat(_clamp(start, 0)), _xlat(_clamp(stop, len_self))
 
     def rmslice(self, start, stop):
         """Remove a slice of the testcase between `self.parts[start:stop]`, preserving
@@ -69,41 +723,198 @@ class Testcase(abc.ABC):
         Slice indices are between 0 and len(self), which may not be = len(self.parts)
         if any parts are marked non-reducible.
 
+        This only updates the ranges of the shared buffer, so the cost depends on the
+        number of ranges and the number of non-reducible parts removed, not on the size
+        of the testcase. The fingerprint of the result is derived from the fingerprint
+        of the unchanged ranges, which is shared with other copies.
+
         Args:
             start (int): Slice start index
             stop (int): Slice stop index
         """
-        start, stop = self._slice_xlat(start, stop)
-        keep = [
-            x
-            for i, x in enumerate(self.parts[start:stop])
-            if not self.reducible[start + i]
-        ]
-        self.parts = self.parts[:start] + keep + self.parts[stop:]
-        self.reducible = (
-            self.reducible[:start] + ([False] * len(keep)) + self.reducible[stop:]
-        )
+        self._share()
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return
+        buf = self._buffer
+        index = self._piece_index()
+        first_piece, first = self._locate(start)
+        last_piece, last = self._locate(stop - 1)
+        pieces = self._pieces[:first_piece]
+        fp_len, fp_value = index.fingerprint(0, first_piece)
+
+        def _add(piece_start, piece_stop):
+            nonlocal fp_len, fp_value
+            if piece_start >= piece_stop:
+                return
+            piece_len, piece_value = buf.fingerprint(piece_start, piece_stop)
+            fp_value = _fingerprint_concat(fp_value, piece_value, piece_len)
+            fp_len += piece_len
+            if pieces and pieces[-1][1] == piece_start:
+                pieces[-1] = (pieces[-1][0], piece_stop)
+            else:
+                pieces.append((piece_start, piece_stop))
+
+        for piece in range(first_piece, last_piece + 1):
+            piece_start, piece_stop = self._pieces[piece]
+            # range of the buffer to remove reducible parts from
+            rm_start = first if piece == first_piece else piece_start
+            rm_stop = last + 1 if piece == last_piece else piece_stop
+            _add(piece_start, rm_start)
+            # keep any non-reducible parts in between
+            fixed_base = rm_start - buf.count(0, rm_start)
+            fixed = (rm_stop - rm_start) - buf.count(rm_start, rm_stop)
+            for idx in range(fixed_base, fixed_base + fixed):
+                pos = buf.select_fixed(idx)
+                _add(pos, pos + 1)
+            _add(rm_stop, piece_stop)
+        suffix_len, suffix_value = index.fingerprint(last_piece + 1, len(self._pieces))
+        fp_value = _fingerprint_concat(fp_value, suffix_value, suffix_len)
+        fp_len += suffix_len
+        if last_piece + 1 < len(self._pieces):
+            # merge the first unchanged piece if needed
+            suffix_start, suffix_stop = self._pieces[last_piece + 1]
+            if pieces and pieces[-1][1] == suffix_start:
+                pieces[-1] = (pieces[-1][0], suffix_stop)
+            else:
+                pieces.append((suffix_start, suffix_stop))
+            pieces.extend(self._pieces[last_piece + 2 :])
+        self._pieces = pieces
+        self._index = None
+        self._pieces_fp = (fp_len, fp_value)
 
     def copy(self):
         """Duplicate the current object.
 
+        The copy shares the parts buffer with the original, so this does not depend
+        on the size of the testcase.
+
         Returns:
             type(self): A new object with the same type & contents of the original.
         """
+        self._share()
+        new = type(self)()
+        new.before = self.before
+        new.after = self.after
+        new._parts = new._reducible = None  # pylint: disable=protected-access
+        new._buffer = self._buffer  # pylint: disable=protected-access
+        new._pieces = list(self._pieces)  # pylint: disable=protected-access
+        new._index = self._index  # pylint: disable=protected-access
+        new._pieces_fp = self._pieces_fp  # pylint: disable=protected-access
+        new.filename = self.filename
+        new.extension = self.extension
+        new._mapped = self._mapped  # pylint: disable=protected-access
+        return new
+
+    def empty_copy(self):
+        """Create an empty testcase of the same type for the same file, eg. to split
+        modified contents of this testcase.
+
+        Returns:
+            type(self): A new object with the same type, file and before/after as the
+                        original, and no parts.
+        """
         new = type(self)()
         new.before = self.before
         new.after = self.after
-        new.parts = self.parts[:]
-        new.reducible = self.reducible[:]
         new.filename = self.filename
         new.extension = self.extension
+        new._mapped = self._mapped  # pylint: disable=protected-access
         return new
 
-    def load(self, path):
+    def hexdigest(self):
+        """Hash the contents of the testcase, including before/after since different
+        testcase types may split them inconsistently.
+
+        Returns:
+            str: SHA-512 hex digest of the testcase contents.
+        """
+        tc_hash = hashlib.sha512()
+        tc_hash.update(self.before)
+        for part in self._iter_parts():
+            tc_hash.update(part)
+        tc_hash.update(self.after)
+        return tc_hash.hexdigest()
+
+    def to_bytes(self):
+        """Get the contents of the testcase, as written by `dump()`.
+
+        Returns:
+            bytes: Testcase contents.
+        """
+        return b"".join(
+            itertools.chain((self.before,), self._iter_parts(), (self.after,))
+        )
+
+    def fingerprint(self):
+        """Fingerprint the contents of the testcase, including before/after.
+
+        This is much cheaper than `hexdigest()` for copies sliced using `rmslice()`,
+        since the fingerprint of each range of the shared buffer is computed from
+        cached prefix values, but it is not collision resistant.
+
+        Returns:
+            tuple(int, int): Length and fingerprint value of the testcase contents.
+        """
+        length = len(self.before)
+        value = int.from_bytes(self.before, "big") % FINGERPRINT_MOD
+        if self._pieces is None:
+            for part in self._parts:
+                value = _fingerprint_concat(
+                    value, int.from_bytes(part, "big"), len(part)
+                )
+                length += len(part)
+        else:
+            if self._pieces_fp is None:
+                self._pieces_fp = self._piece_index().fingerprint(0, len(self._pieces))
+            pieces_len, pieces_value = self._pieces_fp
+            value = _fingerprint_concat(value, pieces_value, pieces_len)
+            length += pieces_len
+        value = _fingerprint_concat(
+            value, int.from_bytes(self.after, "big"), len(self.after)
+        )
+        return length + len(self.after), value
+
+    def snapshot(self):
+        """Get the contents of the testcase in a form which can be pickled, eg. for a
+        checkpoint (see `restore()`).
+
+        The parts are copied from the shared buffer into a new buffer of the same
+        kind, so testcases split into bytes or lines are stored without creating an
+        object for each part, and without the parts which were removed.
+
+        Returns:
+            dict: Snapshot of the testcase contents.
+        """
+        self._share()
+        return {
+            "before": self.before,
+            "after": self.after,
+            "buffer": self._buffer.compact(self._pieces),
+        }
+
+    def restore(self, snapshot):
+        """Replace the contents of the testcase with a snapshot.
+
+        Args:
+            snapshot (dict): Result of `snapshot()`.
+        """
+        self.before = snapshot["before"]
+        self.after = snapshot["after"]
+        self._set_buffer(snapshot["buffer"])
+
+    def load(self, path, map_file=False):
         """Load and split a testcase from disk.
 
         Args:
             path (Path or str): Location on disk of testcase to read.
+            map_file (bool): Map the file into memory instead of reading it, so only
+                             the parts of it which are used get loaded. The file must
+                             not be modified in place while this testcase (or a copy
+                             of it) is used: reading a part which was truncated
+                             kills the process with SIGBUS. `dump()` replaces the
+                             file instead. Ignored on Windows, and for files with
+                             other hard links.
 
         Raises:
             LithiumError: DDBEGIN/DDEND token mismatch.
@@ -113,37 +924,102 @@ class Testcase(abc.ABC):
         self.extension = os.path.splitext(self.filename)[1]
 
         with open(self.filename, "rb") as fileobj:
-            before = []
-            for line in fileobj:
-                before.append(line)
-                if line.find(b"DDBEGIN") != -1:
-                    self.before = b"".join(before)
-                    del before
-                    break
-                if line.find(b"DDEND") != -1:
-                    raise LithiumError(
-                        "The testcase (%s) has a line containing 'DDEND' "
-                        "without a line containing 'DDBEGIN' before it."
-                        % (self.filename,)
-                    )
+            stat = os.fstat(fileobj.fileno())
+            if (
+                map_file
+                and platform.system() != "Windows"
+                and stat.st_size > 0
+                and stat.st_nlink == 1
+            ):
+                # `dump()` replaces the file instead of writing to it, so the mapping
+                # remains valid. This isn't possible on Windows since a file can't be
+                # replaced while it is mapped, and files with other hard links are
+                # read so they can be written in place.
+                data = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+                self._mapped = (stat.st_dev, stat.st_ino)
             else:
-                # no DDBEGIN/END, `before` contains the whole testcase
-                self.split_parts(b"".join(before))
-                return
+                data = fileobj.read()
+        view = memoryview(data)
+
+        begin = data.find(b"DDBEGIN")
+        end = data.find(b"DDEND")
+        if end != -1 and (begin == -1 or end <= data.rfind(b"\n", 0, begin)):
+            raise LithiumError(
+                "The testcase (%s) has a line containing 'DDEND' "
+                "without a line containing 'DDBEGIN' before it." % (self.filename,)
+            )
+        if begin == -1:
+            # no DDBEGIN/END, the whole testcase is reducible
+            self._split_data(view)
+            return
+
+        # DDBEGIN/END lines are included in before/after
+        between_start = data.find(b"\n", begin) + 1 or len(data)
+        end = data.find(b"DDEND", between_start)
+        if end == -1:
+            raise LithiumError(
+                "The testcase (%s) has a line containing 'DDBEGIN' "
+                "but no line containing 'DDEND'." % (self.filename,)
+            )
+        between_end = data.rfind(b"\n", between_start, end) + 1 or between_start
+        self.before = bytes(view[:between_start])
+        self.after = bytes(view[between_end:])
+        self._split_data(view[between_start:between_end])
+
+    def _split_data(self, data):
+        """Split testcase data which was loaded from disk.
+
+        By default, this calls `split_parts()` with a copy of the data. Testcase
+        types which can refer to `data` directly should override this.
 
-            between = []
-            for line in fileobj:
-                if line.find(b"DDEND") != -1:
-                    self.after = line + fileobj.read()
-                    break
+        Args:
+            data (memoryview): Input read from the testcase file
+                               (between DDBEGIN/END, if present). This may refer to
+                               a memory-mapped file.
+        """
+        self.split_parts(bytes(data))
 
-                between.append(line)
+    def split_from(self, other):
+        """Split the contents of another testcase into parts of this testcase type,
+        without reading the file again. Parts of `other` which are not reducible are
+        kept as they are. This testcase should be empty.
+
+        Args:
+            other (Testcase): Testcase to split (eg. the result of reducing by lines).
+        """
+        self.filename = other.filename
+        self.extension = other.extension
+        self.before = other.before
+        self.after = other.after
+        self._mapped = other._mapped  # pylint: disable=protected-access
+        groups = [
+            (reducible, b"".join(part for part, _ in group))
+            for reducible, group in itertools.groupby(
+                zip(other.parts, other.reducible), key=lambda part: part[1]
+            )
+        ]
+        groups, self.after = self._split_groups(groups, self.after)
+        for reducible, data in groups:
+            if reducible:
+                self.split_parts(data)
             else:
-                raise LithiumError(
-                    "The testcase (%s) has a line containing 'DDBEGIN' "
-                    "but no line containing 'DDEND'." % (self.filename,)
-                )
-            self.split_parts(b"".join(between))
+                self.parts.append(data)
+                self.reducible.append(False)
+
+    @staticmethod
+    def _split_groups(groups, after):
+        """Adjust the contents of another testcase before `split_from()` splits them.
+
+        Args:
+            groups (list(tuple(bool, bytes))): Whether each run of parts is reducible,
+                                               and its contents.
+            after (bytes): Contents after the reducible parts.
+
+        Returns:
+            tuple(list(tuple(bool, bytes)), bytes): The groups to split, and the
+                                                    contents after them.
+        """
+        return groups, after
 
     @staticmethod
     def add_arguments(parser):
@@ -179,10 +1055,47 @@ class Testcase(abc.ABC):
             path = self.filename
         else:
             path = str(path)
-        with open(path, "wb") as fileobj:
-            fileobj.write(self.before)
-            fileobj.writelines(self.parts)
-            fileobj.write(self.after)
+        # if `path` is a symlink, the file it points to is replaced
+        real_path = os.path.realpath(path)
+        try:
+            stat = os.stat(real_path)
+        except OSError:
+            stat = None
+        if stat is None or (stat.st_dev, stat.st_ino) != self._mapped:
+            with open(path, "wb") as fileobj:
+                self._write(fileobj)
+            return
+        # `path` was memory-mapped by `load()`, and testcases may still refer to it, so
+        # it must not be modified. Write a new file and replace it instead.
+        fileobj = tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(real_path),
+            prefix=os.path.basename(real_path),
+            suffix=".tmp",
+            delete=False,
+        )
+        try:
+            with fileobj:
+                self._write(fileobj)
+            shutil.copymode(real_path, fileobj.name)
+            try:
+                os.chown(fileobj.name, stat.st_uid, stat.st_gid)
+            except PermissionError:
+                # only root can give files to other users
+                pass
+            os.replace(fileobj.name, real_path)
+        except BaseException:
+            os.unlink(fileobj.name)
+            raise
+
+    def _write(self, fileobj):
+        """Write the testcase contents to an open file.
+
+        Args:
+            fileobj (file): Binary file object to write to.
+        """
+        fileobj.write(self.before)
+        fileobj.writelines(self._iter_parts())
+        fileobj.write(self.after)
 
 
 class TestcaseLine(Testcase):
@@ -203,6 +1116,14 @@ class TestcaseLine(Testcase):
         added = len(self.parts) - orig
         self.reducible.extend([True] * added)
 
+    def _split_data(self, data):
+        # find line boundaries the same way as `bytes.splitlines()`
+        offsets = array.array("q", [0])
+        offsets.extend(match.end() for match in re.finditer(br"\r\n?|\n", data))
+        if offsets[-1] != len(data):
+            offsets.append(len(data))
+        self._set_buffer(_SpansBuffer(data, offsets, b"\x01" * (len(offsets) - 1)))
+
 
 class TestcaseChar(Testcase):
     """Testcase file split by bytes."""
@@ -211,16 +1132,42 @@ class TestcaseChar(Testcase):
     args = ("-c", "--char")
     arg_help = "Treat the file as a sequence of bytes."
 
-    def load(self, path):
-        super().load(path)
-        if (self.before or self.after) and self.parts:
+    def load(self, path, map_file=False):
+        super().load(path, map_file=map_file)
+        self._share()
+        if (self.before or self.after) and self._pieces:
             # Move the line break at the end of the last line out of the reducible
             # part so the "DDEND" line doesn't get combined with another line.
-            self.parts.pop()
-            self.reducible.pop()
+            start, stop = self._pieces.pop()
+            if stop - 1 > start:
+                self._pieces.append((start, stop - 1))
+            self._index = self._pieces_fp = None
             self.after = b"\n" + self.after
 
+    @staticmethod
+    def _split_groups(groups, after):
+        if after and groups and groups[-1][0] and groups[-1][1].endswith(b"\n"):
+            # As in `load()`, move the final line break out of the reducible parts.
+            groups[-1] = (True, groups[-1][1][:-1])
+            after = b"\n" + after
+        return groups, after
+
+    @staticmethod
+    def _new_buffer(parts, reducible):
+        data = b"".join(parts)
+        if len(data) == len(parts):
+            # every part is a single byte
+            return _BytesBuffer(data, bytes(reducible))
+        return Testcase._new_buffer(parts, reducible)
+
+    def _split_data(self, data):
+        self._set_buffer(_BytesBuffer(data, b"\x01" * len(data)))
+
     def split_parts(self, data):
+        if not self.shared and not self._parts:
+            # store the bytes directly, without making a list of parts
+            self._set_buffer(_BytesBuffer(data, b"\x01" * len(data)))
+            return
         orig = len(self.parts)
         self.parts.extend(data[i : i + 1] for i in range(len(data)))
         added = len(self.parts) - orig
@@ -18,6 +18,20 @@ def summary_header():
     LOG.info("=== LITHIUM SUMMARY ===")
 
 
+def bracket_balance(data, pair):
+    """Count how many more opening than closing brackets some data contains.
+
+    Args:
+        data (bytes): Data to check.
+        pair (bytes): Opening and closing bracket (eg. b"{}").
+
+    Returns:
+        int: Number of opening brackets minus the number of closing brackets.
+    """
+    assert len(pair) == 2
+    return data.count(pair[:1]) - data.count(pair[1:])
+
+
 def divide_rounding_up(numerator, denominator):
     """Integer division, but always rounded up.
 
@@ -0,0 +1,163 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Persistent store of interestingness results.
+
+Verdicts are keyed by the testcase contents and the condition script and args used to
+evaluate it, so they can be reused when a reduction is restarted.
+"""
+
+import collections
+import hashlib
+import logging
+import sqlite3
+
+LOG = logging.getLogger(__name__)
+
+# Define struct that contains a cached interestingness result.
+Verdict = collections.namedtuple("Verdict", "interesting, runtime, status")
+
+
+class VerdictCache:
+    """On-disk cache of interestingness results, bounded to `max_entries`.
+
+    When the cache is full, the least recently used entries are evicted. Entries are
+    ordered by a counter which increases each time one is used. Uses found by `get()`
+    are only written by the next `put()` or `close()`.
+    """
+
+    EVICT_FRACTION = 0.1
+
+    def __init__(self, path, max_entries=100000):
+        """Open (or create) a verdict cache.
+
+        Args:
+            path (str or Path): Location of the cache database on disk.
+            max_entries (int): Number of verdicts to keep.
+        """
+        assert max_entries > 0
+        self.max_entries = max_entries
+        self.hits = 0
+        self._db = sqlite3.connect(str(path))
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            "key TEXT PRIMARY KEY, "
+            "interesting INTEGER NOT NULL, "
+            "runtime REAL, "
+            "status TEXT, "
+            "last_used INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)"
+        )
+        self._db.commit()
+        self._count = self._db_count()
+        last_used = self._db.execute("SELECT MAX(last_used) FROM verdicts").fetchone()
+        self._clock = int(last_used[0] or 0)
+        # last use of the entries found by `get()`, not written yet
+        self._used = {}
+
+    def _db_count(self):
+        return self._db.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    @staticmethod
+    def key(condition_script, condition_args, tc_hash):
+        """Calculate the cache key for a testcase evaluated by a condition.
+
+        Args:
+            condition_script (module): Interestingness test.
+            condition_args (list(str)): Arguments to the interestingness test.
+            tc_hash (str): Testcase hash (see `Testcase.hexdigest()`).
+
+        Returns:
+            str: Cache key.
+        """
+        condition = getattr(
+            condition_script,
+            "__file__",
+            getattr(condition_script, "__name__", type(condition_script).__name__),
+        )
+        key = hashlib.sha512()
+        key.update(repr((condition, list(condition_args))).encode("utf-8"))
+        key.update(tc_hash.encode("ascii"))
+        return key.hexdigest()
+
+    def get(self, key):
+        """Look up a verdict.
+
+        Args:
+            key (str): Cache key (see `key()`).
+
+        Returns:
+            Verdict or None: The cached verdict, if any.
+        """
+        row = self._db.execute(
+            "SELECT interesting, runtime, status FROM verdicts WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._used[key] = self._tick()
+        self.hits += 1
+        return Verdict(bool(row[0]), row[1], row[2])
+
+    def put(self, key, interesting, runtime=None, status=None):
+        """Store a verdict.
+
+        Args:
+            key (str): Cache key (see `key()`).
+            interesting (bool): Interestingness result.
+            runtime (float): Time taken to evaluate the testcase, in seconds.
+            status (str): Description of how the target exited, if known.
+        """
+        self._write_used()
+        if key not in self:
+            self._count += 1
+        self._db.execute(
+            "INSERT OR REPLACE INTO verdicts "
+            "(key, interesting, runtime, status, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, int(interesting), runtime, status, self._tick()),
+        )
+        if self._count > self.max_entries:
+            self._evict()
+        self._db.commit()
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def _write_used(self):
+        """Record the uses found by `get()` in the database, without committing."""
+        if self._used:
+            self._db.executemany(
+                "UPDATE verdicts SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in self._used.items()],
+            )
+            self._used.clear()
+
+    def _evict(self):
+        """Remove the least recently used verdicts to make room for new ones."""
+        target = self.max_entries - max(int(self.max_entries * self.EVICT_FRACTION), 1)
+        excess = self._count - max(target, 0)
+        self._db.execute(
+            "DELETE FROM verdicts WHERE key IN "
+            "(SELECT key FROM verdicts ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        LOG.debug("evicted %d verdicts from the cache", excess)
+        self._count -= excess
+
+    def __contains__(self, key):
+        row = self._db.execute(
+            "SELECT 1 FROM verdicts WHERE key = ?", (key,)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        """Record the uses found by `get()`, and close the cache database."""
+        self._write_used()
+        self._db.commit()
+        self._db.close()
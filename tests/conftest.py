@@ -62,3 +62,60 @@ def tmp_cwd(tmp_path):
 def examples_path():
     """Path to the lithium examples folder"""
     yield Path(__file__).parent.parent / "src" / "lithium" / "docs" / "examples"
+
+
+def _line_testcase(data):
+    testcase = lithium.testcases.TestcaseLine()
+    testcase.split_parts(data)
+    return testcase
+
+
+@pytest.fixture
+def line_testcase():
+    """Factory for line testcases split from bytes"""
+    yield _line_testcase
+
+
+class _RecordingCondition:
+    """Condition script which records the contents of each testcase tested, and
+    decides whether it is interesting with a predicate."""
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+        self.tested = []
+
+    def interesting(self, condition_args, _temp_prefix):
+        """Record the testcase (the last condition argument), and check it.
+
+        Args:
+            condition_args (list): Arguments of the condition.
+            _temp_prefix (str): Temporary directory prefix.
+
+        Returns:
+            bool: Result of the predicate for the testcase contents.
+        """
+        data = Path(condition_args[-1]).read_bytes()
+        self.tested.append(data)
+        return self.predicate(data)
+
+
+@pytest.fixture
+def recording_condition():
+    """Factory for condition scripts which record the testcases they are given"""
+    yield _RecordingCondition
+
+
+def _line_lithium(condition, test_path):
+    lith = lithium.Lithium()
+    lith.condition_script = condition
+    lith.condition_args = [str(test_path)]
+    lith.strategy = lithium.strategies.Minimize()
+    lith.testcase = lithium.testcases.TestcaseLine()
+    lith.testcase.load(test_path)
+    return lith
+
+
+@pytest.fixture
+def line_lithium():
+    """Factory for a line by line minimization of a file with a condition script"""
+    yield _line_lithium
@@ -0,0 +1,103 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Lithium artifact retention tests"""
+
+from pathlib import Path
+
+import pytest
+
+from lithium.artifacts import Artifacts, ArtifactStore, RetentionPolicy
+
+pytestmark = pytest.mark.usefixtures("tmp_cwd")  # pylint: disable=invalid-name
+
+
+@pytest.mark.parametrize(
+    "spec, error",
+    [
+        ("all", None),
+        ("none", None),
+        ("interesting", None),
+        ("last:3", None),
+        ("every:10", None),
+        ("some", "unknown retention mode"),
+        ("last", "requires a count"),
+        ("every:0", "must be at least 1"),
+        ("none:2", "doesn't take a count"),
+    ],
+)
+def test_policy_parse(spec, error):
+    """test parsing retention policies"""
+    if error is None:
+        assert str(RetentionPolicy.parse(spec)) == spec
+    else:
+        with pytest.raises(ValueError, match=error):
+            RetentionPolicy.parse(spec)
+
+
+@pytest.mark.parametrize(
+    "spec, expected",
+    [
+        ("all", ["1-boring", "2-interesting", "3-boring", "4-boring", "5-interesting"]),
+        ("none", []),
+        ("interesting", ["2-interesting", "5-interesting"]),
+        ("last:2", ["4-boring", "5-interesting"]),
+        ("every:2", ["2-interesting", "4-boring"]),
+    ],
+)
+@pytest.mark.parametrize("store", [False, True])
+def test_retention(spec, expected, store, line_testcase):
+    """test that artifacts are kept according to the retention policy"""
+    artifacts = Artifacts(
+        RetentionPolicy.parse(spec), ArtifactStore(Path("store")) if store else None
+    )
+    for number, inter in enumerate([False, True, False, False, True], start=1):
+        name = "%d-%s" % (number, "interesting" if inter else "boring")
+        artifacts.save(line_testcase(b"%d\n" % (number,)), Path(name), inter)
+    if store:
+        assert sorted(artifacts.store) == expected
+        for name in expected:
+            assert artifacts.store.get(name) == name.split("-")[0].encode() + b"\n"
+    else:
+        assert sorted(path.name for path in Path(".").iterdir()) == expected
+    artifacts.close()
+
+
+def test_store_dedupe(line_testcase):
+    """test that identical testcases are stored once"""
+    store = ArtifactStore(Path("store"))
+    digest = store.put("1-boring.txt", line_testcase(b"a\nb\n"))
+    assert store.put("2-boring.txt", line_testcase(b"a\nb\n")) == digest
+    other = store.put("3-interesting.txt", line_testcase(b"a\n"))
+    assert other != digest
+    objects = sorted(Path("store/objects").glob("*/*.gz"))
+    assert len(objects) == 2
+    store.remove("1-boring.txt")
+    assert len(list(Path("store/objects").glob("*/*.gz"))) == 2
+    store.remove("2-boring.txt")
+    assert len(list(Path("store/objects").glob("*/*.gz"))) == 1
+    store.close()
+    # the index is reloaded when the store is reopened
+    store = ArtifactStore(Path("store"))
+    assert list(store) == ["3-interesting.txt"]
+    assert store.get("3-interesting.txt") == b"a\n"
+    store.close()
+
+
+def test_lithium_artifacts(line_lithium, recording_condition):
+    """test the retention policy is used by a reduction"""
+    test_path = Path("a.txt")
+    test_path.write_bytes(b"x\nx\no\nx\n")
+
+    condition = recording_condition(lambda data: b"o\n" in data)
+    lith = line_lithium(condition, test_path)
+    lith.retention = RetentionPolicy.parse("interesting")
+    lith.artifact_store = True
+    assert lith.run() == 0
+    assert test_path.read_bytes() == b"o\n"
+    store = ArtifactStore(lith.temp_dir / "artifacts")
+    assert store
+    assert all(name.endswith("-interesting.txt") for name in store)
+    assert not list(lith.temp_dir.glob("*-boring.txt"))
+    store.close()
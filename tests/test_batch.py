@@ -0,0 +1,67 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Lithium batch reduction tests"""
+
+from pathlib import Path
+
+import pytest
+
+from lithium import batch
+
+pytestmark = pytest.mark.usefixtures("tmp_cwd")  # pylint: disable=invalid-name
+
+# condition script which keeps "o" lines, and records how many tests run at once
+CONDITION = """
+import threading
+import time
+
+LOCK = threading.Lock()
+RUNNING = [0]
+MOST = [0]
+
+def interesting(args, _temp_prefix):
+    with LOCK:
+        RUNNING[0] += 1
+        MOST[0] = max(MOST[0], RUNNING[0])
+    try:
+        time.sleep(0.01)
+        with open(args[0], "rb") as test_fp:
+            return b"o" in test_fp.read().split()
+    finally:
+        with LOCK:
+            RUNNING[0] -= 1
+"""
+
+
+def test_read_jobs():
+    """test parsing job lines"""
+    lines = ["# comment\n", "\n", "--char crashes 'a b.js'\n", "  x.py a.js  \n"]
+    assert list(batch.read_jobs(lines)) == [
+        ["--char", "crashes", "a b.js"],
+        ["x.py", "a.js"],
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch(workers, caplog):
+    """test that a batch reduces every testcase, with no more than `workers` tests
+    running at once"""
+    module = "batch_cond%d" % (workers,)
+    Path(module + ".py").write_text(CONDITION)
+    jobs = []
+    for number in range(6):
+        test_path = Path("%d.txt" % (number,))
+        test_path.write_bytes(b"x\n" * number + b"o\nx\n")
+        jobs.append("%s %s\n" % (module, test_path))
+    jobs.append("--no-such-option %s 0.txt\n" % (module,))
+    Path("jobs.txt").write_text("".join(jobs))
+    assert batch.main(["--workers", str(workers), "--active", "4", "jobs.txt"]) == 1
+    for number in range(6):
+        assert Path("%d.txt" % (number,)).read_bytes() == b"o\n"
+    condition = __import__(module)
+    # whether tests actually overlap depends on timing, only the limit is checked
+    assert 1 <= condition.MOST[0] <= workers
+    assert "Jobs: 7, failed: 1" in caplog.text
+    assert "invalid job: --no-such-option" in caplog.text
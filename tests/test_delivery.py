@@ -0,0 +1,113 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Lithium attempt delivery tests"""
+
+import os
+import platform
+import sys
+from pathlib import Path
+
+import pytest
+
+import lithium
+from lithium.delivery import MemfdDelivery, TmpfsDelivery
+
+pytestmark = pytest.mark.usefixtures("tmp_cwd")  # pylint: disable=invalid-name
+
+# print the files given, or stdin
+CAT_CMD = [
+    sys.executable,
+    "-c",
+    "import sys;"
+    "[sys.stdout.buffer.write(open(a, 'rb').read()) for a in sys.argv[1:]]"
+    " or sys.stdout.buffer.write(sys.stdin.buffer.read())",
+]
+NO_MEMFD = not hasattr(os, "memfd_create") or platform.system() != "Linux"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+@pytest.mark.parametrize(
+    "deliver, testcase_arg",
+    [
+        ("stdin", True),
+        ("stdin", False),
+        pytest.param("memfd", True, marks=pytest.mark.skipif(NO_MEMFD, reason="Linux")),
+        ("tmpfs", True),
+    ],
+)
+def test_deliver(monkeypatch, deliver, testcase_arg, jobs):
+    """test reducing without rewriting the testcase file"""
+    test_path = Path("a.txt")
+    test_path.write_bytes(b"a\nb\nboom\nc\n")
+    written = []
+    dump = lithium.testcases.TestcaseLine.dump
+
+    def _dump(testcase, path=None):
+        written.append(path)
+        dump(testcase, path)
+
+    monkeypatch.setattr(lithium.testcases.TestcaseLine, "dump", _dump)
+    args = ["--deliver", deliver, "--jobs", str(jobs), "--keep-artifacts", "none"]
+    if not testcase_arg:
+        args.extend(["--testcase", "a.txt"])
+    args.extend(["outputs", "boom"] + CAT_CMD)
+    if testcase_arg:
+        args.append("a.txt")
+    lith = lithium.Lithium()
+    assert lith.main(args) == 0
+    assert test_path.read_bytes() == b"boom\n"
+    assert lith.test_count > 2
+    # the testcase is only written with the result
+    assert [path for path in written if path is None or Path(path) == test_path]
+    assert len([path for path in written if path is None]) <= 2
+    assert all(path is None or Path(path).parent == lith.temp_dir for path in written)
+
+
+def test_deliver_args():
+    """test that --deliver needs the testcase in the condition args"""
+    Path("a.txt").write_bytes(b"boom\n")
+    lith = lithium.Lithium()
+    with pytest.raises(SystemExit):
+        lith.process_args(
+            ["--deliver", "tmpfs", "--testcase", "a.txt", "outputs", "boom"] + CAT_CMD
+        )
+    with pytest.raises(SystemExit):
+        lith.process_args(
+            ["--deliver", "stdin", "--remote", "localhost:1", "outputs", "boom"]
+            + CAT_CMD
+            + ["a.txt"]
+        )
+
+
+@pytest.mark.skipif(NO_MEMFD, reason="Linux only")
+def test_memfd():
+    """test that each slot has its own in-memory file"""
+    delivery = MemfdDelivery()
+    try:
+        with delivery.deliver(b"long data", 1) as path1:
+            with delivery.deliver(b"x", 2) as path2:
+                assert path1 != path2
+                assert Path(path1).read_bytes() == b"long data"
+                assert Path(path2).read_bytes() == b"x"
+        with delivery.deliver(b"short", 1) as path:
+            assert path == path1
+            assert Path(path).read_bytes() == b"short"
+    finally:
+        delivery.close()
+
+
+def test_tmpfs(tmp_path):
+    """test that each slot has its own copy of the testcase"""
+    delivery = TmpfsDelivery("dir/test.js", str(tmp_path))
+    try:
+        with delivery.deliver(b"a", 1) as path1:
+            with delivery.deliver(b"b", 2) as path2:
+                assert path1 != path2
+                assert Path(path1).name == Path(path2).name == "test.js"
+                assert Path(path1).read_bytes() == b"a"
+                assert Path(path2).read_bytes() == b"b"
+    finally:
+        delivery.close()
+    assert not Path(path1).exists()
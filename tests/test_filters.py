@@ -0,0 +1,66 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Lithium pre-oracle filter tests"""
+
+from pathlib import Path
+
+import pytest
+
+import lithium
+from lithium.filters import BalancedBrackets, PythonValidator
+
+pytestmark = pytest.mark.usefixtures("tmp_cwd")  # pylint: disable=invalid-name
+
+
+@pytest.mark.parametrize(
+    "original, attempt, expected",
+    [
+        (b"f(a[0]) {\n}\n", b"f(a[0]) {\n}\n", True),
+        (b"f(a[0]) {\n}\n", b"f(a[0]) {\n", False),
+        (b"f(a[0]) {\n}\n", b"}\n", False),
+        (b"x = [\n1,\n];\n", b"x = [\n];\n", True),
+        (b"x = [\n1,\n];\n", b"x = [\n1,\n", False),
+        # the original doesn't have to be balanced
+        (b"{\n{\nx\n}\n", b"{\n{\n}\n", True),
+        (b"{\n{\nx\n}\n", b"{\nx\n}\n", False),
+    ],
+)
+def test_balanced(original, attempt, expected, line_testcase):
+    """test the balanced brackets filter"""
+    test_filter = BalancedBrackets()
+    test_filter.start(line_testcase(original))
+    assert test_filter.accept(line_testcase(attempt)) == expected
+
+
+def test_validator(line_testcase):
+    """test a Python validator filter"""
+    Path("even_x.py").write_text(
+        "def validate(data):\n    return data.count(b'x') % 2 == 0\n"
+    )
+    test_filter = PythonValidator("even_x.py")
+    assert test_filter.name == "even_x.py"
+    assert test_filter.accept(line_testcase(b"x\nx\n"))
+    assert not test_filter.accept(line_testcase(b"x\n"))
+
+
+def test_lithium_filters(caplog, recording_condition):
+    """test that attempts rejected by filters aren't tested"""
+    test_path = Path("a.js")
+    test_path.write_bytes(b"a;\nif (x) {\nb;\nboom;\nc;\n}\nd;\n")
+    Path("keep_d.py").write_text("def validate(data):\n    return b'd;' in data\n")
+    condition = recording_condition(lambda data: b"boom" in data)
+    lith = lithium.Lithium()
+    lith.process_args(
+        ["--filter", "balanced", "--validator", "keep_d.py", "crashes", "a.js"]
+    )
+    lith.condition_script = condition
+    assert lith.run() == 0
+    assert test_path.read_bytes() == b"if (x) {\nboom;\n}\nd;\n"
+    assert lith.filtered_count > 0
+    assert lith.test_count == len(condition.tested)
+    for data in condition.tested:
+        assert data.count(b"{") == data.count(b"}")
+        assert b"d;" in data
+    assert "Attempts rejected by filters: %d" % (lith.filtered_count,) in caplog.text
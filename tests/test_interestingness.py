@@ -4,11 +4,15 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """Lithium interestingness-test tests"""
 
+import argparse
+import asyncio
 import logging
+import os
 import platform
 import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
@@ -189,6 +193,89 @@ def test_diff_test_1():
     assert lith.test_count == 1
 
 
+@pytest.mark.parametrize(
+    "a_args, b_args, sleep, expected",
+    [("-B", "-O", "30", 0), ("-B", "-B", "0", 1)],
+)
+def test_diff_test_stream(a_args, b_args, sleep, expected):
+    """test that 'diff_test' stops both runs once their output differs"""
+    lith = lithium.Lithium()
+    cmd = [
+        sys.executable,
+        "-c",
+        "import sys,time;"
+        "print(sys.flags.optimize, flush=True);"
+        "time.sleep(int(sys.argv[1]))",
+    ]
+
+    start_time = time.time()
+    result = lith.main(
+        [
+            "--strategy",
+            "check-only",
+            "--testcase",
+            "temp.js",
+            "diff_test",
+            "--timeout",
+            "60",
+            "--a-args=" + a_args,
+            "--b-args=" + b_args,
+        ]
+        + cmd
+        + [sleep]
+    )
+    assert result == expected
+    assert time.time() - start_time < 30
+
+
+def test_diff_test_repeat_cancel(caplog):
+    """test that 'repeat' stops the runs of 'diff_test' once one repetition is
+    interesting
+    """
+    lith = lithium.Lithium()
+    cmd = [
+        sys.executable,
+        "-c",
+        "import sys,time;"
+        "print(sys.flags.optimize if sys.argv[1] == '2' else 0, flush=True);"
+        "time.sleep(0 if sys.argv[1] == '2' else 30)",
+    ]
+
+    caplog.clear()
+    start_time = time.time()
+    result = lith.main(
+        ["--strategy", "check-only", "--testcase", "temp.js"]
+        + ["repeat", "--parallel", "4", "8", "diff_test", "--timeout", "60"]
+        + ["--a-args=-B", "--b-args=-O"]
+        + cmd
+        + ["REPEATNUM"]
+    )
+    assert result == 0
+    assert time.time() - start_time < 30
+    assert "Repetition 2 of 8 was interesting (4 started)" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "chunks, expected",
+    [
+        ([("a", b"ab"), ("b", b"a"), ("b", b"bc"), ("a", b"c")], False),
+        ([("a", b"ab"), ("b", b"a"), ("b", b"bc"), ("a", b"d")], True),
+        ([("a", b"a"), ("a", b"b"), ("b", b"ac")], True),
+        ([("a", b"abc"), ("b", b"ab"), ("a", b"d"), ("b", b"cd")], False),
+    ],
+)
+def test_diff_test_comparator(chunks, expected):
+    """test comparing output from two runs as it is produced"""
+    # pylint: disable=protected-access
+    comparator = lithium.interestingness.diff_test._OutputComparator()
+    results = [comparator.feed(run, "out", data) for run, data in chunks]
+    assert results[-1] == expected
+    assert not any(results[:-1])
+    assert comparator.diverged == ("out" if expected else None)
+    # streams are compared separately
+    assert not comparator.feed("b", "err", b"x")
+
+
 def test_hangs_0():
     """test for the 'hangs' interestingness test"""
     lith = lithium.Lithium()
@@ -279,6 +366,61 @@ def test_outputs_regex():
     assert lith.test_count == 1
 
 
+def test_outputs_stop_early():
+    """interestingness 'outputs' stops the target once the message is found"""
+    lith = lithium.Lithium()
+    cmd = [
+        sys.executable,
+        "-c",
+        "import sys,time;print('found', flush=True);time.sleep(int(sys.argv[1]))",
+    ]
+
+    start_time = time.time()
+    result = lith.main(
+        [
+            "--strategy",
+            "check-only",
+            "--testcase",
+            "temp.js",
+            "outputs",
+            "--timeout",
+            "60",
+            "found",
+        ]
+        + cmd
+        + ["30"]
+    )
+    elapsed = time.time() - start_time
+    assert result == 0
+    assert elapsed < 30
+    assert lithium.interestingness.timed_run.last_run().sta == (
+        lithium.interestingness.timed_run.STOPPED
+    )
+
+
+@pytest.mark.parametrize(
+    "pattern, regex, chunks, expected",
+    [
+        (b"hello", False, [b"xxhel", b"lo"], True),
+        (b"hello", False, [b"xxhel", b"o", b"llo"], False),
+        (b"hello", False, [b"h", b"e", b"l", b"l", b"o"], True),
+        (br"^a\nb", True, [b"x\na", b"\n", b"b"], True),
+        (br"^a", True, [b"xa"], False),
+        (br"^a", True, [b"x", b"a"], False),
+        (br"^a", True, [b"x\n", b"a"], True),
+        (br"^a", True, [b"a"], True),
+    ],
+)
+def test_output_matcher(pattern, regex, chunks, expected):
+    """test searching output incrementally"""
+    matcher = lithium.interestingness.utils.OutputMatcher(pattern, regex=regex)
+    results = [matcher.feed("out", chunk) for chunk in chunks]
+    assert results[-1] == expected
+    assert not any(results[:-1])
+    # streams are searched separately
+    assert not matcher.feed("err", b"o")
+
+
 def test_repeat_0():
     """test for the 'repeat' interestingness test"""
     lith = lithium.Lithium()
@@ -326,6 +468,76 @@ def test_repeat_1(caplog):
     assert found_count == last_count  # We should have identical count outputs
 
 
+def test_prepared_state():
+    """test that prepared state is reused for the same arguments"""
+    prepared = []
+
+    def _prepare(cli_args):
+        prepared.append(cli_args)
+        return len(prepared)
+
+    state = lithium.interestingness.utils.PreparedState(_prepare)
+    assert state.get(["a", "b"]) == 1
+    assert state.get(("a", "b")) == 1
+    assert state.get(["a", "c"]) == 2
+    assert prepared == [["a", "b"], ["a", "c"]]
+    # only the state for the given arguments is cleared
+    assert state.clear(["a", "b"]) == [1]
+    assert state.get(["a", "c"]) == 2
+    assert state.get(["a", "b"]) == 3
+    # each owner (eg. a reduction in a batch) has its own state, which is cleared
+    # together, including the state for the arguments used by its jobs
+    timed_run = lithium.interestingness.timed_run
+    with timed_run.owned_by("x"):
+        assert state.get(["a", "b"]) == 4
+        assert state.get(["a", "job1"]) == 5
+        assert sorted(state.clear(["a", "b"])) == [4, 5]
+    assert state.get(["a", "b"]) == 3
+
+
+def test_import_threads():
+    """test that conditions can be imported from several threads at once, each from
+    its own directory"""
+    names = ["thread_cond%d" % (number,) for number in range(8)]
+    for name in names:
+        Path(name).mkdir()
+        (Path(name) / (name + ".py")).write_text("NAME = %r\n" % (name,))
+    path = list(sys.path)
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        modules = list(
+            executor.map(
+                lambda name: lithium.interestingness.utils.rel_or_abs_import(
+                    str(Path(name).resolve() / (name + ".py"))
+                ),
+                names,
+            )
+        )
+    assert [module.NAME for module in modules] == names
+    assert sys.path == path
+
+
+def test_repeat_prepared():
+    """test that 'repeat' initializes the repeated test once, and cleans it up"""
+    Path("temp.js").write_text("a\nboom\nb\n")
+    Path("counted_condition.py").write_text(
+        "from pathlib import Path\n"
+        "calls = []\n"
+        "def init(args):\n"
+        "    calls.append('init')\n"
+        "def cleanup(args):\n"
+        "    calls.append('cleanup')\n"
+        "def interesting(args, temp_prefix):\n"
+        "    return 'boom' in Path(args[0]).read_text()\n"
+    )
+    lith = lithium.Lithium()
+    result = lith.main(["repeat", "2", "counted_condition", "temp.js"])
+    assert result == 0
+    assert lith.test_count > 1
+    assert Path("temp.js").read_text() == "boom\n"
+    condition = sys.modules["counted_condition"]
+    assert condition.calls == ["init", "cleanup"]
+
+
 def test_repeat_2():
     """test for the 'repeat' interestingness test"""
     lith = lithium.Lithium()
@@ -395,6 +607,49 @@ def test_repeat_5():
     assert lith.test_count == 1
 
 
+def test_repeat_parallel(caplog):
+    """test running repetitions in parallel with the 'repeat' interestingness test"""
+    lith = lithium.Lithium()
+    with open("temp.js", "w") as tempf:
+        tempf.write("hello")
+
+    caplog.clear()
+    result = lith.main(
+        ["--strategy", "check-only"]
+        + ["repeat", "--parallel", "3", "5", "outputs", "notfound"]
+        + CAT_CMD
+        + ["temp.js"]
+    )
+    assert result == 1
+    assert sorted(
+        rec.args[0] for rec in caplog.records if "Repeat number " in rec.getMessage()
+    ) == [1, 2, 3, 4, 5]
+
+
+def test_repeat_parallel_cancel(caplog):
+    """test that 'repeat' stops other repetitions once one is interesting"""
+    lith = lithium.Lithium()
+    cmd = [
+        sys.executable,
+        "-c",
+        "import sys,time;"
+        "sys.argv[1] == '2' and print('found', flush=True);"
+        "time.sleep(0 if sys.argv[1] == '2' else 30)",
+    ]
+
+    caplog.clear()
+    start_time = time.time()
+    result = lith.main(
+        ["--strategy", "check-only", "--testcase", "temp.js"]
+        + ["repeat", "--parallel", "4", "8", "outputs", "--timeout", "60", "found"]
+        + cmd
+        + ["REPEATNUM"]
+    )
+    assert result == 0
+    assert time.time() - start_time < 30
+    assert "Repetition 2 of 8 was interesting (4 started)" in caplog.text
+
+
 @pytest.mark.parametrize(
     "pattern, expected",
     [
@@ -427,3 +682,422 @@ def test_interestingness_outputs_multiline(capsys, pattern, expected):
     #    assert lith.test_count == 1
     captured = capsys.readouterr()
     assert "[Found string in: %r]" % (expected,) in captured.out
+
+
+@pytest.fixture(name="persistent_cmd")
+def fixture_persistent_cmd(examples_path):
+    """Command for the reference persistent target"""
+    yield [sys.executable, str(examples_path / "persistent_target.py")]
+    lithium.interestingness.timed_run.close_persistent_targets()
+
+
+def test_persistent_run(persistent_cmd):
+    """test that a persistent target is reused, and restarted after crashes and
+    timeouts"""
+    timed_run = lithium.interestingness.timed_run
+
+    def _run(contents, timeout=9):
+        Path("temp.js").write_text(contents)
+        return timed_run.timed_run(
+            persistent_cmd + ["temp.js"], timeout, persistent=True
+        )
+
+    first = _run("pid\nerror oops\nexit 3\n")
+    assert first.sta == timed_run.ABNORMAL
+    assert first.return_code == 3
+    assert first.out == b"%d\n" % (first.pid,)
+    assert first.err == b"oops\n"
+    second = _run("print hello\n")
+    assert second.sta == timed_run.NORMAL
+    assert second.out == b"hello\n"
+    assert second.pid == first.pid
+
+    if platform.system() != "Windows":
+        crashed = _run("print before\ncrash\n")
+        assert crashed.sta == timed_run.CRASHED
+        assert crashed.out == b"before\n"
+        assert crashed.pid == first.pid
+        restarted = _run("pid\n")
+        assert restarted.sta == timed_run.NORMAL
+        assert restarted.pid != first.pid
+        assert restarted.out == b"%d\n" % (restarted.pid,)
+        first = restarted
+
+    hung = _run("hang\n", timeout=1)
+    assert hung.sta == timed_run.TIMED_OUT
+    assert hung.killed
+    assert _run("pid\n").pid != first.pid
+
+
+def test_persistent_exit_idle(persistent_cmd):
+    """test that a persistent target which exits between testcases is restarted, and
+    its status isn't reported for the next testcase"""
+    timed_run = lithium.interestingness.timed_run
+    Path("temp.js").write_text("pid\n")
+    first = timed_run.timed_run(persistent_cmd + ["temp.js"], 9, persistent=True)
+    assert first.sta == timed_run.NORMAL
+    # pylint: disable=protected-access
+    target = next(iter(timed_run._PERSISTENT_TARGETS.values()))
+    # the target crashes while it is idle
+    target._proc.kill()
+    target._proc.wait()
+    Path("temp.js").write_text("print hello\n")
+    second = timed_run.timed_run(persistent_cmd + ["temp.js"], 9, persistent=True)
+    assert second.sta == timed_run.NORMAL
+    assert second.out == b"hello\n"
+    assert second.pid != first.pid
+
+
+def test_persistent_conditions(persistent_cmd):
+    """test the 'crashes', 'hangs' and 'outputs' conditions in persistent mode"""
+    Path("temp.js").write_text("print hello\nhang\n")
+    lith = lithium.Lithium()
+    result = lith.main(
+        ["--strategy", "check-only", "hangs", "--persistent", "--timeout", "1"]
+        + persistent_cmd
+        + ["temp.js"]
+    )
+    assert result == 0
+
+    Path("temp.js").write_text("print hello\n")
+    lith = lithium.Lithium()
+    result = lith.main(
+        ["--strategy", "check-only", "outputs", "--persistent", "hello"]
+        + persistent_cmd
+        + ["temp.js"]
+    )
+    assert result == 0
+
+    if platform.system() != "Windows":
+        Path("temp.js").write_text("print a\nprint b\ncrash\nprint c\n")
+        lith = lithium.Lithium()
+        result = lith.main(["crashes", "--persistent"] + persistent_cmd + ["temp.js"])
+        assert result == 0
+        assert Path("temp.js").read_text() == "crash\n"
+
+
+def test_repeat_parallel_persistent(persistent_cmd, monkeypatch):
+    """test that 'repeat --parallel' reuses its threads, and so the persistent
+    targets kept for each of them, for every test"""
+    timed_run = lithium.interestingness.timed_run
+    targets = []
+    original_init = timed_run.PersistentTarget.__init__
+
+    def _init(self, *args):
+        targets.append(self)
+        original_init(self, *args)
+
+    monkeypatch.setattr(timed_run.PersistentTarget, "__init__", _init)
+    Path("temp.js").write_text("print hello\n")
+    repeat = lithium.interestingness.repeat
+    args = ["--parallel", "3", "6", "outputs", "--persistent", "notfound"]
+    args += persistent_cmd + ["temp.js"]
+    repeat.init(args)
+    try:
+        for _ in range(3):
+            assert not repeat.interesting(args, "tmp")
+    finally:
+        repeat.cleanup(args)
+    assert 1 <= len(targets) <= 3
+
+    # repetitions are stopped with the group given to the test by its caller
+    args[args.index("notfound")] = "hello"
+    repeat.init(args)
+    try:
+        assert repeat.interesting(args, "tmp")
+        stop_group = timed_run.StopGroup()
+        stop_group.set()
+        with timed_run.stopped_by(stop_group):
+            assert not repeat.interesting(args, "tmp")
+    finally:
+        repeat.cleanup(args)
+
+
+def test_cleanup_owner(persistent_cmd):
+    """test that cleanup only stops the persistent targets and adaptive timeouts of
+    the current owner (eg. one reduction in a batch)"""
+    timed_run = lithium.interestingness.timed_run
+    Path("temp.js").write_text("print hello\n")
+    args = argparse.Namespace(timeout=9, adaptive_timeout=2.0)
+
+    def _run():
+        return timed_run.timed_run(persistent_cmd + ["temp.js"], 9, persistent=True)
+
+    with timed_run.owned_by("a"):
+        first = _run()
+        adaptive = timed_run.adaptive_timeout("crashes", args)
+    with timed_run.owned_by("b"):
+        assert _run().pid != first.pid
+        assert timed_run.adaptive_timeout("crashes", args) is not adaptive
+        timed_run.cleanup()
+    with timed_run.owned_by("a"):
+        assert _run().pid == first.pid
+        assert timed_run.adaptive_timeout("crashes", args) is adaptive
+        timed_run.cleanup()
+        assert _run().pid != first.pid
+
+
+def test_adaptive_timeout():
+    """test that the adaptive timeout follows the runtime of interesting runs"""
+    timed_run = lithium.interestingness.timed_run
+
+    def _run(elapsed, sta=timed_run.NORMAL):
+        return timed_run.RunData(sta, 0, "", elapsed, False, b"", b"", 0)
+
+    adaptive = timed_run.AdaptiveTimeout(60, 2)
+    assert adaptive.timeout() == 60
+    adaptive.record(_run(10), False, 60)
+    assert adaptive.timeout() == 60
+    adaptive.record(_run(2.2), True, 60)
+    assert adaptive.timeout() == 5
+    for _ in range(18):
+        adaptive.record(_run(0.1), True, 5)
+    # the slowest run is above the 95th percentile
+    assert adaptive.timeout() == 5
+    adaptive.record(_run(0.1), True, 5)
+    assert adaptive.timeout() == 1
+    adaptive.record(_run(1, timed_run.TIMED_OUT), False, 1)
+    assert adaptive.saved == 59
+    assert adaptive.stopped == 1
+    adaptive.record(_run(60, timed_run.TIMED_OUT), False, 60)
+    assert adaptive.saved == 59
+
+    disabled = timed_run.AdaptiveTimeout(60)
+    disabled.record(_run(1), True, 60)
+    assert disabled.timeout() == 60
+
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="uses os.abort()")
+def test_adaptive_timeout_crashes(caplog, examples_path):
+    """test that candidates which hang are stopped early with --adaptive-timeout"""
+    Path("temp.js").write_text("print x\ncrash\nhang\n")
+    lith = lithium.Lithium()
+    start_time = time.time()
+    result = lith.main(
+        ["crashes", "--timeout", "20", "--adaptive-timeout", "2"]
+        + [sys.executable, str(examples_path / "persistent_target.py"), "temp.js"]
+    )
+    assert result == 0
+    assert time.time() - start_time < 20
+    assert Path("temp.js").read_text() == "crash\n"
+    assert "crashes: adaptive timeout saved" in caplog.text
+
+
+def test_hangs_no_adaptive_timeout():
+    """test that 'hangs' doesn't accept --adaptive-timeout"""
+    lith = lithium.Lithium()
+    with pytest.raises(SystemExit):
+        lith.main(
+            ["--strategy", "check-only", "--testcase", "temp.js", "hangs"]
+            + ["--timeout", "1", "--adaptive-timeout", "2"]
+            + SLEEP_CMD
+            + ["3"]
+        )
+
+
+def test_timed_run_rusage():
+    """test that timed_run reports the resource usage of the command"""
+    timed_run = lithium.interestingness.timed_run
+    timed_run.resource_totals(reset=True)
+    result = timed_run.timed_run(
+        [
+            sys.executable,
+            "-c",
+            "x = bytearray(32 * 1024 * 1024); x[::4096] = b'x' * 8192",
+        ],
+        9,
+    )
+    assert result.sta == timed_run.NORMAL
+    totals = timed_run.resource_totals()
+    assert totals["runs"] == 1
+    if platform.system() == "Windows":
+        assert result.rusage is None
+        return
+    assert result.rusage.utime + result.rusage.stime > 0
+    assert result.rusage.maxrss >= 32 * 1024
+    assert result.rusage.minflt > 0
+    assert totals["maxrss"] == result.rusage.maxrss
+
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="no rusage")
+def test_timed_run_rusage_killed():
+    """test that timed_run reports the status and resource usage of commands which
+    are killed, or exit while they are polled
+    """
+    timed_run = lithium.interestingness.timed_run
+    result = timed_run.timed_run(
+        [sys.executable, "-c", "print('x', flush=True); import time; time.sleep(30)"],
+        30,
+        stop_on=lambda name, chunk: True,
+    )
+    assert result.sta == timed_run.STOPPED
+    assert result.rusage is not None
+    result = timed_run.timed_run(
+        [sys.executable, "-c", "import time; time.sleep(30)"], 1
+    )
+    assert result.sta == timed_run.TIMED_OUT
+    assert result.rusage is not None
+    result = timed_run.timed_run([sys.executable, "-c", "exit(3)"], 9)
+    assert result.return_code == 3
+    assert result.rusage is not None
+
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="no rusage")
+def test_timed_run_status_lost(monkeypatch, caplog):
+    """test that a command whose exit status is lost isn't reported as a normal exit"""
+    timed_run = lithium.interestingness.timed_run
+    wait4 = os.wait4
+
+    def _wait4(pid, options):
+        # reap the process, as if SIGCHLD was ignored
+        result = wait4(pid, options)
+        if result[0] == pid:
+            raise ChildProcessError()
+        return result
+
+    monkeypatch.setattr(os, "wait4", _wait4)
+    result = timed_run.timed_run([sys.executable, "-c", "pass"], 9)
+    assert result.sta == timed_run.ABNORMAL
+    assert result.msg == "ABNORMAL exit status lost"
+    assert result.rusage is None
+    assert "Exit status of process %d was lost" % (result.pid,) in caplog.text
+
+
+@pytest.mark.skipif(platform.system() == "Windows", reason="no resource limits")
+def test_timed_run_limits():
+    """test the CPU and memory limits of timed_run"""
+    timed_run = lithium.interestingness.timed_run
+    start_time = time.time()
+    result = timed_run.timed_run(
+        [sys.executable, "-c", "while True: pass"], 30, cpu_limit=1
+    )
+    assert time.time() - start_time < 30
+    assert result.sta == timed_run.TIMED_OUT
+    assert result.msg == "CPU LIMIT EXCEEDED"
+
+    result = timed_run.timed_run(
+        [sys.executable, "-c", "x = bytearray(1024 * 1024 * 1024)"],
+        30,
+        memory_limit=512 * 1024 * 1024,
+    )
+    assert result.sta == timed_run.ABNORMAL
+    assert b"MemoryError" in result.err
+
+
+@pytest.mark.parametrize("limit", ["--cpu-limit", "--memory-limit"])
+def test_persistent_limits(persistent_cmd, limit, capsys):
+    """test that resource limits can't be used with persistent targets, since they
+    would apply to all the tests run by the target together"""
+    Path("temp.js").write_text("print hello\n")
+    with pytest.raises(SystemExit):
+        lithium.Lithium().main(
+            ["--strategy", "check-only", "crashes", "--persistent", limit, "1"]
+            + persistent_cmd
+            + ["temp.js"]
+        )
+    assert "can't be used with --persistent" in capsys.readouterr().err
+    with pytest.raises(TypeError):
+        lithium.interestingness.timed_run.timed_run(
+            persistent_cmd + ["temp.js"], 9, persistent=True, cpu_limit=1
+        )
+
+
+def test_resource_summary(caplog):
+    """test that the resources used by the target are summarized"""
+    lith = lithium.Lithium()
+    result = lith.main(["--strategy", "check-only", "crashes"] + LS_CMD + ["temp.js"])
+    assert result == 1
+    assert "Target runs: 1" in caplog.text
+    if platform.system() != "Windows":
+        assert "Target CPU time:" in caplog.text
+
+
+def test_timed_run_async():
+    """test timed_run_async"""
+    timed_run = lithium.interestingness.timed_run
+
+    async def _runs():
+        results = await asyncio.gather(
+            timed_run.timed_run_async(CAT_CMD, 9, inp=b"hello"),
+            timed_run.timed_run_async(SLEEP_CMD + ["30"], 1),
+            timed_run.timed_run_async(
+                [
+                    sys.executable,
+                    "-c",
+                    "import time\nfor i in range(300): print(i, flush=True);"
+                    " time.sleep(0.1)",
+                ],
+                60,
+                stop_on=lambda stream, data: b"3\n" in data,
+            ),
+        )
+        last = timed_run.last_run_async()
+        gathered = await timed_run.gather_async(
+            timed_run.timed_run_async(CAT_CMD, 9, inp=b"a"),
+            timed_run.timed_run_async(CAT_CMD, 9, inp=b"b"),
+        )
+        return results, last, gathered, timed_run.last_run_async()
+
+    start_time = time.time()
+    loop = asyncio.new_event_loop()
+    try:
+        (cat, sleep, stopped), last, gathered, gathered_last = loop.run_until_complete(
+            _runs()
+        )
+    finally:
+        loop.close()
+    assert time.time() - start_time < 20
+    assert cat.sta == timed_run.NORMAL
+    assert cat.out == b"hello"
+    assert sleep.sta == timed_run.TIMED_OUT
+    assert stopped.sta == timed_run.STOPPED
+    assert b"3\n" in stopped.out
+    # each run was in a separate task
+    assert last is None
+    assert [run.out for run in gathered] == [b"a", b"b"]
+    assert gathered_last is gathered[1]
+    if platform.system() == "Windows":
+        assert cat.rusage is None
+    else:
+        for run in (cat, sleep, stopped):
+            assert run.rusage is not None
+        assert cat.rusage.maxrss > 0
+
+
+@pytest.mark.parametrize(
+    "condition, args, expected",
+    [
+        ("crashes", LS_CMD + ["temp.js"], False),
+        ("hangs", ["--timeout", "1"] + SLEEP_CMD + ["3"], True),
+        ("outputs", ["temp.js"] + LS_CMD + ["temp.js"], True),
+        ("diff_test", ["--a-args=-O", "--b-args=-OO"] + CAT_CMD + ["temp.js"], False),
+    ],
+)
+def test_interesting_async(condition, args, expected):
+    """test the asyncio versions of the conditions"""
+    module = getattr(lithium.interestingness, condition)
+
+    async def _interesting():
+        result = await module.interesting_async(args, "async")
+        return result, lithium.interestingness.timed_run.last_run_async()
+
+    loop = asyncio.new_event_loop()
+    try:
+        result, last = loop.run_until_complete(_interesting())
+    finally:
+        loop.close()
+    assert result == expected
+    # the run is available to the caller, eg. to log its status
+    assert last is not None
+    assert module.interesting(args, "sync") == expected
+
+
+def test_lithium_async(caplog):
+    """test that Lithium runs conditions with interesting_async() in an event loop"""
+    caplog.set_level(logging.DEBUG)
+    Path("temp.js").write_bytes(b"a\nb\nboom\nc\n")
+    lith = lithium.Lithium()
+    result = lith.main(["--jobs", "2", "outputs", "boom"] + CAT_CMD + ["temp.js"])
+    assert result == 0
+    assert Path("temp.js").read_bytes() == b"boom\n"
+    assert "Running condition script with asyncio" in caplog.text
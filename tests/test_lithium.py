@@ -101,3 +101,125 @@ def test_arithmetic(examples_path, char):
     result = lithium.Lithium().main(args)
     assert result == 0
     assert Path("11.txt").read_text() == "2\n\n# DDBEGIN\n5\n7\n# DDEND\n\n2\n"
+
+
+def test_mmap(examples_path):
+    """test reducing a testcase mapped into memory with --mmap"""
+    path = examples_path / "arithmetic"
+    shutil.copyfile(str(path / "11.txt"), "11.txt")
+    lith = lithium.Lithium()
+    result = lith.main(["--mmap", str(path / "product_divides.py"), "35", "11.txt"])
+    assert result == 0
+    assert Path("11.txt").read_text() == "2\n\n# DDBEGIN\n5\n7\n# DDEND\n\n2\n"
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_jobs(jobs, line_lithium, recording_condition):
+    """test that speculative parallel evaluation gives the same result as serial"""
+    test_path = Path("a.txt")
+    test_path.write_bytes(b"".join(b"%d\n" % (i,) for i in range(40)))
+    condition = recording_condition(
+        lambda data: {b"7", b"31"} <= set(data.splitlines())
+    )
+    lith = line_lithium(condition, test_path)
+    lith.jobs = jobs
+    assert lith.run() == 0
+    assert test_path.read_bytes() == b"7\n31\n"
+    # the reduction should be deterministic regardless of the number of jobs
+    assert lith.test_count == 21
+    assert (lith.temp_dir / "job1").is_dir() == (jobs > 1)
+    assert len(condition.tested) >= lith.test_count
+
+
+def test_resume(line_lithium):
+    """test that an interrupted reduction can be continued from a checkpoint"""
+    test_path = Path("a.txt")
+    original = b"".join(b"%d\n" % (i,) for i in range(40))
+
+    class _Interesting:
+        # pylint: disable=missing-function-docstring
+        def __init__(self, fail_after=None):
+            self.fail_after = fail_after
+            self.calls = 0
+
+        def interesting(self, *_):
+            self.calls += 1
+            if self.calls == self.fail_after:
+                raise RuntimeError("interrupted")
+            return {b"7", b"31"} <= set(test_path.read_bytes().splitlines())
+
+    def _lithium(condition):
+        test_path.write_bytes(original)
+        lith = line_lithium(condition, test_path)
+        lith.checkpoint_interval = 3600
+        return lith
+
+    # reference run
+    lith = _lithium(_Interesting())
+    assert lith.run() == 0
+    assert test_path.read_bytes() == b"7\n31\n"
+    expected_count = lith.test_count
+    # a finished reduction can't be resumed
+    assert not (lith.temp_dir / "checkpoint.pickle").exists()
+
+    lith = _lithium(_Interesting(fail_after=10))
+    with pytest.raises(RuntimeError, match="interrupted"):
+        lith.run()
+    assert lith.test_count == 9
+    checkpoint = lith.temp_dir / "checkpoint.pickle"
+    assert checkpoint.is_file()
+
+    condition = _Interesting()
+    lith = _lithium(condition)
+    lith.load_checkpoint(checkpoint.parent)
+    assert len(lith.testcase) < 40
+    assert lith.run() == 0
+    assert test_path.read_bytes() == b"7\n31\n"
+    assert not checkpoint.exists()
+    # only the original check is repeated
+    assert lith.test_count == expected_count + 1
+    assert condition.calls == expected_count + 1 - 9
+
+
+def test_resume_mismatch():
+    """test that a checkpoint is only used with the same strategy"""
+    test_path = Path("a.txt")
+    test_path.write_bytes(b"a\nb\n")
+    # pylint: disable=protected-access
+    lith = lithium.Lithium()
+    lith.strategy = lithium.strategies.Minimize()
+    lith.testcase = lithium.testcases.TestcaseLine()
+    lith.testcase.load(test_path)
+    lith.temp_dir = Path(".")
+    lith._reduction = lith.strategy.reduce(lith.testcase)
+    lith.save_checkpoint()
+
+    lith = lithium.Lithium()
+    lith.strategy = lithium.strategies.MinimizeBalancedPairs()
+    lith.testcase = lithium.testcases.TestcaseLine()
+    lith.testcase.load(test_path)
+    with pytest.raises(lithium.LithiumError, match="minimize strategy"):
+        lith.load_checkpoint("checkpoint.pickle")
+
+
+def test_reduce_bytes():
+    """test in-process reduction with a Python predicate"""
+    written = set(Path(".").iterdir())
+
+    def _divides(data):
+        prod = 1
+        for line in data.splitlines():
+            if line.isdigit():
+                prod *= int(line)
+        return prod % 3 == 0
+
+    data = b"2\n7\n4\n9\n5\n"
+    assert lithium.reduce_bytes(data, _divides) == b"9\n"
+    result = lithium.reduce_bytes(
+        data, _divides, testcase_type=lithium.testcases.TestcaseChar
+    )
+    assert result == b"9"
+    # nothing is written to disk
+    assert set(Path(".").iterdir()) == written
+    with pytest.raises(lithium.LithiumError, match="not interesting"):
+        lithium.reduce_bytes(b"2\n", _divides)
@@ -0,0 +1,148 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Lithium remote worker tests"""
+
+import os
+import stat
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import lithium
+from lithium import remote
+
+pytestmark = pytest.mark.usefixtures("tmp_cwd")  # pylint: disable=invalid-name
+
+# condition script which keeps "o" lines, and records where each test ran
+CONDITION = """
+import os
+
+TESTED = []
+
+def interesting(args, _temp_prefix):
+    with open(args[1], "rb") as test_fp:
+        data = test_fp.read()
+    TESTED.append((args[0], os.path.dirname(args[1]), data))
+    return b"o" in data.split()
+"""
+
+
+TOKEN = b"secret"
+
+
+@pytest.fixture(name="worker")
+def fixture_worker(request):
+    """Start a worker server on a free port, or a Unix socket"""
+    Path("token.txt").write_bytes(TOKEN + b"\n")
+    if getattr(request, "param", "tcp") == "unix":
+        address = str(Path("worker.sock").resolve())
+        spec = address
+    else:
+        address = ("localhost", 0)
+    server = remote.worker_server(address, slots=2, token=TOKEN)
+    if not isinstance(address, str):
+        spec = "localhost:%d" % (server.server_address[1],)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield spec
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.mark.parametrize(
+    "spec, expected",
+    [
+        ("localhost:1234", ("localhost", 1234)),
+        (":1234", ("localhost", 1234)),
+        ("/tmp/worker.sock", "/tmp/worker.sock"),
+        ("localhost", None),
+        ("localhost:http", None),
+    ],
+)
+def test_parse_address(spec, expected):
+    """test parsing worker addresses"""
+    if expected is None:
+        with pytest.raises(ValueError):
+            remote.parse_address(spec)
+    else:
+        assert remote.parse_address(spec) == expected
+
+
+@pytest.mark.parametrize("worker", ["tcp", "unix"], indirect=True)
+def test_remote(worker):
+    """test that a reduction can run its tests on a remote worker"""
+    # the module is shared with the worker, so use a new one for each test
+    module = "remote_cond_%s" % ("unix" if "/" in worker else "tcp",)
+    Path(module + ".py").write_text(CONDITION)
+    test_path = Path("a.txt")
+    original = b"".join(b"x%d\n" % (i,) for i in range(10)) + b"o\n"
+    test_path.write_bytes(original)
+    lith = lithium.Lithium()
+    lith.process_args(
+        ["--remote", worker, "--remote-token-file", "token.txt", module, "arg", "a.txt"]
+    )
+    assert lith.run() == 0
+    assert test_path.read_bytes() == b"o\n"
+    condition = __import__(module)
+    # every test ran on the worker, including the original, with the testcase in
+    # the worker's temporary directory
+    assert len(condition.TESTED) >= lith.test_count
+    assert condition.TESTED[0][2] == original
+    for arg, test_dir, _ in condition.TESTED:
+        assert arg == "arg"
+        assert os.path.basename(test_dir).startswith("lithium-worker-")
+    # both slots of the worker were used
+    assert len({test_dir for _, test_dir, _ in condition.TESTED}) == 2
+    # temporary directories are removed by the worker once Lithium disconnects
+    deadline = time.monotonic() + 10
+    while any(os.path.isdir(test_dir) for _, test_dir, _ in condition.TESTED):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_remote_error(worker, caplog):
+    """test that errors on the worker stop the reduction"""
+    Path("a.txt").write_bytes(b"o\n")
+    Path("broken_cond.py").write_text(
+        "def interesting(args, _temp_prefix):\n    raise RuntimeError('boom')\n"
+    )
+    lith = lithium.Lithium()
+    with pytest.raises(SystemExit):
+        lith.process_args(["--remote", worker, "--testcase", "a.txt", "crashes", "x"])
+    args = ["--remote", worker, "--remote-token-file", "token.txt"]
+    assert lithium.Lithium().main(args + ["broken_cond", "a.txt"]) == 1
+    assert "failed: RuntimeError: boom" in caplog.text
+
+
+def test_remote_unreachable():
+    """test connecting to a worker which isn't running"""
+    with pytest.raises(lithium.LithiumError, match="Can't connect to worker"):
+        remote.connect_workers([str(Path("nothing.sock").resolve())])
+
+
+@pytest.mark.parametrize("token", [None, b"wrong"])
+def test_remote_token(worker, token):
+    """test that workers only run tests for clients which know the token"""
+    with pytest.raises(lithium.LithiumError, match="rejected the connection"):
+        remote.connect_workers([remote.parse_address(worker)], token)
+    for connection in remote.connect_workers([remote.parse_address(worker)], TOKEN):
+        connection.close()
+
+
+def test_worker_access(capsys):
+    """test that TCP workers need a token, and Unix sockets are private"""
+    with pytest.raises(ValueError):
+        remote.worker_server(("localhost", 0))
+    with pytest.raises(SystemExit):
+        remote.main(["--listen", "localhost:0"])
+    assert "--token-file is required" in capsys.readouterr().err
+    server = remote.worker_server(str(Path("private.sock").resolve()))
+    try:
+        assert stat.S_IMODE(os.stat("private.sock").st_mode) == 0o600
+    finally:
+        server.server_close()
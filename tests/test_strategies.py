@@ -283,3 +283,131 @@ def test_minimize_reducible():
     obj.testcase.reducible[-1] = False
     assert obj.run() == 0
     assert test_path.read_bytes() == b"o\nx\n"
+
+
+def test_pipeline(caplog, recording_condition):
+    """test that a pipeline repeats its strategies until they make no progress, and
+    doesn't try the same testcase twice"""
+    test_path = Path("a.txt")
+    test_path.write_bytes(b"x\nxxx{\nx\n}\no\n")
+    condition = recording_condition(
+        lambda data: b"o\n" in data and data.count(b"{") == data.count(b"}")
+    )
+
+    obj = lithium.Lithium()
+    obj.process_args(
+        ["--pipeline", "minimize-collapse-brace,minimize", "crashes", "a.txt"]
+    )
+    assert isinstance(obj.strategy, lithium.strategies.Pipeline)
+    assert [stage.name for stage in obj.strategy.stages] == [
+        "minimize-collapse-brace",
+        "minimize",
+    ]
+    obj.condition_script = condition
+    assert obj.run() == 0
+    assert test_path.read_bytes() == b"o\n"
+    assert len(condition.tested) == len(set(condition.tested))
+    assert "Pass 2, stage 1: minimize-collapse-brace" in caplog.text
+    assert "Pipeline pass 2 made no progress, finished" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "args, error",
+    [
+        (["--pipeline", "minimize,nope"], "unknown --pipeline strategy: nope"),
+        (
+            ["--pipeline", "minimize", "--strategy", "minimize"],
+            "can't be used together",
+        ),
+    ],
+)
+def test_pipeline_args(args, error, capsys):
+    """test --pipeline argument errors"""
+    obj = lithium.Lithium()
+    with pytest.raises(SystemExit):
+        obj.process_args(args + ["crashes", "a.txt"])
+    assert error in capsys.readouterr().err
+
+
+def test_pipeline_schedule(caplog, recording_condition):
+    """test that a scheduled pipeline reduces the testcase using every strategy"""
+    test_path = Path("a.txt")
+    test_path.write_bytes(b"x\nxxx{\nx\n}\no\nx\nx\n")
+    condition = recording_condition(
+        lambda data: b"o\n" in data and data.count(b"{") == data.count(b"}")
+    )
+
+    obj = lithium.Lithium()
+    obj.process_args(
+        ["--pipeline", "all", "--schedule", "--schedule-slice", "0.000001"]
+        + ["crashes", "a.txt"]
+    )
+    assert obj.strategy.stages[0].name == "minimize"
+    assert "check-only" not in {stage.name for stage in obj.strategy.stages}
+    obj.condition_script = condition
+    assert obj.run() == 0
+    assert test_path.read_bytes() == b"o\n"
+    assert len(condition.tested) == len(set(condition.tested))
+    # each slice runs a single test, so strategies are interrupted and continued
+    assert "Continuing strategy: minimize" in caplog.text
+    assert "None of the strategies can make progress, finished" in caplog.text
+    assert "Time spent testing by each strategy:" in caplog.text
+
+
+def test_schedule_choice():
+    """test that the scheduler tries each stage, then prefers the fastest"""
+    testcase = lithium.testcases.TestcaseLine()
+    testcase.split_parts(b"a\nb\n")
+    strategies = lithium.strategies
+    pipeline = strategies.Pipeline(
+        [strategies.Minimize(), strategies.CollapseEmptyBraces()]
+    )
+    pipeline.schedule = True
+    reduction = pipeline.reduce(testcase)
+    # pylint: disable=protected-access
+    assert reduction._choose() == 0
+    reduction.stats[0]["rate"] = 1.0
+    assert reduction._choose() == 1
+    reduction.stats[1]["rate"] = 2.0
+    assert reduction._choose() == 1
+    reduction.stats[1]["finished"] = True
+    assert reduction._choose() == 0
+    reduction.stats[0]["finished"] = True
+    assert reduction._choose() is None
+
+
+def test_cascade(caplog, recording_condition):
+    """test that a cascade reduces by lines, then symbols, then chars"""
+    test_path = Path("a.txt")
+    test_path.write_bytes(
+        b"DDBEGIN\n" b"hello\n" b"foo(bar); baz = 1;\n" b"world\n" b"DDEND\n"
+    )
+    condition = recording_condition(lambda data: b"(b" in data)
+
+    obj = lithium.Lithium()
+    obj.process_args(["--cascade", "crashes", "a.txt"])
+    assert isinstance(obj.strategy, lithium.strategies.Cascade)
+    assert [level.atom for level in obj.strategy.levels] == [
+        "symbol-delimiter",
+        "char",
+    ]
+    obj.condition_script = condition
+    assert obj.run() == 0
+    # as when loading by symbols, the final line break is reducible
+    assert test_path.read_bytes() == b"DDBEGIN\n(bDDEND\n"
+    assert len(condition.tested) == len(set(condition.tested))
+    # the original is only checked once
+    assert condition.tested.count(condition.tested[0]) == 1
+    assert "Splitting the testcase into 4 symbol-delimiters" in caplog.text
+    assert "Splitting the testcase into 9 chars" in caplog.text
+
+
+def test_cascade_args(capsys):
+    """test that --cascade only works with testcase types it can split further"""
+    Path("a.txt").write_bytes(b"a\n")
+    obj = lithium.Lithium()
+    obj.process_args(["--cascade", "--symbol", "crashes", "a.txt"])
+    assert [level.atom for level in obj.strategy.levels] == ["char"]
+    with pytest.raises(SystemExit):
+        obj.process_args(["--cascade", "--js", "crashes", "a.txt"])
+    assert "--cascade can't be used with --js" in capsys.readouterr().err
@@ -4,6 +4,10 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """Lithium Testcase* tests"""
 
+import hashlib
+import os
+import pickle
+import random
 from pathlib import Path
 
 import pytest
@@ -59,6 +63,48 @@ def test_char_dd():
     assert test.after == b"\nDDEND\npost\n"
 
 
+def test_split_from():
+    """Test splitting a testcase again using another testcase type"""
+    test_path = Path("a.txt")
+    test_path.write_bytes(b"pre\n" b"DDBEGIN\n" b"a=1;\n" b"b;\n" b"DDEND\n" b"post\n")
+    lines = lithium.testcases.TestcaseLine()
+    lines.load(test_path)
+    lines.reducible[1] = False
+    symbols = lithium.testcases.TestcaseSymbol()
+    symbols.split_from(lines)
+    assert symbols.filename == "a.txt"
+    assert symbols.extension == ".txt"
+    assert symbols.before == b"pre\nDDBEGIN\n"
+    assert symbols.after == b"DDEND\npost\n"
+    assert symbols.parts == [b"a=", b"1;", b"\n", b"b;\n"]
+    assert symbols.reducible == [True, True, True, False]
+    chars = lithium.testcases.TestcaseChar()
+    chars.split_from(symbols)
+    # the line break before DDEND is kept out of the reducible parts, as in `load()`
+    assert chars.parts == [b"a", b"=", b"1", b";", b"\n", b"b;\n"]
+    assert chars.reducible == [True] * 5 + [False]
+    assert chars.to_bytes() == test_path.read_bytes()
+
+
+def test_split_from_load(testcase_cls):
+    """Test that splitting a loaded testcase gives the same result as loading the file
+    as that type
+    """
+    test_path = Path("a.txt")
+    test_path.write_bytes(b"pre\nDDBEGIN\na=1;\nb;\nDDEND\npost\n")
+    lines = lithium.testcases.TestcaseLine()
+    lines.load(test_path)
+    split = testcase_cls()
+    split.split_from(lines)
+    expected = testcase_cls()
+    expected.load(test_path)
+    assert split.before == expected.before
+    assert split.after == expected.after
+    assert split.parts == expected.parts
+    assert split.reducible == expected.reducible
+    assert split.to_bytes() == test_path.read_bytes()
+
+
 def test_jsstr_0():
     """Test that the TestcaseJsStr class splits JS strings properly 0"""
     test = lithium.testcases.TestcaseJsStr()
@@ -462,3 +508,267 @@ def test_reducible_slices():
         b"8",
         b"9",
     ]
+
+
+def _reference_rmslice(parts, reducible, start, stop):
+    # list-based rmslice: remove reducible parts with index in [start, stop)
+    reducible_idx = [i for i, red in enumerate(reducible) if red]
+    remove = set(reducible_idx[slice(start, stop)])
+    keep = [i for i in range(len(parts)) if i not in remove]
+    return [parts[i] for i in keep], [reducible[i] for i in keep]
+
+
+@pytest.mark.parametrize("size", [64, 2000])
+@pytest.mark.parametrize("seed", range(3))
+def test_rmslice_shared(testcase_cls, seed, size):
+    """Test that slicing copies sharing parts matches slicing plain lists"""
+    # pylint: disable=protected-access
+    rnd = random.Random(seed)
+    test = testcase_cls()
+    test.split_parts(bytes(rnd.choice(b"ab( \n\0") for _ in range(size)))
+    test.reducible = [rnd.random() < 0.7 for _ in test.parts]
+    exp_parts, exp_reducible = list(test.parts), list(test.reducible)
+    orig = test.copy()
+    orig_parts = list(exp_parts)
+    for _ in range(20):
+        start = rnd.randrange(-4, len(test) + 4)
+        stop = rnd.randrange(-4, len(test) + 4)
+        copy = test.copy()
+        copy.rmslice(start, stop)
+        exp_parts, exp_reducible = _reference_rmslice(
+            exp_parts, exp_reducible, start, stop
+        )
+        assert len(copy) == exp_reducible.count(True)
+        # slice translation on a sliced copy matches the materialized parts
+        opts = [i for i, red in enumerate(exp_reducible) if red]
+        opts = [0] + opts[1:] + [len(exp_parts)]
+        for bound in range(len(copy) + 1):
+            assert copy._slice_xlat(bound, bound) == (opts[bound], opts[bound])
+        assert copy.hexdigest() == hashlib.sha512(b"".join(exp_parts)).hexdigest()
+        # the fingerprint is derived from the original, check it against a new one
+        fresh = testcase_cls()
+        fresh.parts = list(exp_parts)
+        fresh.reducible = list(exp_reducible)
+        assert copy.fingerprint() == fresh.fingerprint()
+        # check a copy, so `test` keeps the pieces from repeated slicing
+        check = copy.copy()
+        assert check.parts == exp_parts
+        assert check.reducible == exp_reducible
+        test = copy
+    # the original is unaffected by slicing copies
+    assert orig.parts == orig_parts
+
+
+def test_fingerprint():
+    """Test that fingerprints depend only on the testcase contents"""
+    test = lithium.testcases.TestcaseLine()
+    test.before = b"\0pre\n"
+    test.split_parts(b"\0\n\0\na\nb\nc\nd\n")
+    test.after = b"post\n"
+    sliced = test.copy()
+    sliced.rmslice(3, 5)
+    assert sliced.shared
+    # the same contents, built from a list
+    built = lithium.testcases.TestcaseLine()
+    built.before = b"\0pre"
+    built.parts = [b"\n", b"\0\n\0", b"\na\n"]
+    built.reducible = [True, True, True]
+    built.after = b"d\npost\n"
+    assert not built.shared
+    assert sliced.fingerprint() == built.fingerprint()
+    assert sliced.hexdigest() == built.hexdigest()
+    # leading zeros are significant
+    built.before = b"pre"
+    assert sliced.fingerprint() != built.fingerprint()
+    assert test.fingerprint() != sliced.fingerprint()
+
+
+def test_fingerprint_collision(monkeypatch):
+    """Test that testcases with colliding fingerprints are not treated as tried"""
+    monkeypatch.setattr(lithium.testcases.Testcase, "fingerprint", lambda _: 0)
+    test = lithium.testcases.TestcaseLine()
+    test.split_parts(b"a\nb\nc\n")
+    sliced = test.copy()
+    sliced.rmslice(0, 1)
+
+    class _Reduction(lithium.strategies.ReductionIterator):
+        def __iter__(self):
+            yield from self.try_testcase(test)
+            yield from self.try_testcase(test.copy())
+            yield from self.try_testcase(sliced)
+            yield from self.try_testcase(sliced.copy())
+
+    tried = []
+    iterator = _Reduction(test)
+    for attempt in iterator:
+        tried.append(attempt)
+        iterator.feedback(False)
+    assert tried == [test, sliced]
+
+
+def test_tried_copies(monkeypatch):
+    """Test that only a few tried testcases are kept as copies until hashed"""
+    monkeypatch.setattr(lithium.strategies.ReductionIterator, "MAX_COPIES", 4)
+    test = lithium.testcases.TestcaseLine()
+    test.split_parts(b"".join(b"%d\n" % (i,) for i in range(20)))
+    attempts = []
+    for idx in range(len(test)):
+        attempt = test.copy()
+        attempt.rmslice(idx, idx + 1)
+        attempts.append(attempt)
+
+    class _Reduction(lithium.strategies.ReductionIterator):
+        def __iter__(self):
+            for attempt in attempts + [attempts[0].copy(), attempts[-1].copy()]:
+                yield from self.try_testcase(attempt)
+
+    tried = []
+    iterator = _Reduction(test)
+    for attempt in iterator:
+        tried.append(attempt)
+        iterator.feedback(False)
+        # pylint: disable=protected-access
+        copies = [
+            attempt
+            for fingerprinted in iterator._fingerprints.values()
+            for attempt in fingerprinted
+            if not isinstance(attempt, str)
+        ]
+        assert len(copies) <= 4
+    assert tried == attempts
+    assert iterator.get_tried() == {attempt.hexdigest() for attempt in attempts}
+
+
+def test_char_compact():
+    """Test that char testcases are sliced without making a list of parts"""
+    # pylint: disable=protected-access
+    data = bytes(range(256)) * 8
+    test_path = Path("a.bin")
+    test_path.write_bytes(b"DDBEGIN\n" + data + b"\nDDEND\n")
+    test = lithium.testcases.TestcaseChar()
+    test.load(test_path)
+    assert test.shared
+    assert isinstance(test._buffer, lithium.testcases._BytesBuffer)
+    assert len(test) == len(data)
+    sliced = test.copy()
+    sliced.rmslice(100, 1500)
+    sliced.rmslice(0, 10)
+    assert len(sliced) == len(data) - 1410
+    assert sliced.shared
+    sliced.dump("b.bin")
+    expected = b"DDBEGIN\n" + data[10:100] + data[1500:] + b"\nDDEND\n"
+    assert Path("b.bin").read_bytes() == expected
+    assert sliced.hexdigest() == hashlib.sha512(expected).hexdigest()
+    assert sliced._slice_xlat(90, 91) == (90, 91)
+    assert sliced.parts[89:91] == [data[99:100], data[1500:1501]]
+    assert test.parts == [data[i : i + 1] for i in range(len(data))]
+
+
+def test_snapshot(testcase_cls):
+    """Test that a snapshot of a testcase only keeps the parts still in use, in a
+    buffer of the same kind"""
+    # pylint: disable=protected-access
+    Path("a.txt").write_bytes(
+        b"pre\nDDBEGIN\n" + b"a = [1, 2];\nb = {3};\n" * 50 + b"DDEND\npost"
+    )
+    test = testcase_cls()
+    test.load("a.txt")
+    sliced = test.copy()
+    sliced.rmslice(1, len(test) // 2)
+    snapshot = pickle.loads(pickle.dumps(sliced.snapshot()))
+    assert isinstance(snapshot["buffer"], type(test._buffer))
+    assert len(snapshot["buffer"]) < len(test._buffer)
+    restored = testcase_cls()
+    restored.restore(snapshot)
+    assert restored.shared
+    assert restored.to_bytes() == sliced.to_bytes()
+    assert restored.fingerprint() == sliced.fingerprint()
+    assert len(restored) == len(sliced)
+    assert restored.parts == sliced.parts
+    assert restored.reducible == sliced.reducible
+
+
+def test_load_rewritten(testcase_cls):
+    """Test that by default a loaded testcase is independent of its file, which can
+    be rewritten in place"""
+    test_path = Path("a.txt")
+    data = b"line\n" * 50000
+    test_path.write_bytes(data)
+    test = testcase_cls()
+    test.load(test_path)
+    digest = test.copy().hexdigest()
+    with open(str(test_path), "wb") as test_fp:
+        test_fp.write(b"x")
+    assert test.copy().hexdigest() == digest
+    orig_inode = test_path.stat().st_ino
+    test.dump()
+    assert test_path.stat().st_ino == orig_inode
+    assert test_path.read_bytes() == data
+
+
+def test_mapped_dump(testcase_cls):
+    """Test that dumping over a loaded testcase file leaves the loaded data intact"""
+    test_path = Path("a.txt")
+    data = b"pre\nDDBEGIN\n" + b"line a\r\nline b\rline c\n" * 100 + b"DDEND\npost"
+    test_path.write_bytes(data)
+    test = testcase_cls()
+    test.load(test_path, map_file=True)
+    orig_inode = test_path.stat().st_ino
+    sliced = test.copy()
+    sliced.rmslice(0, len(test) // 2)
+    sliced.dump()
+    assert test_path.stat().st_ino != orig_inode
+    assert len(test_path.read_bytes()) < len(data)
+    # the original testcase is unaffected
+    test.dump("b.txt")
+    assert Path("b.txt").read_bytes() == data
+    test.dump()
+    assert test_path.read_bytes() == data
+    # reloaded data is split the same as data split directly
+    expected = testcase_cls()
+    expected.split_parts(b"line a\r\nline b\rline c\n" * 100)
+    if testcase_cls is lithium.testcases.TestcaseChar:
+        # the line break before DDEND is not reducible
+        expected.parts.pop()
+    test.load(test_path, map_file=True)
+    assert test.parts == expected.parts
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="needs symlink support")
+def test_mapped_dump_symlink(testcase_cls):
+    """Test that dumping a loaded testcase through a symlink updates the target"""
+    data = b"pre\nDDBEGIN\nline a\nline b\nDDEND\npost"
+    target = Path("target.txt")
+    target.write_bytes(data)
+    link = Path("a.txt")
+    link.symlink_to(target)
+    target.chmod(0o640)
+    test = testcase_cls()
+    test.load(link, map_file=True)
+    sliced = test.copy()
+    sliced.rmslice(0, len(test) // 2)
+    sliced.dump()
+    assert link.is_symlink()
+    assert os.stat(str(target)).st_mode & 0o777 == 0o640
+    assert len(target.read_bytes()) < len(data)
+    # the original testcase is unaffected
+    test.dump()
+    assert link.is_symlink()
+    assert target.read_bytes() == data
+
+
+@pytest.mark.skipif(not hasattr(os, "link"), reason="needs hard link support")
+def test_dump_hardlink(testcase_cls):
+    """Test that dumping a testcase with hard links updates all of them"""
+    data = b"pre\nDDBEGIN\nline a\nline b\nDDEND\npost"
+    test_path = Path("a.txt")
+    test_path.write_bytes(data)
+    os.link(str(test_path), "b.txt")
+    orig_inode = test_path.stat().st_ino
+    test = testcase_cls()
+    test.load(test_path, map_file=True)
+    test.rmslice(0, len(test) // 2)
+    test.dump()
+    assert test_path.stat().st_ino == orig_inode
+    assert Path("b.txt").read_bytes() == test_path.read_bytes()
+    assert len(test_path.read_bytes()) < len(data)
@@ -0,0 +1,90 @@
+# coding=utf-8
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Lithium verdict cache tests"""
+
+from pathlib import Path
+
+import pytest
+
+import lithium
+from lithium.verdicts import VerdictCache
+
+pytestmark = pytest.mark.usefixtures("tmp_cwd")  # pylint: disable=invalid-name
+
+
+def test_cache_0():
+    """test storing and retrieving verdicts"""
+    cache = VerdictCache("cache.db")
+    key = VerdictCache.key(lithium, ["a", "b"], "0" * 128)
+    assert key != VerdictCache.key(lithium, ["a", "c"], "0" * 128)
+    assert key != VerdictCache.key(lithium, ["a", "b"], "1" * 128)
+    assert cache.get(key) is None
+    cache.put(key, True, 1.5, "CRASHED signal 11")
+    assert key in cache
+    assert len(cache) == 1
+    cache.close()
+
+    # verdicts persist
+    cache = VerdictCache("cache.db")
+    verdict = cache.get(key)
+    assert verdict.interesting
+    assert verdict.runtime == 1.5
+    assert verdict.status == "CRASHED signal 11"
+    assert cache.hits == 1
+    cache.put(key, False)
+    assert len(cache) == 1
+    assert not cache.get(key).interesting
+    cache.close()
+
+
+def test_cache_1():
+    """test that the cache is bounded and evicts the least recently used"""
+    cache = VerdictCache("cache.db", max_entries=10)
+    keys = [VerdictCache.key(lithium, [], "%0128d" % (i,)) for i in range(10)]
+    for key in keys:
+        cache.put(key, False)
+    assert len(cache) == 10
+    # use the oldest entry, so it is not evicted
+    assert cache.get(keys[0]) is not None
+    cache.put(VerdictCache.key(lithium, [], "f" * 128), True)
+    assert len(cache) == 9
+    assert keys[0] in cache
+    assert keys[1] not in cache
+    assert keys[2] not in cache
+    assert keys[3] in cache
+    # uses are kept when the cache is reopened
+    assert cache.get(keys[3]) is not None
+    cache.close()
+    cache = VerdictCache("cache.db", max_entries=10)
+    cache.put(VerdictCache.key(lithium, [], "e" * 128), True)
+    cache.put(VerdictCache.key(lithium, [], "d" * 128), True)
+    assert len(cache) == 9
+    assert keys[3] in cache
+    assert keys[4] not in cache
+    assert keys[0] in cache
+    cache.close()
+
+
+def test_cache_reduction(line_lithium, recording_condition):
+    """test that a restarted reduction doesn't re-run known results"""
+    test_path = Path("a.txt")
+
+    def _run():
+        test_path.write_bytes(b"x\n\nx\nx\no\nx\nx\nx\n")
+        condition = recording_condition(lambda data: b"o\n" in data)
+        lith = line_lithium(condition, test_path)
+        lith.verdict_cache = VerdictCache("cache.db")
+        assert lith.run() == 0
+        assert test_path.read_bytes() == b"o\n"
+        lith.verdict_cache.close()
+        return lith
+
+    first = _run()
+    assert first.test_count > 1
+    assert first.verdict_cache.hits == 0
+    second = _run()
+    # only the original is checked again
+    assert second.test_count == 1
+    assert second.verdict_cache.hits == first.test_count - 1